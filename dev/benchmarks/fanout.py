@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Wall time of the per-entity child resources versus their concurrency level.
+
+The last line shows the bulk-only mode, which fills the detail table from the
+overview response without any per-entity requests.
+
+Extracts ``slurm_v0_0_38_get_jobs`` and ``slurm_v0_0_38_get_job`` from
+``slurm_rest_source`` against a local mock slurmrestd::
+
+    $ python -m dev.benchmarks.fanout --jobs 1000 --latency 0.02
+"""
+
+import argparse
+import time
+
+from slurm_monitor.pipelines.slurm.dlt_sources import slurm_rest_source
+
+from .mock_slurmrestd import spawn
+
+
+def extract_jobs(base_url, max_in_flight, bulk_only=False):
+    source = slurm_rest_source(
+        username="bench",
+        token="bench",
+        base_url=base_url,
+        max_in_flight={"default": max_in_flight},
+        bulk_only=bulk_only,
+    ).with_resources("slurm_v0_0_38_get_jobs", "slurm_v0_0_38_get_job")
+    return [row["job_id"] for row in source.resources["slurm_v0_0_38_get_job"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    server, base_url = spawn(latency=args.latency, n_jobs=args.jobs)
+    print(f"{args.jobs} jobs, {args.latency * 1000:.1f} ms latency per request")
+    print(f"{'max_in_flight':>14} {'wall time [s]':>14} {'speedup':>8}")
+    baseline = reference = None
+    for level in args.levels:
+        start = time.perf_counter()
+        job_ids = extract_jobs(base_url, level)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            baseline, reference = elapsed, job_ids
+        assert job_ids == reference, "row order changed with concurrency"
+        print(f"{level:>14} {elapsed:>14.3f} {baseline / elapsed:>8.1f}x")
+    start = time.perf_counter()
+    job_ids = extract_jobs(base_url, 1, bulk_only=True)
+    elapsed = time.perf_counter() - start
+    assert job_ids == reference, "bulk-only rows differ from per-entity rows"
+    print(f"{'bulk_only':>14} {elapsed:>14.3f} {baseline / elapsed:>8.1f}x")
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Import time of the CLI commands, checked against a budget per command.
+
+Each command is measured in a fresh interpreter with ``python -X importtime``,
+importing the CLI and the modules the command itself imports before it
+starts working. Commands which do not run a pipeline must not import dlt or
+DuckDB at all. Exits with status 1 if a budget is exceeded::
+
+    $ python -m dev.benchmarks.importtime
+    $ python -m dev.benchmarks.importtime --scale 2   # on a slow machine
+"""
+
+import argparse
+import subprocess
+import sys
+
+COMMANDS = {
+    # command: (modules imported by the command, budget in ms, heavy allowed)
+    "--help": ([], 150, False),
+    "ping": (["slurm_monitor.pipelines.slurm.remote"], 500, False),
+    "daemon": (["slurm_monitor.pipelines.slurm.daemon"], 500, False),
+    "clusters": (["slurm_monitor.pipelines.slurm.clusters"], 500, False),
+    # For comparison: the dlt sources, imported once a pipeline runs
+    "(dlt sources)": (["slurm_monitor.pipelines.slurm.dlt_sources"], 2000, True),
+}
+"""The commands with their imports and budgets"""
+
+HEAVY_MODULES = ("dlt", "duckdb", "pandas", "pyarrow")
+"""Top-level packages which only commands running pipelines may import"""
+
+
+def measure(modules):
+    """
+    Import time in ms of ``slurm_monitor.cli`` and ``modules``, and the set
+    of all imported module names.
+    """
+    statement = "; ".join(f"import {m}" for m in ["slurm_monitor.cli", *modules])
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            # The header line
+            continue
+        imported.add(name.strip())
+        # Everything imported by our code is nested below a slurm_monitor
+        # module; top-level entries are not indented
+        if name.startswith(" slurm_monitor"):
+            total += int(cumulative)
+    return total / 1000, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiply all budgets by this"
+    )
+    args = parser.parse_args()
+
+    print(f"{'command':>16} {'import [ms]':>12} {'budget [ms]':>12}  heavy imports")
+    failed = False
+    for command, (modules, budget, heavy_allowed) in COMMANDS.items():
+        runs = [measure(modules) for _ in range(args.repeat)]
+        best = min(total for total, _ in runs)
+        heavy = sorted({name.split(".")[0] for name in runs[0][1]} & set(HEAVY_MODULES))
+        budget *= args.scale
+        ok = best <= budget and (heavy_allowed or not heavy)
+        failed |= not ok
+        print(
+            f"{command:>16} {best:>12.0f} {budget:>12.0f}  "
+            f"{', '.join(heavy) or '-'}{'' if ok else '  OVER BUDGET'}"
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+"""
+A minimal mock of slurmrestd, serving synthetic ``/slurm/v0.0.38/*`` and
+``/slurmdb/v0.0.38/*`` payloads.
+
+Run it standalone to point a pipeline at it::
+
+    $ python -m dev.benchmarks.mock_slurmrestd --jobs 40000 --latency 0.005
+
+or start it in-process with :func:`serve` from a benchmark script.
+
+With ``--error-rate``, that fraction of the requests fails with HTTP 500.
+``/mock/stats`` returns the number of requests and injected errors so far,
+per endpoint; it is not counted itself.
+"""
+
+import argparse
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+STATES = ["RUNNING", "PENDING", "COMPLETED", "FAILED", "CANCELLED", "TIMEOUT"]
+NODE_STATES = ["idle", "mixed", "allocated", "down", "drain"]
+
+
+class SyntheticCluster:
+    """Deterministic synthetic cluster state"""
+
+    def __init__(
+        self,
+        n_jobs=1000,
+        n_nodes=100,
+        n_partitions=4,
+        n_reservations=2,
+        n_users=50,
+        n_accounts=10,
+        name="mock",
+        now=None,
+    ):
+        self.name = name
+        self.now = int(now or time.time())
+        self.n_users = n_users
+        self.n_accounts = n_accounts
+        self.partitions = [f"part{i}" for i in range(n_partitions)]
+        self.nodes = [self.make_node(i) for i in range(n_nodes)]
+        self.jobs = [self.make_job(i) for i in range(n_jobs)]
+        self.reservations = [self.make_reservation(i) for i in range(n_reservations)]
+        self.jobs_by_id = {str(job["job_id"]): job for job in self.jobs}
+        self.nodes_by_name = {node["name"]: node for node in self.nodes}
+        self.db_jobs = [self.make_db_job(job) for job in self.jobs]
+        self.db_jobs_by_id = {str(job["job_id"]): job for job in self.db_jobs}
+        self.associations = [
+            self.make_association(user, i % n_accounts)
+            for i, user in enumerate(self.user_names())
+        ]
+
+    def make_job(self, i):
+        submit_time = self.now - 86400 + (i * 37) % 86400
+        start_time = submit_time + (i * 13) % 600
+        state = STATES[i % len(STATES)]
+        end_time = (
+            0
+            if state in ("RUNNING", "PENDING")
+            else start_time + 60 * (1 + (i * 7) % 720)
+        )
+        return {
+            "job_id": 100000 + i,
+            "name": f"job{i}",
+            "user_name": f"user{i % self.n_users}",
+            "account": f"account{i % self.n_accounts}",
+            "partition": self.partitions[i % len(self.partitions)],
+            "job_state": state,
+            "submit_time": submit_time,
+            "start_time": start_time if state != "PENDING" else 0,
+            "end_time": end_time,
+            "cpus": 1 + (i % 8) * 16,
+            "node_count": 1 + i % 4,
+            "nodes": self.nodes[i % len(self.nodes)]["name"] if self.nodes else "",
+            "time_limit": 1440,
+            "qos": "normal",
+        }
+
+    def make_node(self, i):
+        return {
+            "name": f"node{i:05d}",
+            "state": NODE_STATES[i % len(NODE_STATES)],
+            "cpus": 128,
+            "alloc_cpus": (i * 16) % 129,
+            "real_memory": 256000,
+            "alloc_memory": (i * 8000) % 256000,
+            "partitions": [self.partitions[i % len(self.partitions)]],
+        }
+
+    def make_reservation(self, i):
+        return {
+            "name": f"resv{i}",
+            "node_list": f"node{i:05d}",
+            "start_time": self.now + 3600 * i,
+            "end_time": self.now + 3600 * (i + 1),
+        }
+
+    def user_names(self):
+        return [f"user{i}" for i in range(self.n_users)]
+
+    def make_db_job(self, job):
+        """The slurmdb (accounting) record of ``job``"""
+        start, end = job["start_time"], job["end_time"]
+        tres = [{"type": "cpu", "name": "", "id": 1, "count": job["cpus"]}]
+        # The last partition has GPUs
+        if job["partition"] == self.partitions[-1]:
+            gpus = 1 + job["job_id"] % 4
+            tres.append({"type": "gres", "name": "gpu", "id": 1001, "count": gpus})
+        return {
+            "job_id": job["job_id"],
+            "cluster": self.name,
+            "name": job["name"],
+            "user": job["user_name"],
+            "group": "users",
+            "account": job["account"],
+            "partition": job["partition"],
+            "qos": job["qos"],
+            "nodes": job["nodes"],
+            "state": {"current": job["job_state"], "reason": "None"},
+            "exit_code": {"status": "SUCCESS", "return_code": 0},
+            "time": {
+                "submission": job["submit_time"],
+                "eligible": job["submit_time"],
+                "start": start,
+                "end": end,
+                "elapsed": end - start if end else 0,
+                "suspended": 0,
+                "limit": job["time_limit"],
+            },
+            "tres": {
+                "requested": tres,
+                "allocated": tres if start else [],
+            },
+            "association": {
+                "account": job["account"],
+                "cluster": self.name,
+                "partition": job["partition"],
+                "user": job["user_name"],
+            },
+            "steps": [],
+        }
+
+    def make_association(self, user, account):
+        return {
+            "account": f"account{account}",
+            "cluster": self.name,
+            "partition": "",
+            "user": user,
+            "is_default": True,
+            "shares_raw": 1,
+            "qos": ["normal"],
+            "max": {"jobs": {"per": {"wall_clock": 1440}}},
+            "usage": {},
+        }
+
+    @staticmethod
+    def association_key(association):
+        return {
+            key: association[key] for key in ("account", "cluster", "partition", "user")
+        }
+
+    def make_user(self, name):
+        associations = [a for a in self.associations if a["user"] == name]
+        return {
+            "name": name,
+            "default": {
+                "account": associations[0]["account"] if associations else "",
+                "wckey": "",
+            },
+            "administrator_level": "None",
+            "associations": [self.association_key(a) for a in associations],
+            "coordinators": [],
+        }
+
+    def make_account(self, i):
+        name = f"account{i}"
+        return {
+            "name": name,
+            "description": f"Account {i}",
+            "organization": "mock",
+            "coordinators": [],
+            "associations": [
+                self.association_key(a)
+                for a in self.associations
+                if a["account"] == name
+            ],
+        }
+
+    def make_qos(self):
+        return {"name": "normal", "priority": 100, "flags": [], "limits": {}}
+
+    def make_cluster(self):
+        return {
+            "name": self.name,
+            "controller": {"host": "slurmctld", "port": 6817},
+            "flags": ["MULTIPLE_SLURMD"],
+            "nodes": ",".join(node["name"] for node in self.nodes),
+            "rpc_version": 9728,
+            "tres": [{"type": "cpu", "id": 1, "count": 128 * len(self.nodes)}],
+        }
+
+    def make_partition(self, name):
+        nodes = [n["name"] for n in self.nodes if name in n["partitions"]]
+        return {
+            "name": name,
+            "nodes": ",".join(nodes),
+            "total_nodes": len(nodes),
+            "total_cpus": 128 * len(nodes),
+        }
+
+
+class MockSlurmrestdHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        if url.path == "/mock/stats":
+            with server.lock:
+                self.send_json(200, server.stats())
+            return
+        failed = server.record(url.path)
+        if server.latency:
+            time.sleep(server.latency)
+        if failed:
+            self.send_json(500, {"errors": [{"error": "injected failure"}]})
+            return
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == "/openapi.json":
+            payload = openapi_spec(server.cluster)
+        elif url.path.startswith("/slurmdb/v0.0.38/"):
+            payload = self.route_slurmdb(server.cluster, url.path[16:], query)
+        elif url.path.startswith("/slurm/v0.0.38/"):
+            payload = self.route(server.cluster, url.path[14:])
+        else:
+            payload = None
+        if payload is None:
+            self.send_json(404, {"errors": [{"error": f"not found: {url.path}"}]})
+        else:
+            self.send_json(200, payload)
+
+    @staticmethod
+    def route(cluster, path):
+        if path == "/ping":
+            return {"pings": [{"hostname": "slurmctld", "ping": "UP"}]}
+        if path == "/diag":
+            return {"statistics": {"jobs_submitted": len(cluster.jobs)}}
+        if path == "/licenses":
+            return {"licenses": []}
+        if path == "/jobs":
+            return {"errors": [], "jobs": cluster.jobs}
+        if path == "/nodes":
+            return {"errors": [], "nodes": cluster.nodes}
+        if path == "/partitions":
+            return {
+                "errors": [],
+                "partitions": [cluster.make_partition(p) for p in cluster.partitions],
+            }
+        if path == "/reservations":
+            return {"errors": [], "reservations": cluster.reservations}
+        match = re.fullmatch(r"/(job|node|partition|reservation)/([^/]+)", path)
+        if match:
+            kind, key = match.groups()
+            if kind == "job":
+                job = cluster.jobs_by_id.get(key)
+                return {"errors": [], "jobs": [job]} if job else None
+            if kind == "node":
+                node = cluster.nodes_by_name.get(key)
+                return {"errors": [], "nodes": [node]} if node else None
+            if kind == "partition":
+                if key not in cluster.partitions:
+                    return None
+                return {"errors": [], "partitions": [cluster.make_partition(key)]}
+            found = [r for r in cluster.reservations if r["name"] == key]
+            return {"errors": [], "reservations": found} if found else None
+        return None
+
+    @staticmethod
+    def route_slurmdb(cluster, path, query):
+        if path == "/diag":
+            return {
+                "errors": [],
+                "statistics": {"time_start": cluster.now, "rollups": [], "RPCs": []},
+            }
+        if path == "/config":
+            return {
+                "errors": [],
+                "accounts": [
+                    cluster.make_account(i) for i in range(cluster.n_accounts)
+                ],
+                "associations": cluster.associations,
+                "qos": [cluster.make_qos()],
+                "users": [cluster.make_user(u) for u in cluster.user_names()],
+                "wckeys": [],
+            }
+        if path == "/tres":
+            return {"errors": [], "TRES": cluster.make_cluster()["tres"]}
+        if path == "/qos":
+            return {"errors": [], "qos": [cluster.make_qos()]}
+        if path in ("/associations", "/association"):
+            found = [
+                a
+                for a in cluster.associations
+                if all(a.get(key) == query[key] for key in query if key in a)
+            ]
+            return {"errors": [], "associations": found}
+        if path == "/users":
+            users = [cluster.make_user(u) for u in cluster.user_names()]
+            return {"errors": [], "users": users}
+        if path == "/accounts":
+            accounts = [cluster.make_account(i) for i in range(cluster.n_accounts)]
+            return {"errors": [], "accounts": accounts}
+        if path == "/wckeys":
+            return {"errors": [], "wckeys": []}
+        if path == "/clusters":
+            return {"errors": [], "clusters": [cluster.make_cluster()]}
+        if path == "/jobs":
+            # Jobs submitted in the requested range
+            start = int(query.get("start_time", 0))
+            end = int(query.get("end_time", 2**62))
+            jobs = [
+                job
+                for job in cluster.db_jobs
+                if start <= job["time"]["submission"] < end
+            ]
+            return {"errors": [], "jobs": jobs}
+        match = re.fullmatch(r"/(job|user|account|qos|cluster|wckey)/([^/]+)", path)
+        if match:
+            kind, key = match.groups()
+            if kind == "job":
+                job = cluster.db_jobs_by_id.get(key)
+                return {"errors": [], "jobs": [job]} if job else None
+            if kind == "user":
+                if key not in cluster.user_names():
+                    return None
+                return {"errors": [], "users": [cluster.make_user(key)]}
+            if kind == "account":
+                names = [f"account{i}" for i in range(cluster.n_accounts)]
+                if key not in names:
+                    return None
+                return {
+                    "errors": [],
+                    "accounts": [cluster.make_account(names.index(key))],
+                }
+            if kind == "qos":
+                return (
+                    {"errors": [], "qos": [cluster.make_qos()]}
+                    if key == "normal"
+                    else None
+                )
+            if kind == "cluster":
+                if key != cluster.name:
+                    return None
+                return {"errors": [], "clusters": [cluster.make_cluster()]}
+        return None
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def schema_of(value):
+    """OpenAPI schema of an example value"""
+    if isinstance(value, dict):
+        return {
+            "type": "object",
+            "properties": {key: schema_of(item) for key, item in value.items()},
+        }
+    if isinstance(value, list):
+        return {"type": "array", "items": schema_of(value[0]) if value else {}}
+    if isinstance(value, bool):
+        return {"type": "boolean"}
+    if isinstance(value, int):
+        return {"type": "integer"}
+    if isinstance(value, float):
+        return {"type": "number"}
+    if isinstance(value, str):
+        return {"type": "string"}
+    return {}
+
+
+def openapi_spec(cluster):
+    """
+    An OpenAPI spec of the mock, in the layout of slurmrestd's: one component
+    schema per response, inferred from an example response.
+    """
+    examples = {
+        "job_id": cluster.jobs[0]["job_id"] if cluster.jobs else None,
+        "node_name": cluster.nodes[0]["name"] if cluster.nodes else None,
+        "partition_name": cluster.partitions[0] if cluster.partitions else None,
+        "reservation_name": (
+            cluster.reservations[0]["name"] if cluster.reservations else None
+        ),
+        "user_name": "user0" if cluster.n_users else None,
+        "account_name": "account0" if cluster.n_accounts else None,
+        "qos_name": "normal",
+        "cluster_name": cluster.name,
+    }
+    slurm = [
+        "/diag",
+        "/ping",
+        "/licenses",
+        "/jobs",
+        "/job/{job_id}",
+        "/nodes",
+        "/node/{node_name}",
+        "/partitions",
+        "/partition/{partition_name}",
+        "/reservations",
+        "/reservation/{reservation_name}",
+    ]
+    slurmdb = [
+        "/diag",
+        "/config",
+        "/tres",
+        "/qos",
+        "/qos/{qos_name}",
+        "/associations",
+        "/association",
+        "/users",
+        "/user/{user_name}",
+        "/wckeys",
+        "/accounts",
+        "/account/{account_name}",
+        "/clusters",
+        "/cluster/{cluster_name}",
+        "/jobs",
+        "/job/{job_id}",
+    ]
+    spec = {
+        "openapi": "3.0.2",
+        "info": {"title": "mock slurmrestd", "version": "0.0.38"},
+        "paths": {},
+        "components": {"schemas": {}},
+    }
+    for prefix, templates in [("slurm", slurm), ("slurmdb", slurmdb)]:
+        for template in templates:
+            params = re.findall(r"{(\w+)}", template)
+            if any(examples[param] is None for param in params):
+                continue
+            path = template.format(**{param: examples[param] for param in params})
+            if prefix == "slurm":
+                payload = MockSlurmrestdHandler.route(cluster, path)
+            else:
+                payload = MockSlurmrestdHandler.route_slurmdb(cluster, path, {})
+            slug = re.sub(r"\W+", "_", template).strip("_")
+            name = f"{prefix}_{slug}_response"
+            spec["components"]["schemas"][name] = schema_of(payload)
+            spec_path = f"/{prefix}/v0.0.38{template}"
+            spec["paths"][spec_path] = {
+                "get": {
+                    "responses": {
+                        "200": {
+                            "description": "success",
+                            "content": {
+                                "application/json": {
+                                    "schema": {"$ref": f"#/components/schemas/{name}"}
+                                }
+                            },
+                        }
+                    }
+                }
+            }
+    return spec
+
+
+class MockSlurmrestd(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(
+        self, cluster, latency=0.0, error_rate=0.0, host="127.0.0.1", port=0, seed=0
+    ):
+        super().__init__((host, port), MockSlurmrestdHandler)
+        self.cluster = cluster
+        self.latency = latency
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.request_count = 0
+        self.error_count = 0
+        self.endpoints = {}
+
+    def record(self, path):
+        """Count a request to ``path``, return whether it should fail"""
+        endpoint = re.sub(
+            r"/(job|node|partition|reservation|user|account|qos|cluster|wckey)/[^/]+$",
+            r"/\1/{id}",
+            path,
+        )
+        with self.lock:
+            failed = self.random.random() < self.error_rate
+            self.request_count += 1
+            self.error_count += failed
+            counts = self.endpoints.setdefault(endpoint, [0, 0])
+            counts[0] += 1
+            counts[1] += failed
+        return failed
+
+    def stats(self):
+        return {
+            "requests": self.request_count,
+            "errors": self.error_count,
+            "endpoints": {
+                endpoint: {"requests": requests, "errors": errors}
+                for endpoint, (requests, errors) in sorted(self.endpoints.items())
+            },
+        }
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def serve(cluster, latency=0.0, port=0, error_rate=0.0):
+    """Start a mock server in a background thread and return it"""
+    server = MockSlurmrestd(cluster, latency=latency, error_rate=error_rate, port=port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def _serve_forever(cluster_kwargs, latency, error_rate, ready):
+    server = MockSlurmrestd(
+        SyntheticCluster(**cluster_kwargs), latency=latency, error_rate=error_rate
+    )
+    ready.put(server.base_url)
+    server.serve_forever()
+
+
+def spawn(latency=0.0, error_rate=0.0, **cluster_kwargs):
+    """
+    Start a mock server in a child process, so that it does not compete with
+    the benchmarked client for the GIL.
+
+    Returns
+    -------
+    Tuple[multiprocessing.Process, str]
+        The server process (terminate it when done) and its base URL
+    """
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_serve_forever,
+        args=(cluster_kwargs, latency, error_rate, ready),
+        daemon=True,
+    )
+    process.start()
+    return process, ready.get(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--nodes", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    cluster = SyntheticCluster(n_jobs=args.jobs, n_nodes=args.nodes)
+    server = MockSlurmrestd(
+        cluster, latency=args.latency, error_rate=args.error_rate, port=args.port
+    )
+    print(f"Serving mock slurmrestd on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Time of the occupancy sweep over a synthetic job history.
+
+Generates job intervals (partition, start, end, cpus) in an in-memory DuckDB
+database and runs :func:`~slurm_monitor.pipelines.slurm.occupancy.occupancy_sql`
+over them, reporting the best wall time of a few runs and the size of the
+result. Every run is checked against the total CPU seconds of the jobs, and
+the result for the first ``--check`` jobs against a plain Python loop over
+the buckets of every job::
+
+    $ python -m dev.benchmarks.occupancy --jobs 1000000 --days 30
+"""
+
+import argparse
+import time
+
+import duckdb
+
+from slurm_monitor.pipelines.slurm.occupancy import OCCUPANCY_BUCKET, occupancy_sql
+
+PARTITIONS = ["compute", "gpu", "smp", "fat", "mini", "debug"]
+"""Partitions the synthetic jobs are spread over"""
+
+
+def make_jobs(conn, n_jobs, start, end, seed):
+    conn.execute(f"SELECT setseed({seed})")
+    partitions = ", ".join(f"'{name}'" for name in PARTITIONS)
+    # Durations are roughly log-normal, from seconds to several days
+    conn.execute(
+        f"""
+        CREATE TABLE jobs AS
+        SELECT
+            job_id,
+            [{partitions}][1 + job_id % {len(PARTITIONS)}] AS partition,
+            start_time,
+            start_time + (exp(random() * 12) + 1)::BIGINT AS end_time,
+            (1 + random() * 127)::BIGINT AS cpus
+        FROM (
+            SELECT
+                range AS job_id,
+                ({start} + random() * ({end} - {start}))::BIGINT AS start_time
+            FROM range({n_jobs})
+        )
+        """
+    )
+
+
+def cpu_seconds(conn, relation, start, end):
+    """Total CPU seconds of ``relation`` within ``start`` to ``end``"""
+    return conn.execute(
+        f"""
+        SELECT sum(cpus * (least(end_time, {end}) - greatest(start_time, {start})))
+        FROM {relation}
+        WHERE start_time < {end} AND end_time > {start}
+        """
+    ).fetchone()[0]
+
+
+def loop_occupancy(jobs, start, end, bucket):
+    """The occupancy of ``jobs``, bucket by bucket in Python"""
+    result = {}
+    for partition, job_start, job_end, cpus in jobs:
+        b = max(job_start, start) // bucket * bucket
+        while b < min(job_end, end):
+            overlap = min(job_end, b + bucket) - max(job_start, b)
+            key = (partition, b)
+            result[key] = result.get(key, 0) + cpus * overlap / bucket
+            b += bucket
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--bucket", type=int, default=OCCUPANCY_BUCKET)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--check", type=int, default=2000)
+    parser.add_argument("--seed", type=float, default=0.42)
+    args = parser.parse_args()
+
+    end = int(time.time())
+    end -= end % args.bucket
+    start = end - args.days * 86400
+    conn = duckdb.connect()
+    make_jobs(conn, args.jobs, start, end, args.seed)
+    query = occupancy_sql("SELECT * FROM jobs", start, end, args.bucket)
+
+    print(f"{args.jobs} jobs over {args.days} days, {args.bucket}s buckets")
+    times = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        rows = conn.execute(query).fetchall()
+        times.append(time.perf_counter() - started)
+    total = sum(row[2] for row in rows) * args.bucket
+    expected = cpu_seconds(conn, "jobs", start, end)
+    assert abs(total - expected) <= 1e-6 * expected, (total, expected)
+    print(f"{'best [s]':>9} {'median [s]':>11} {'result rows':>12} {'jobs/s':>12}")
+    best = min(times)
+    print(
+        f"{best:>9.3f} {sorted(times)[len(times) // 2]:>11.3f} "
+        f"{len(rows):>12} {args.jobs / best:>12.0f}"
+    )
+
+    if args.check:
+        sample = conn.execute(
+            f"SELECT partition, start_time, end_time, cpus FROM jobs "
+            f"WHERE job_id < {args.check}"
+        ).fetchall()
+        expected = loop_occupancy(sample, start, end, args.bucket)
+        swept = conn.execute(
+            occupancy_sql(
+                f"SELECT * FROM jobs WHERE job_id < {args.check}",
+                start,
+                end,
+                args.bucket,
+            )
+        ).fetchall()
+        for partition, ts, alloc_cpus in swept:
+            assert abs(alloc_cpus - expected.get((partition, ts), 0)) < 1e-6
+        print(f"matches the Python loop for the first {len(sample)} jobs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput of ``load_slurm_data`` against a local mock slurmrestd.
+
+Runs the full pipeline (extract, normalize, load and the post-load steps) of
+``slurm_rest_source`` and ``slurm_restdb_source`` a few times in a scratch
+directory, and reports per run the wall time, rows loaded, rows per second,
+requests served by the mock (and how many of them failed on purpose), and
+the peak RSS of the process so far. The first run starts from empty tables
+and state, later runs are incremental::
+
+    $ python -m dev.benchmarks.pipeline --jobs 20000 --nodes 500 --runs 3
+    $ python -m dev.benchmarks.pipeline --error-rate 0.01 --endpoint slurmdb
+
+The mock runs in a child process, so the RSS is that of the pipeline alone.
+"""
+
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+import urllib.request
+
+from .mock_slurmrestd import spawn
+
+BACKFILL_DAYS = 2
+"""The synthetic job history covers the last day, so this covers all of it"""
+
+
+def mock_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/mock/stats") as response:
+        return json.load(response)
+
+
+def peak_rss_mb():
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_once(base_url, endpoint_type, destination):
+    # Imported after DLT_DATA_DIR is set, see main
+    from slurm_monitor.pipelines.slurm.metrics import process_metrics
+    from slurm_monitor.pipelines.slurm.remote import load_slurm_data
+
+    source_options = {}
+    if endpoint_type == "slurmdb":
+        source_options["backfill_start"] = int(time.time()) - BACKFILL_DAYS * 86400
+    rows_before = sum(process_metrics().rows.values())
+    stats_before = mock_stats(base_url)
+    start = time.perf_counter()
+    error = None
+    try:
+        load_slurm_data(
+            endpoint_type=endpoint_type,
+            base_url=base_url,
+            username="bench",
+            token="bench",
+            source_options=source_options,
+            destination=destination,
+        )
+    except Exception as e:
+        error = type(e).__name__
+    elapsed = time.perf_counter() - start
+    stats = mock_stats(base_url)
+    return {
+        "seconds": elapsed,
+        "rows": sum(process_metrics().rows.values()) - rows_before,
+        "requests": stats["requests"] - stats_before["requests"],
+        "errors": stats["errors"] - stats_before["errors"],
+        "failed": error,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=5000)
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument(
+        "--endpoint",
+        choices=["slurm", "slurmdb"],
+        nargs="+",
+        default=["slurm", "slurmdb"],
+    )
+    parser.add_argument(
+        "--destination", choices=["duckdb", "parquet"], default="duckdb"
+    )
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="slurm-bench-")
+    os.environ["DLT_DATA_DIR"] = os.path.join(workdir, "dlt")
+    os.chdir(workdir)
+    server, base_url = spawn(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        n_jobs=args.jobs,
+        n_nodes=args.nodes,
+    )
+    print(
+        f"{args.jobs} jobs, {args.nodes} nodes, {args.latency * 1000:.1f} ms latency, "
+        f"{args.error_rate:.1%} errors, working in {workdir}"
+    )
+    print(
+        f"{'run':>4} {'endpoint':>8} {'wall time [s]':>14} {'rows':>8} "
+        f"{'rows/s':>9} {'requests':>9} {'errors':>7} {'peak RSS [MB]':>14}  status"
+    )
+    for run in range(1, args.runs + 1):
+        for endpoint_type in args.endpoint:
+            result = run_once(base_url, endpoint_type, args.destination)
+            status = f"FAILED ({result['failed']})" if result["failed"] else "ok"
+            print(
+                f"{run:>4} {endpoint_type:>8} {result['seconds']:>14.2f} "
+                f"{result['rows']:>8} {result['rows'] / result['seconds']:>9.0f} "
+                f"{result['requests']:>9} {result['errors']:>7} "
+                f"{peak_rss_mb():>14.1f}  {status}"
+            )
+    print("requests per endpoint:")
+    for endpoint, counts in mock_stats(base_url)["endpoints"].items():
+        print(f"  {endpoint:<40} {counts['requests']:>8} {counts['errors']:>6} errors")
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Peak memory of extracting ``/slurm/v0.0.38/jobs`` with and without streaming.
+
+Extracts ``slurm_v0_0_38_get_jobs`` from a local mock slurmrestd serving a
+synthetic queue, once decoding the whole response and once parsing it while
+it is received. Records are discarded right away, as the dlt extract step
+does when it writes them to disk, so the peak measures the parser alone::
+
+    $ python -m dev.benchmarks.streaming --jobs 500000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from slurm_monitor.pipelines.slurm.fanout import make_session
+from slurm_monitor.pipelines.slurm.incremental import update_time_resource
+
+from .mock_slurmrestd import spawn
+
+
+def extract_jobs(base_url, stream):
+    resource = update_time_resource(
+        name="slurm_v0_0_38_get_jobs",
+        table_name="v0_0_38_jobs_overview",
+        path="/slurm/v0.0.38/jobs",
+        data_selector="jobs",
+        base_url=base_url,
+        session=make_session(None, 1),
+        incremental=False,
+        stream=stream,
+    )
+    return sum(1 for _ in resource)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=500000)
+    args = parser.parse_args()
+
+    server, base_url = spawn(n_jobs=args.jobs)
+    print(f"{args.jobs} jobs")
+    print(f"{'mode':>10} {'rows':>10} {'wall time [s]':>14} {'peak [MB]':>10}")
+    for stream in (False, True):
+        start = time.perf_counter()
+        rows = extract_jobs(base_url, stream)
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        assert extract_jobs(base_url, stream) == rows == args.jobs
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        mode = "stream" if stream else "json"
+        print(f"{mode:>10} {rows:>10} {elapsed:>14.2f} {peak / 2**20:>10.1f}")
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
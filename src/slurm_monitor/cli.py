@@ -1,8 +1,11 @@
 import importlib
+import math
 import sys
 
 import click
 
+from .pipelines.slurm.tasks import DEFAULT_TASKS
+
 
 @click.group()
 def cli():
@@ -16,10 +19,10 @@ def cli():
 def pipeline(module_spec, action):
     """Run a pipeline given a module spec and action."""
     try:
-        module = importlib.import_module(f"slurm_monitoring.pipelines.{module_spec}")
+        module = importlib.import_module(f"slurm_monitor.pipelines.{module_spec}")
     except ModuleNotFoundError as e:
         click.echo(
-            f"Module 'slurm_monitoring.pipelines.{module_spec}' not found.", err=True
+            f"Module 'slurm_monitor.pipelines.{module_spec}' not found.", err=True
         )
         click.echo(e)
         sys.exit(1)
@@ -35,5 +38,227 @@ def pipeline(module_spec, action):
         sys.exit(2)
 
 
+@cli.command()
+@click.option(
+    "--cluster",
+    default=None,
+    help="Ping this cluster of the --config file instead of the default one.",
+)
+@click.option(
+    "--config",
+    "clusters_file",
+    default="clusters.toml",
+    show_default=True,
+    help="TOML file with one [clusters.<name>] table per cluster.",
+)
+def ping(cluster, clusters_file):
+    """Check that slurmrestd and slurmdbd answer, without loading any data."""
+    from .pipelines.slurm import remote
+
+    tunnel_options = remote.get_ssh_config()
+    if cluster:
+        from .pipelines.slurm.clusters import load_clusters
+
+        try:
+            clusters = load_clusters(clusters_file)
+        except (OSError, ValueError) as e:
+            raise click.UsageError(str(e))
+        if cluster not in clusters:
+            raise click.UsageError(f"No cluster {cluster!r} in {clusters_file}")
+        tunnel_options = clusters[cluster]
+
+    failed = False
+    with remote.SSHTunnel(**tunnel_options) as tunnel:
+        tunnel.generate_slurm_token()
+        for name, ping_api in [
+            ("slurm", remote.ping_slurm_api),
+            ("slurmdb", remote.ping_slurmdb_api),
+        ]:
+            # Requests exceptions are OSErrors
+            try:
+                tunnel.run_func(ping_api)
+                click.echo(f"{name}: ok")
+            except (remote.SlurmRestAPIError, OSError) as e:
+                click.echo(f"{name}: FAILED ({e})")
+                failed = True
+    if failed:
+        sys.exit(1)
+
+
+def parse_intervals(ctx, param, values):
+    """Parse ``TASK=SECONDS`` options into a dict, ``TASK=off`` into 0"""
+    intervals = {}
+    for value in values:
+        name, sep, seconds = value.partition("=")
+        if not sep:
+            raise click.BadParameter(f"expected TASK=SECONDS, got {value!r}")
+        if name not in DEFAULT_TASKS:
+            raise click.BadParameter(
+                f"unknown task {name!r}, known tasks are {', '.join(DEFAULT_TASKS)}"
+            )
+        if seconds == "off":
+            intervals[name] = 0.0
+            continue
+        try:
+            intervals[name] = float(seconds)
+        except ValueError:
+            raise click.BadParameter(f"expected TASK=SECONDS, got {value!r}")
+        if not (math.isfinite(intervals[name]) and intervals[name] > 0):
+            raise click.BadParameter(
+                f"interval of {name} must be a positive number, got {seconds} "
+                f"(use {name}=off to disable it)"
+            )
+    return intervals
+
+
+@cli.command()
+@click.option(
+    "--interval",
+    "intervals",
+    multiple=True,
+    metavar="TASK=SECONDS",
+    callback=parse_intervals,
+    help="Override the interval of a task ("
+    + ", ".join(f"{name}={task['interval']}" for name, task in DEFAULT_TASKS.items())
+    + "); TASK=off disables it. Can be repeated.",
+)
+@click.option(
+    "--jitter",
+    default=0.1,
+    show_default=True,
+    help="Maximum random delay per run, relative to the interval.",
+)
+@click.option(
+    "--max-backoff",
+    default=900.0,
+    show_default=True,
+    help="Maximum retry delay of failing tasks in seconds.",
+)
+@click.option(
+    "--destination",
+    type=click.Choice(["duckdb", "parquet"]),
+    default="duckdb",
+    show_default=True,
+    help="Load into slurm_pipeline.duckdb, or into a partitioned Parquet lake.",
+)
+@click.option(
+    "--lake-path",
+    default="slurm_lake",
+    show_default=True,
+    help="Directory of the Parquet lake, with --destination parquet.",
+)
+@click.option(
+    "--publish-dir",
+    default="published",
+    show_default=True,
+    help="Directory of the read-only database snapshots for the dashboard, "
+    "with --destination duckdb.",
+)
+@click.option(
+    "--publish-interval",
+    default=300.0,
+    show_default=True,
+    help="Minimum seconds between two published snapshots. Every snapshot "
+    "copies the whole database.",
+)
+@click.option(
+    "--no-publish",
+    is_flag=True,
+    help="Do not publish snapshots for the dashboard.",
+)
+@click.option(
+    "--metrics-port",
+    type=int,
+    default=None,
+    help="Serve Prometheus metrics on this port, at /metrics.",
+)
+def daemon(
+    intervals,
+    jitter,
+    max_backoff,
+    destination,
+    lake_path,
+    publish_dir,
+    publish_interval,
+    no_publish,
+    metrics_port,
+):
+    """Poll the cluster continuously, each resource at its own interval."""
+    from .pipelines.slurm import daemon as slurm_daemon
+
+    try:
+        slurm_daemon.run(
+            intervals=intervals,
+            jitter=jitter,
+            max_backoff=max_backoff,
+            load_options={
+                "destination": destination,
+                "lake_path": lake_path,
+                "publish_dir": None if no_publish else publish_dir,
+                "publish_interval": publish_interval,
+            },
+            metrics_port=metrics_port,
+        )
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+
+@cli.command()
+@click.option(
+    "--config",
+    "clusters_file",
+    default="clusters.toml",
+    show_default=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="TOML file with one [clusters.<name>] table per cluster.",
+)
+@click.option(
+    "--workers",
+    "max_workers",
+    default=4,
+    show_default=True,
+    help="Maximum number of clusters ingested at the same time.",
+)
+@click.option(
+    "--destination",
+    type=click.Choice(["duckdb", "parquet"]),
+    default="duckdb",
+    show_default=True,
+    help="Load into slurm_pipeline.duckdb, or into a partitioned Parquet lake.",
+)
+@click.option(
+    "--lake-path",
+    default="slurm_lake",
+    show_default=True,
+    help="Directory of the Parquet lake, with --destination parquet.",
+)
+@click.option(
+    "--publish-dir",
+    default="published",
+    show_default=True,
+    help="Directory of the read-only database snapshots for the dashboard, "
+    "with --destination duckdb.",
+)
+def clusters(clusters_file, max_workers, destination, lake_path, publish_dir):
+    """Ingest several clusters in parallel, into shared tables."""
+    from .pipelines.slurm import clusters as slurm_clusters
+
+    try:
+        summaries = slurm_clusters.run(
+            clusters_file,
+            max_workers=max_workers,
+            destination=destination,
+            lake_path=lake_path,
+            publish_dir=publish_dir,
+        )
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    for summary in summaries:
+        status = "ok" if summary["ok"] else f"failed: {summary['error']}"
+        click.echo(f"{summary['cluster']:<20} {summary['seconds']:>8.2f}s  {status}")
+    if not all(summary["ok"] for summary in summaries):
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,163 @@
+"""
+Query result cache for the dashboards.
+
+Streamlit re-runs the whole dashboard script on every widget change, and
+with it every query. Results only change when the pipeline loads new data,
+so they are cached keyed on (query, parameters, data version). The data
+version is the completion time of the latest dlt load, so cached results are
+dropped exactly when a new load lands, also when its load id is older than
+that of a load before it.
+
+Queries either run on a single connection, one at a time, or on a
+:class:`~slurm_monitor.dashboards.pool.ReadOnlyPool` of connections to the
+published snapshot, where the snapshot itself is the data version and several
+sessions can query at once.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+from slurm_monitor.dashboards.pool import ReadOnlyPool
+
+DEFAULT_MAX_ENTRIES = 128
+"""Maximum number of cached results"""
+
+DEFAULT_MAX_BYTES = 64 * 2**20
+"""Maximum total size of the cached results in bytes"""
+
+DATA_VERSION_QUERY = (
+    "SELECT max(inserted_at)::VARCHAR FROM slurm_data._dlt_loads WHERE status = 0"
+)
+"""Query returning the completion time of the latest successful load"""
+
+
+class QueryCache:
+    """
+    LRU cache of query results, invalidated by new pipeline loads.
+
+    Parameters
+    ----------
+    conn : duckdb.DuckDBPyConnection or ReadOnlyPool
+        The connection, or pool of connections, to run the queries on
+    max_entries : int, optional
+        Maximum number of cached results (default: 128)
+    max_bytes : int, optional
+        Maximum total size of the cached results (default: 64 MiB)
+    version_query : str, optional
+        Query returning the current data version
+    on_new_version : callable, optional
+        Called with the connection whenever the data version changes, before
+        the next query runs, e.g. to create views over new files
+    """
+
+    def __init__(
+        self,
+        conn: Any,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        version_query: str = DATA_VERSION_QUERY,
+        on_new_version: Optional[Callable[[Any], Any]] = None,
+    ):
+        self.conn = conn
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version_query = version_query
+        self.on_new_version = on_new_version
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Streamlit runs every browser session in its own thread, and a DuckDB
+        # connection must not be used by several threads at once
+        self._conn_lock = threading.Lock()
+
+    @property
+    def pooled(self) -> bool:
+        """Whether queries run on a pool of connections"""
+        return isinstance(self.conn, ReadOnlyPool)
+
+    def data_version(self) -> Optional[str]:
+        """The version of the data, or None without any loads"""
+        if self.pooled:
+            return self.conn.snapshot()
+        try:
+            with self._conn_lock:
+                return self.conn.execute(self.version_query).fetchone()[0]
+        except Exception:
+            # No pipeline has run yet, so there is no _dlt_loads table
+            return None
+
+    def _execute(self, sql: str, params: Sequence[Any]) -> Any:
+        if self.pooled:
+            return self.conn.execute(sql, list(params))
+        with self._conn_lock:
+            return self.conn.execute(sql, list(params)).df()
+
+    def _check_version(self):
+        version = self.data_version()
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self.version = version
+            if self.on_new_version is not None:
+                with self._conn_lock:
+                    self.on_new_version(self.conn)
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> Any:
+        """
+        Run ``sql`` with ``params`` and return a DataFrame, cached.
+
+        The returned DataFrame is a copy, so callers may modify it.
+        """
+        with self._lock:
+            self._check_version()
+            key = (sql, tuple(params), self.version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0].copy()
+            self.misses += 1
+        # The query runs unlocked, so other sessions are not held up by it
+        result = self._execute(sql, params)
+        size = int(result.memory_usage(deep=True).sum())
+        with self._lock:
+            # Results of a query that raced with a new load are not cached
+            if key[2] == self.version:
+                self._entries[key] = (result, size)
+                self._bytes += size
+                self._evict()
+        return result.copy()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counts and size of the cache, e.g. for a debug panel"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "data_version": self.version,
+                "entries": len(self._entries),
+                "size_kib": round(self._bytes / 1024, 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+            if self.pooled:
+                stats["connections_opened"] = self.conn.opened
+            return stats
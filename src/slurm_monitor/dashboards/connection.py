@@ -0,0 +1,40 @@
+"""
+The query cache shared by all pages of the dashboard.
+
+Streamlit runs every page as a script of its own, but resources cached with
+``st.cache_resource`` live as long as the server, so all pages and sessions
+share one :class:`~slurm_monitor.dashboards.cache.QueryCache`.
+"""
+
+import os
+
+import duckdb
+import streamlit as st
+
+from slurm_monitor.dashboards.cache import QueryCache
+from slurm_monitor.dashboards.pool import ReadOnlyPool
+from slurm_monitor.pipelines.slurm.lake import create_lake_views, loads_version_query
+
+# Directory of a Parquet lake written with ``--destination parquet``. If set,
+# the dashboard reads the lake instead of slurm_pipeline.duckdb.
+LAKE_PATH = os.environ.get("SLURM_MONITOR_LAKE")
+
+# Directory of the snapshots published by the pipeline after every load. The
+# dashboard never opens slurm_pipeline.duckdb itself, which the pipeline holds
+# open for writing.
+PUBLISH_DIR = os.environ.get("SLURM_MONITOR_PUBLISHED", "published")
+
+
+# Cache query results until the pipeline loads new data
+@st.cache_resource
+def get_query_cache():
+    if LAKE_PATH:
+        # An in-memory database reading the lake. New loads may add tables,
+        # so the views are refreshed along with the cache.
+        return QueryCache(
+            duckdb.connect(),
+            version_query=loads_version_query(LAKE_PATH),
+            on_new_version=lambda conn: create_lake_views(conn, LAKE_PATH),
+        )
+    # Read-only connections to the latest published snapshot
+    return QueryCache(ReadOnlyPool(PUBLISH_DIR))
@@ -0,0 +1,169 @@
+from datetime import datetime, time, timedelta, timezone
+
+import plotly.express as px
+import streamlit as st
+
+from slurm_monitor.dashboards.connection import LAKE_PATH, get_query_cache
+
+# Columns of the usage rollup to group and rank by
+GROUPS = {"User": "user_name", "Account": "account", "QoS": "qos"}
+METRICS = {"CPU-hours": "cpu_hours", "GPU-hours": "gpu_hours", "Jobs": "job_count"}
+
+st.set_page_config(
+    page_title="SLURM Usage",
+    page_icon="📊",
+    layout="wide",
+)
+
+cache = get_query_cache()
+
+st.title("Usage by User, Account and QoS")
+st.markdown(
+    """
+CPU-hours, GPU-hours and number of the finished jobs in the slurmdb accounting
+history. Jobs count on the day they ended. This page only reads the daily usage
+rollup maintained by the pipeline (see pipelines/slurm/rollups.py), so a year
+of history renders as fast as a week.
+"""
+)
+
+st.sidebar.header("Filters")
+
+try:
+    days_query = """
+    SELECT
+        MIN(day) as first_day,
+        MAX(day) as last_day
+    FROM slurm_data.usage_daily
+    """
+    days = cache.query(days_query).iloc[0]
+
+    if days.notna().all():
+        first_day = datetime.fromtimestamp(int(days["first_day"]), timezone.utc).date()
+        last_day = datetime.fromtimestamp(int(days["last_day"]), timezone.utc).date()
+
+        date_range = st.sidebar.date_input(
+            "Date Range",
+            value=(max(first_day, last_day - timedelta(days=365)), last_day),
+            min_value=first_day,
+            max_value=last_day,
+        )
+        clusters_query = (
+            "SELECT DISTINCT cluster FROM slurm_data.usage_daily ORDER BY cluster"
+        )
+        clusters = cache.query(clusters_query)["cluster"].tolist()
+        selected_clusters = st.sidebar.multiselect(
+            "Clusters", options=clusters, default=clusters
+        )
+        group_label = st.sidebar.radio("Group by", list(GROUPS))
+        metric_label = st.sidebar.radio("Rank by", list(METRICS))
+        top_n = st.sidebar.slider("Top", min_value=5, max_value=50, value=10)
+        group, metric = GROUPS[group_label], METRICS[metric_label]
+
+        if len(date_range) == 2 and selected_clusters:
+            start_date, end_date = date_range
+            start_day = int(
+                datetime.combine(start_date, time.min, timezone.utc).timestamp()
+            )
+            end_day = int(
+                datetime.combine(end_date, time.min, timezone.utc).timestamp()
+            )
+            # The lake partitions of the rollup are the days themselves
+            usage_dates = ""
+            if LAKE_PATH:
+                usage_dates = f"AND date BETWEEN '{start_date}' AND '{end_date}'"
+            usage_filter = f"""
+            day BETWEEN {start_day} AND {end_day}
+            {usage_dates}
+            AND cluster IN ({", ".join(["?" for _ in selected_clusters])})
+            """
+
+            st.header(f"Top {top_n} by {metric_label}")
+
+            top_query = f"""
+            SELECT
+                {group} as name,
+                SUM(job_count) as job_count,
+                SUM(cpu_hours) as cpu_hours,
+                SUM(gpu_hours) as gpu_hours,
+                SUM({metric}) / SUM(SUM({metric})) OVER () as share
+            FROM slurm_data.usage_daily
+            WHERE {usage_filter}
+            GROUP BY ALL
+            ORDER BY {metric} DESC
+            LIMIT {top_n}
+            """
+
+            top_df = cache.query(top_query, selected_clusters)
+
+            if not top_df.empty:
+                col1, col2 = st.columns([2, 1])
+                with col1:
+                    fig = px.bar(
+                        top_df,
+                        x="name",
+                        y=metric,
+                        title=f"{metric_label} per {group_label}",
+                        labels={"name": group_label, metric: metric_label},
+                        color_discrete_sequence=px.colors.qualitative.Safe,
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
+                with col2:
+                    top_df["share"] = (top_df["share"] * 100).round(1)
+                    st.dataframe(
+                        top_df.round(1).rename(
+                            columns={
+                                "name": group_label,
+                                "job_count": "Jobs",
+                                "cpu_hours": "CPU-hours",
+                                "gpu_hours": "GPU-hours",
+                                "share": f"% of {metric_label}",
+                            }
+                        ),
+                        hide_index=True,
+                        use_container_width=True,
+                    )
+
+                # Trend of the top consumers, by month for long ranges
+                period = (
+                    "month" if end_date - start_date > timedelta(days=92) else "day"
+                )
+                names = top_df["name"].tolist()
+                trend_query = f"""
+                SELECT
+                    date_trunc('{period}', epoch_ms(day * 1000))::DATE as period,
+                    {group} as name,
+                    SUM({metric}) as value
+                FROM slurm_data.usage_daily
+                WHERE {usage_filter}
+                    AND {group} IN ({", ".join(["?" for _ in names])})
+                GROUP BY ALL
+                ORDER BY period
+                """
+                trend_df = cache.query(trend_query, [*selected_clusters, *names])
+
+                fig = px.bar(
+                    trend_df,
+                    x="period",
+                    y="value",
+                    color="name",
+                    title=f"{metric_label} per {period} of the top {group_label}s",
+                    labels={
+                        "period": period.capitalize(),
+                        "value": metric_label,
+                        "name": group_label,
+                    },
+                )
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("No usage data available for the selected filters")
+    else:
+        st.warning(
+            "No usage data available in the database. Please load the slurmdb job history first."
+        )
+
+except Exception as e:
+    st.error(f"Error accessing database: {str(e)}")
+    st.info(
+        "Please run the SLURM data pipeline with the slurmdb endpoints first to collect the accounting history."
+    )
@@ -0,0 +1,108 @@
+"""
+Pool of read-only DuckDB connections to the latest published snapshot.
+
+The pipeline publishes immutable snapshots of its database (see
+pipelines/slurm/publish.py). Connections are opened read-only on the snapshot
+named by the pointer file at checkout time. When a newer snapshot is
+published, idle connections to older ones are closed, and connections still
+checked out are closed when they are returned.
+"""
+
+import contextlib
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+import duckdb
+
+from slurm_monitor.pipelines.slurm.publish import (
+    DEFAULT_PUBLISH_DIR,
+    published_snapshot,
+)
+
+DEFAULT_POOL_SIZE = 4
+"""Maximum number of connections, i.e. of concurrently running queries"""
+
+
+class SnapshotUnavailable(RuntimeError):
+    """Raised when no snapshot has been published yet"""
+
+
+class ReadOnlyPool:
+    """
+    Read-only connections to the latest published snapshot.
+
+    Parameters
+    ----------
+    publish_dir : str, optional
+        Directory of the published snapshots (default: ``published``)
+    size : int, optional
+        Maximum number of connections (default: 4)
+    """
+
+    def __init__(
+        self, publish_dir: str = DEFAULT_PUBLISH_DIR, size: int = DEFAULT_POOL_SIZE
+    ):
+        self.publish_dir = publish_dir
+        self.size = size
+        self._idle: Dict[str, List[Any]] = {}
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def snapshot(self) -> Optional[str]:
+        """Path of the snapshot new checkouts connect to"""
+        return published_snapshot(self.publish_dir)
+
+    def _close_stale(self, current: str):
+        for path in [path for path in self._idle if path != current]:
+            for conn in self._idle.pop(path):
+                conn.close()
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        Check out a connection to the latest snapshot.
+
+        Blocks while all ``size`` connections are in use.
+
+        Raises
+        ------
+        SnapshotUnavailable
+            If nothing has been published yet
+        """
+        path = self.snapshot()
+        if path is None or not os.path.exists(path):
+            raise SnapshotUnavailable(
+                f"No published snapshot in {self.publish_dir!r}, "
+                f"please run the SLURM data pipeline first"
+            )
+        with self._slots:
+            with self._lock:
+                self._close_stale(path)
+                idle = self._idle.setdefault(path, [])
+                conn = idle.pop() if idle else None
+            if conn is None:
+                conn = duckdb.connect(path, read_only=True)
+                self.opened += 1
+            try:
+                yield conn
+            finally:
+                with self._lock:
+                    if path == self.snapshot():
+                        self._idle.setdefault(path, []).append(conn)
+                    else:
+                        conn.close()
+
+    def execute(self, sql: str, params: Optional[List[Any]] = None) -> Any:
+        """Run ``sql`` on a pooled connection and return a DataFrame"""
+        with self.connection() as conn:
+            return conn.execute(sql, params or []).df()
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle.clear()
@@ -1,9 +1,17 @@
 from datetime import datetime, timedelta
 
-import duckdb
 import plotly.express as px
 import streamlit as st
 
+from slurm_monitor.dashboards.connection import LAKE_PATH, get_query_cache
+from slurm_monitor.pipelines.slurm.occupancy import (
+    JOB_COLUMNS,
+    job_intervals_sql,
+    occupancy_bucket,
+    occupancy_sql,
+)
+from slurm_monitor.pipelines.slurm.rollups import duration_summary_sql
+
 # Set page configuration
 st.set_page_config(
     page_title="SLURM Cluster Monitoring Dashboard",
@@ -11,14 +19,7 @@ st.set_page_config(
     layout="wide",
 )
 
-
-# Connect to the DuckDB database
-@st.cache_resource
-def get_connection():
-    return duckdb.connect("./slurm_pipeline.duckdb")
-
-
-conn = get_connection()
+cache = get_query_cache()
 
 # Title and description
 st.title("SLURM Cluster Monitoring Dashboard")
@@ -36,18 +37,20 @@ st.sidebar.header("Filters")
 
 # Check if we have data in the database
 try:
-    # Get available time range from jobs table
+    # Get available time range from the hourly job rollup. The widgets below
+    # only read the rollup tables maintained by the pipeline (see
+    # pipelines/slurm/rollups.py), so they do not scan the job history.
     time_query = """
     SELECT
-        MIN(submit_time) as min_time,
-        MAX(submit_time) as max_time
-    FROM slurm_data.v0_0_38_jobs
+        MIN(hour) as min_time,
+        MAX(hour) as max_time
+    FROM slurm_data.jobs_hourly
     """
-    time_range = conn.execute(time_query).fetchone()
+    time_range = cache.query(time_query).iloc[0]
 
-    if time_range and time_range[0] and time_range[1]:
-        min_date = datetime.fromtimestamp(time_range[0])
-        max_date = datetime.fromtimestamp(time_range[1])
+    if time_range.notna().all():
+        min_date = datetime.fromtimestamp(int(time_range["min_time"]))
+        max_date = datetime.fromtimestamp(int(time_range["max_time"]))
 
         # Date range selector
         date_range = st.sidebar.date_input(
@@ -66,10 +69,20 @@ try:
             end_timestamp = int(
                 datetime.combine(end_date, datetime.max.time()).timestamp()
             )
+            # In the lake, filters on the (UTC) date partitions let DuckDB skip
+            # the files of other days. Rollups are partitioned by the day of
+            # submission, the job tables by the day of the load, which is
+            # never before the submission.
+            rollup_dates = job_dates = ""
+            if LAKE_PATH:
+                first_day = start_date - timedelta(days=1)
+                last_day = end_date + timedelta(days=1)
+                rollup_dates = f"AND date BETWEEN '{first_day}' AND '{last_day}'"
+                job_dates = f"AND date >= '{first_day}'"
 
             # Get partitions for filtering
             partitions_query = "SELECT DISTINCT name FROM slurm_data.v0_0_38_partitions_overview ORDER BY name"
-            partitions = [row[0] for row in conn.execute(partitions_query).fetchall()]
+            partitions = cache.query(partitions_query)["name"].tolist()
 
             selected_partitions = st.sidebar.multiselect(
                 "Partitions", options=partitions, default=partitions
@@ -85,15 +98,32 @@ try:
                 # Node status summary
                 st.subheader("Node Status")
 
-                nodes_query = """
+                # In the lake, the node table gets a new row whenever a node
+                # changes. Nodes of different clusters may share a name, the
+                # cluster column only exists with the multi-cluster orchestrator.
+                node_columns_query = """
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_schema = 'slurm_data'
+                    AND table_name = 'v0_0_38_nodes_overview'
+                """
+                node_columns = cache.query(node_columns_query)["column_name"].tolist()
+                node_key = "cluster, name" if "cluster" in node_columns else "name"
+                nodes_query = f"""
                 SELECT
                     state,
                     COUNT(*) as count
-                FROM slurm_data.v0_0_38_nodes__nodes
+                FROM (
+                    SELECT state
+                    FROM slurm_data.v0_0_38_nodes_overview
+                    QUALIFY row_number() OVER (
+                        PARTITION BY {node_key} ORDER BY _dlt_load_id DESC
+                    ) = 1
+                )
                 GROUP BY state
                 """
 
-                nodes_df = conn.execute(nodes_query).df()
+                nodes_df = cache.query(nodes_query)
 
                 if not nodes_df.empty:
                     # Create a pie chart for node states
@@ -115,16 +145,15 @@ try:
                 jobs_query = f"""
                 SELECT
                     job_state,
-                    COUNT(*) as count
-                FROM slurm_data.v0_0_38_jobs
-                WHERE submit_time BETWEEN {start_timestamp} AND {end_timestamp}
+                    SUM(job_count) as count
+                FROM slurm_data.jobs_hourly
+                WHERE hour BETWEEN {start_timestamp} AND {end_timestamp}
+                {rollup_dates}
                 {f"AND partition IN ({', '.join(['?' for _ in selected_partitions])})" if selected_partitions else ""}
                 GROUP BY job_state
                 """
 
-                jobs_df = conn.execute(
-                    jobs_query, selected_partitions if selected_partitions else []
-                ).df()
+                jobs_df = cache.query(jobs_query, selected_partitions)
 
                 if not jobs_df.empty:
                     # Create a pie chart for job states
@@ -146,20 +175,18 @@ try:
             partition_usage_query = f"""
             SELECT
                 partition,
-                COUNT(*) as job_count,
-                SUM(cpus) as total_cpus,
-                AVG(cpus) as avg_cpus_per_job
-            FROM slurm_data.v0_0_38_jobs
-            WHERE submit_time BETWEEN {start_timestamp} AND {end_timestamp}
+                SUM(job_count) as job_count,
+                SUM(cpu_sum) as total_cpus,
+                SUM(cpu_sum) / SUM(job_count) as avg_cpus_per_job
+            FROM slurm_data.jobs_hourly
+            WHERE hour BETWEEN {start_timestamp} AND {end_timestamp}
+            {rollup_dates}
             {f"AND partition IN ({', '.join(['?' for _ in selected_partitions])})" if selected_partitions else ""}
             GROUP BY partition
             ORDER BY total_cpus DESC
             """
 
-            partition_usage_df = conn.execute(
-                partition_usage_query,
-                selected_partitions if selected_partitions else [],
-            ).df()
+            partition_usage_df = cache.query(partition_usage_query, selected_partitions)
 
             if not partition_usage_df.empty:
                 # Bar chart for CPU usage by partition
@@ -182,41 +209,108 @@ try:
                     "No resource utilization data available for the selected filters"
                 )
 
+            # Allocated CPUs per partition over time, swept from the job
+            # intervals inside DuckDB (see pipelines/slurm/occupancy.py)
+            st.header("Cluster Occupancy")
+
+            job_columns_query = f"""
+            SELECT table_name, list(column_name) AS columns
+            FROM information_schema.columns
+            WHERE table_schema = 'slurm_data'
+                AND table_name IN ({", ".join(f"'{name}'" for name in JOB_COLUMNS)})
+            GROUP BY table_name
+            """
+            job_columns = dict(cache.query(job_columns_query).itertuples(index=False))
+            intervals = job_intervals_sql(job_columns)
+            bucket = occupancy_bucket(start_timestamp, end_timestamp)
+            # Rounded up to a whole bucket, so that reruns hit the cache
+            now = int(datetime.now().timestamp())
+            occupancy_end = min(end_timestamp, now - now % bucket + bucket)
+
+            if intervals and occupancy_end > start_timestamp:
+                occupancy_query = f"""
+                SELECT *
+                FROM ({occupancy_sql(intervals, start_timestamp, occupancy_end, bucket)})
+                {f"WHERE partition IN ({', '.join(['?' for _ in selected_partitions])})" if selected_partitions else ""}
+                """
+                occupancy_df = cache.query(occupancy_query, selected_partitions)
+            else:
+                occupancy_df = None
+
+            if occupancy_df is not None and not occupancy_df.empty:
+                occupancy = occupancy_df.pivot(
+                    index="partition", columns="ts", values="alloc_cpus"
+                )
+                fig = px.imshow(
+                    occupancy,
+                    x=[datetime.fromtimestamp(ts) for ts in occupancy.columns],
+                    aspect="auto",
+                    title=f"Allocated CPUs per Partition ({bucket // 60} minute mean)",
+                    labels={
+                        "x": "Time",
+                        "y": "Partition",
+                        "color": "Allocated CPUs",
+                    },
+                    color_continuous_scale=px.colors.sequential.Viridis,
+                )
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("No job intervals available for the selected filters")
+
             # Job duration distribution
             st.header("Job Duration Analysis")
 
+            # Binning, means and quantiles all happen in DuckDB, on the
+            # duration buckets of the rollup, so only a few rows per
+            # partition reach pandas and Plotly however long the history is
+            duration_rollup = f"""
+            SELECT *
+            FROM slurm_data.jobs_duration_hourly
+            WHERE
+                hour BETWEEN {start_timestamp} AND {end_timestamp}
+                {rollup_dates}
+                {f"AND partition IN ({', '.join(['?' for _ in selected_partitions])})" if selected_partitions else ""}
+            """
+
             duration_query = f"""
             SELECT
-                job_id,
+                duration_bucket as duration_minutes,
                 partition,
-                (end_time - start_time) / 60 as duration_minutes
-                FROM slurm_data.v0_0_38_jobs
-            WHERE
-                submit_time BETWEEN {start_timestamp} AND {end_timestamp}
-                AND end_time > 0
-                AND start_time > 0
-                {f"AND partition IN ({', '.join(['?' for _ in selected_partitions])})" if selected_partitions else ""}
+                SUM(job_count) as count
+            FROM ({duration_rollup})
+            GROUP BY ALL
+            ORDER BY duration_minutes
             """
 
-            duration_df = conn.execute(
-                duration_query, selected_partitions if selected_partitions else []
-            ).df()
+            duration_df = cache.query(duration_query, selected_partitions)
 
             if not duration_df.empty:
-                # Histogram of job durations
-                fig = px.histogram(
+                # Histogram of job durations, pre-bucketed by the rollup
+                duration_df["duration_minutes"] = duration_df[
+                    "duration_minutes"
+                ].astype(str)
+                fig = px.bar(
                     duration_df,
                     x="duration_minutes",
+                    y="count",
                     color="partition",
-                    nbins=50,
                     title="Job Duration Distribution (minutes)",
                     labels={
-                        "duration_minutes": "Duration (minutes)",
+                        "duration_minutes": "Duration (minutes, at least)",
                         "count": "Number of Jobs",
                     },
                     opacity=0.7,
                 )
                 st.plotly_chart(fig, use_container_width=True)
+
+                # Per-partition summary, quantiles estimated from the buckets
+                st.subheader("Job Duration by Partition (minutes)")
+                summary_df = cache.query(
+                    duration_summary_sql(duration_rollup), selected_partitions
+                )
+                st.dataframe(
+                    summary_df.round(1), hide_index=True, use_container_width=True
+                )
             else:
                 st.info("No job duration data available for the selected filters")
 
@@ -224,21 +318,20 @@ try:
             with st.expander("View Raw Data"):
                 st.subheader("Nodes Data")
                 nodes_raw_query = (
-                    "SELECT * FROM slurm_data.v0_0_38_nodes__nodes LIMIT 100"
+                    "SELECT * FROM slurm_data.v0_0_38_nodes_overview LIMIT 100"
                 )
-                nodes_raw_df = conn.execute(nodes_raw_query).df()
+                nodes_raw_df = cache.query(nodes_raw_query)
                 st.dataframe(nodes_raw_df)
 
                 st.subheader("Jobs Data")
                 jobs_raw_query = f"""
                 SELECT * FROM slurm_data.v0_0_38_jobs
                 WHERE submit_time BETWEEN {start_timestamp} AND {end_timestamp}
+                {job_dates}
                 {f"AND partition IN ({', '.join(['?' for _ in selected_partitions])})" if selected_partitions else ""}
                 LIMIT 100
                 """
-                jobs_raw_df = conn.execute(
-                    jobs_raw_query, selected_partitions if selected_partitions else []
-                ).df()
+                jobs_raw_df = cache.query(jobs_raw_query, selected_partitions)
                 st.dataframe(jobs_raw_df)
     else:
         st.warning(
@@ -251,6 +344,11 @@ except Exception as e:
         "Please run the SLURM data pipeline first to collect data from your SLURM cluster."
     )
 
+# Debug panel
+with st.sidebar.expander("Debug"):
+    st.caption("Query cache, invalidated by every new pipeline load")
+    st.json(cache.stats())
+
 # Footer
 st.markdown("---")
 st.markdown(
@@ -0,0 +1,181 @@
+"""
+Time-windowed backfill of the slurmdb job history.
+
+Requesting ``/slurmdb/v0.0.38/jobs`` without a time range returns the entire
+accounting history in one response. Instead, the range is split into fixed
+windows (one day by default) which are fetched in parallel, each with its own
+``start_time``/``end_time``. Windows that lie completely in the past are
+checkpointed in the dlt resource state, so an interrupted backfill resumes
+where it stopped and later runs only fetch the open tail window.
+"""
+
+import time
+from datetime import datetime, timezone
+from typing import Any, Iterator, List, Optional, Tuple, Union
+
+import dlt
+import requests
+from dlt.extract.source import DltResource
+
+from ...logging import logger
+from .fanout import DEFAULT_MAX_IN_FLIGHT, extract_data, ordered_map
+from .metrics import endpoint_hooks
+from .streaming import iter_response_records
+
+DEFAULT_WINDOW = 86400
+"""Length of one backfill window in seconds (one day)"""
+
+TimeLike = Union[int, float, str, datetime]
+
+
+def to_timestamp(value: TimeLike) -> int:
+    """
+    Convert a unix timestamp, ISO 8601 string or datetime to a unix timestamp.
+
+    Naive dates and datetimes are interpreted as UTC.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def split_windows(start: int, end: int, window: int) -> List[Tuple[int, int]]:
+    """
+    Split ``[start, end)`` into windows aligned to multiples of ``window``.
+
+    Aligning to the epoch keeps the window boundaries stable between runs,
+    even if ``start`` changes.
+    """
+    first = start - start % window
+    return [(lo, lo + window) for lo in range(first, end, window)]
+
+
+def merge_ranges(ranges: List[List[int]]) -> List[List[int]]:
+    """Merge overlapping or adjacent ``[start, end)`` ranges"""
+    merged: List[List[int]] = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+def is_covered(ranges: List[List[int]], window: Tuple[int, int]) -> bool:
+    """Whether ``window`` lies completely inside one of the merged ``ranges``"""
+    return any(lo <= window[0] and window[1] <= hi for lo, hi in ranges)
+
+
+def backfill_resource(
+    name: str,
+    table_name: str,
+    path: str,
+    data_selector: str,
+    base_url: str,
+    session: requests.Session,
+    start: Optional[TimeLike] = None,
+    end: Optional[TimeLike] = None,
+    window: int = DEFAULT_WINDOW,
+    max_windows: Optional[int] = None,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    stream: bool = True,
+) -> DltResource:
+    """
+    Create a resource fetching ``path`` window by window.
+
+    Parameters
+    ----------
+    name : str
+        Name of the resource
+    table_name : str
+        Destination table of the resource
+    path : str
+        Endpoint path accepting ``start_time`` and ``end_time``,
+        e.g. ``/slurmdb/v0.0.38/jobs``
+    data_selector : str
+        JSONPath selecting the records in each response
+    base_url : str
+        The base URL to use for the requests
+    session : requests.Session
+        Session used for all requests
+    start : int, str or datetime, optional
+        Beginning of the history to backfill. Defaults to the end of the last
+        completed window or the open window of the last run, whichever is
+        earlier, or to the current window on the first run.
+    end : int, str or datetime, optional
+        End of the history to backfill (default: now)
+    window : int, optional
+        Length of one window in seconds (default: one day)
+    max_windows : int, optional
+        Fetch at most this many windows per run, oldest first. Use this to
+        bound the size of a single load while backfilling long histories.
+    max_in_flight : int, optional
+        Number of windows fetched concurrently (default: 8)
+    stream : bool, optional
+        Parse each response while it is received (default: True). Only the
+        records of the windows in flight are held in memory, never the raw
+        response bodies.
+
+    Returns
+    -------
+    DltResource
+    """
+
+    def fetch_window(bounds: Tuple[int, int]) -> List[Any]:
+        params = {"start_time": bounds[0], "end_time": bounds[1]}
+        with session.get(
+            f"{base_url}{path}",
+            params=params,
+            stream=stream,
+            hooks=endpoint_hooks(path),
+        ) as response:
+            response.raise_for_status()
+            if not stream:
+                return extract_data(response.json(), data_selector)
+            return [
+                record
+                for records in iter_response_records(response, data_selector)
+                for record in records
+            ]
+
+    def fetch() -> Iterator[List[Any]]:
+        state = dlt.current.resource_state()
+        completed = state.setdefault("completed", [])
+        now = int(time.time())
+        if start is not None:
+            lower = to_timestamp(start)
+        else:
+            # Continue after the last completed window, or with the open tail
+            # window of the previous run, which may have closed since
+            resume = [completed[-1][1]] if completed else []
+            if "tail_start" in state:
+                resume.append(state["tail_start"])
+            lower = min(resume) if resume else now
+        upper = to_timestamp(end) if end is not None else now
+        windows = [
+            bounds
+            for bounds in split_windows(lower, max(upper, lower + 1), window)
+            if not is_covered(completed, bounds)
+        ]
+        todo = windows[:max_windows] if max_windows else windows
+        logger.info(
+            f"{name}: fetching {len(todo)} of {len(windows)} pending windows "
+            f"of {window}s, {max_in_flight} at a time"
+        )
+        results = ordered_map(fetch_window, todo, max_in_flight)
+        for bounds, records in zip(todo, results):
+            if records:
+                yield records
+            # The open tail window is fetched again on the next run
+            if bounds[1] <= now:
+                completed.append(list(bounds))
+                completed[:] = merge_ranges(completed)
+            else:
+                state["tail_start"] = bounds[0]
+        state["pending_windows"] = len(windows) - len(todo)
+
+    return dlt.resource(fetch, name=name, table_name=table_name)
@@ -0,0 +1,181 @@
+"""
+Skip job and node rows which did not change since they were last loaded.
+
+slurmrestd reports the complete record of every job and node it returns, and
+most of them are the same as in the previous cycle: every full pull, the
+``update_time`` overlap and the per-entity requests repeat rows which are in
+the tables already. Appending them again makes every load as large as the
+queue, and normalizing and loading them dominates the cycle.
+
+Before the extract, :meth:`ChangeTracker.track` adds a filter to the job and
+node resources (see :data:`CHANGE_KEYS`) which hashes every row and drops
+those whose hash is the one stored for their key. Only new and changed rows
+are normalized and loaded, so the work per cycle follows the churn instead of
+the size of the queue. The per-entity resources are fanned out from the
+filtered overview rows (see fanout.py), so unchanged jobs and nodes are not
+requested one by one either.
+
+The keys are the merge keys of the tables (``SLURM_TABLE_KEYS`` in
+dlt_sources.py), so a skipped row is the one row of its key in the merged
+table already. The hashes are kept in ``row_hashes``, keyed by table, cluster
+and key. After a successful load, the hashes of the loaded rows are upserted
+with ``INSERT OR REPLACE`` from an Arrow table, and so are those of the rows
+seen unchanged, at most every half :data:`HASH_RETENTION`. Hashes of entities
+which were not seen for :data:`HASH_RETENTION`, such as finished jobs, are
+dropped.
+
+Only the DuckDB destination keeps the hashes, the Parquet lake loads all
+rows. Resources whose table name depends on the data (e.g. the CLI backend)
+are not filtered.
+"""
+
+import hashlib
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+import dlt
+import pyarrow as pa
+from dlt.common.json import json
+
+from ...logging import logger
+from .dlt_sources import SLURM_TABLE_KEYS
+from .rollups import table_exists
+
+CHANGE_KEYS = {
+    # The key column of the merge key, besides the cluster
+    table: SLURM_TABLE_KEYS[table][-1]
+    for table in ("v0_0_38_jobs_overview", "v0_0_38_jobs", "v0_0_38_nodes_overview")
+}
+"""The tables whose unchanged rows are skipped, and their key column"""
+
+HASHES_TABLE = "row_hashes"
+"""The table keeping the hash of the last loaded row of every key"""
+
+HASHES_COLUMNS = (
+    "table_name VARCHAR, cluster VARCHAR, key VARCHAR, hash BIGINT, "
+    "updated BIGINT, PRIMARY KEY (table_name, cluster, key)"
+)
+"""Columns of :data:`HASHES_TABLE`"""
+
+HASH_RETENTION = 7 * 86400
+"""Seconds after the hash of an entity was last stored or seen that it is dropped"""
+
+
+def row_hash(row: Dict[str, Any]) -> int:
+    """64-bit hash of all fields of ``row``, independent of their order"""
+    digest = hashlib.blake2b(json.dumpb(row, sort_keys=True), digest_size=8)
+    return int.from_bytes(digest.digest(), "little", signed=True)
+
+
+class ChangeTracker:
+    """
+    Filters unchanged rows out of the resources of one pipeline run.
+
+    Parameters
+    ----------
+    pipeline : dlt.Pipeline
+        A pipeline with a DuckDB destination. The stored hashes are read
+        from its dataset right away.
+    """
+
+    def __init__(self, pipeline: dlt.Pipeline):
+        self.pipeline = pipeline
+        # (table, cluster, key) -> hash, of the loaded rows
+        self.known: Dict[Tuple[str, str, str], int] = {}
+        # (table, cluster, key) -> when its hash was stored
+        self.updated: Dict[Tuple[str, str, str], int] = {}
+        # Hashes of the rows passed on in this run, stored by commit()
+        self.pending: Dict[Tuple[str, str, str], int] = {}
+        # Keys of the rows skipped in this run, refreshed by commit()
+        self.seen: Set[Tuple[str, str, str]] = set()
+        self.skipped: Dict[str, int] = {}
+        with pipeline.sql_client() as client:
+            if client.has_dataset() and table_exists(client, HASHES_TABLE):
+                rows = client.execute_sql(
+                    f"SELECT table_name, cluster, key, hash, updated "
+                    f"FROM {client.make_qualified_table_name(HASHES_TABLE)}"
+                )
+                for t, c, k, h, updated in rows:
+                    self.known[t, c, k] = h
+                    self.updated[t, c, k] = updated
+        logger.debug(f"...{len(self.known)} row hashes of {pipeline.pipeline_name}")
+
+    def _filter(self, table: str, key_column: str):
+        def changed(row: Dict[str, Any]) -> bool:
+            if row.get(key_column) is None:
+                return True
+            key = (table, row.get("cluster") or "", str(row[key_column]))
+            value = row_hash(row)
+            if self.known.get(key) == value:
+                self.skipped[table] = self.skipped.get(table, 0) + 1
+                self.seen.add(key)
+                return False
+            self.pending[key] = value
+            return True
+
+        return changed
+
+    def track(self, source: Any) -> Any:
+        """
+        Add the filter to the resources of ``source`` loading a table of
+        :data:`CHANGE_KEYS`. Call after all other maps (e.g. the cluster tag),
+        so that the hash covers the row as it is loaded.
+        """
+        for resource in source.resources.values():
+            table = resource.table_name
+            if isinstance(table, str) and table in CHANGE_KEYS:
+                resource.add_filter(self._filter(table, CHANGE_KEYS[table]))
+        return source
+
+    def commit(self, now: Optional[int] = None):
+        """
+        Store the hashes of the rows loaded by the run.
+
+        The hashes of skipped rows are stored again once they are half
+        :data:`HASH_RETENTION` old, so that entities which are still there
+        but do not change are not dropped and loaded once more.
+        """
+        for table, skipped in sorted(self.skipped.items()):
+            logger.info(f"...{table}: skipped {skipped} unchanged rows")
+        now = int(time.time()) if now is None else now
+        stale = now - HASH_RETENTION // 2
+        store = {
+            key: self.known[key]
+            for key in self.seen
+            if self.updated.get(key, 0) < stale and key not in self.pending
+        }
+        store.update(self.pending)
+        with self.pipeline.sql_client() as client:
+            if not client.has_dataset():
+                return
+            hashes = client.make_qualified_table_name(HASHES_TABLE)
+            client.execute_sql(
+                f"CREATE TABLE IF NOT EXISTS {hashes} ({HASHES_COLUMNS})"
+            )
+            if store:
+                tables, clusters, keys = zip(*store)
+                batch = pa.table(
+                    {
+                        "table_name": list(tables),
+                        "cluster": list(clusters),
+                        "key": list(keys),
+                        "hash": pa.array(list(store.values()), pa.int64()),
+                        "updated": pa.array([now] * len(keys), pa.int64()),
+                    }
+                )
+                # One bulk upsert of the Arrow buffers, keyed by the primary key
+                connection = client.native_connection
+                connection.register("changed_hashes", batch)
+                try:
+                    client.execute_sql(
+                        f"INSERT OR REPLACE INTO {hashes} SELECT * FROM changed_hashes"
+                    )
+                finally:
+                    connection.unregister("changed_hashes")
+            client.execute_sql(
+                f"DELETE FROM {hashes} WHERE updated < ?", now - HASH_RETENTION
+            )
+        self.known.update(self.pending)
+        self.updated.update(dict.fromkeys(store, now))
+        self.pending = {}
+        self.seen = set()
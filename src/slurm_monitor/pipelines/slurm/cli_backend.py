@@ -0,0 +1,338 @@
+"""
+SLURM CLI ingestion backend, used when slurmrestd is not reachable.
+
+All commands (``squeue --json``, ``sinfo --json``, ``sacct --parsable2``) run
+in a single remote invocation over one SSH channel. Their outputs are
+separated by marker lines and parsed while they stream in, see streaming.py.
+The records are written to the same tables the REST sources use, merged on
+the same keys.
+
+The layout of the ``--json`` output follows the OpenAPI plugin of the Slurm
+release, named in its ``meta`` object. Only the versions whose records match
+the ``v0.0.38`` tables are loaded (see :data:`CLI_JSON_VERSIONS`), any other
+output fails the load instead of silently loading nothing.
+"""
+
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+import dlt
+from dlt.extract.source import DltResource
+
+from ...logging import logger
+from .dlt_sources import DB_JOB_KEY, SLURM_TABLE_KEYS, fill_key
+from .streaming import DEFAULT_BATCH_SIZE, iter_json_items, iter_parsable2
+
+SECTION_MARKER = "@@slurm-monitor-section:"
+
+TABLE_KEYS = {**SLURM_TABLE_KEYS, "dbv0_0_38_jobs": DB_JOB_KEY}
+"""Keys of the tables written by the CLI backend, see dlt_sources.py"""
+
+CLI_JSON_PAYLOADS = {
+    # section: top-level key -> destination tables of its records
+    "squeue": {"jobs": ("v0_0_38_jobs_overview", "v0_0_38_jobs")},
+    "sinfo": {
+        "nodes": ("v0_0_38_nodes_overview",),
+        "partitions": ("v0_0_38_partitions_overview",),
+    },
+}
+"""The records of the ``--json`` sections and the tables they are loaded into"""
+
+CLI_JSON_VERSIONS = ("v0.0.37", "v0.0.38")
+"""Plugin versions of the ``--json`` output (Slurm 21.08 and 22.05) whose
+layout matches :data:`CLI_JSON_PAYLOADS`. Later versions (``data_parser``)
+changed the records, e.g. ``job_state`` became a list."""
+
+SACCT_FIELDS = [
+    "JobIDRaw",
+    "JobName",
+    "User",
+    "Account",
+    "Partition",
+    "QOS",
+    "Cluster",
+    "State",
+    "Submit",
+    "Start",
+    "End",
+    "ElapsedRaw",
+    "NCPUS",
+    "AllocTRES",
+    "NNodes",
+    "NodeList",
+    "ExitCode",
+]
+
+
+def cli_commands(sacct_starttime: str = "now-1days") -> Dict[str, str]:
+    """The command behind each section of the batched invocation"""
+    return {
+        "squeue": "squeue --all --json",
+        "sinfo": "sinfo --all --json",
+        # Epoch timestamps match the REST API, --allocations skips job steps
+        "sacct": (
+            "SLURM_TIME_FORMAT=%s sacct --allusers --allocations --parsable2 "
+            f"--starttime={sacct_starttime} --format={','.join(SACCT_FIELDS)}"
+        ),
+    }
+
+
+def batch_command(sections: Iterable[str], sacct_starttime: str = "now-1days") -> str:
+    """
+    Build one shell command running all ``sections`` one after the other.
+
+    Each output is preceded by a marker line with the section name. The
+    command exits with the status of the last failing section, so that a
+    failure in the middle of the batch is not mistaken for a success.
+    """
+    commands = cli_commands(sacct_starttime)
+    runs = "; ".join(
+        f"echo '{SECTION_MARKER}{section}'; {commands[section]} || status=$?"
+        for section in sections
+    )
+    return f"status=0; {runs}; exit $status"
+
+
+def section_name(line: str):
+    """Return the section name if ``line`` is a marker line, else None"""
+    if line.startswith(SECTION_MARKER):
+        return line[len(SECTION_MARKER) :].strip()
+    return None
+
+
+def iter_sections(lines: Iterable[Any]) -> Iterator[Any]:
+    """
+    Split the batched output into sections, without buffering any of them.
+
+    Yields
+    ------
+    Tuple[str, Iterator[str]]
+        The section name and an iterator over its lines. Each iterator must
+        be consumed before advancing to the next section; unconsumed lines
+        are skipped.
+    """
+    lines = (
+        line.decode("utf-8") if isinstance(line, bytes) else line for line in lines
+    )
+    marker = [None]
+    for line in lines:
+        if section_name(line) is not None:
+            marker[0] = line
+            break
+
+    def body() -> Iterator[str]:
+        for line in lines:
+            if section_name(line) is not None:
+                marker[0] = line
+                return
+            yield line
+
+    while marker[0] is not None:
+        name = section_name(marker[0])
+        marker[0] = None
+        section = body()
+        yield name, section
+        for _ in section:
+            pass
+
+
+def _int(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        return 0
+
+
+MEMORY_UNITS = {"K": 1 / 1024, "M": 1, "G": 1024, "T": 1024 * 1024}
+"""Factors of the memory suffixes of sacct to megabytes"""
+
+
+def parse_tres(value: str) -> List[Dict[str, Any]]:
+    """
+    Parse a TRES string of sacct (e.g. ``cpu=4,mem=16G,gres/gpu=1``) into the
+    layout of the slurmdb TRES lists. Memory is counted in megabytes.
+    """
+    tres = []
+    for item in value.split(","):
+        key, _, count = item.partition("=")
+        if not key or not count:
+            continue
+        tres_type, _, name = key.partition("/")
+        factor = MEMORY_UNITS.get(count[-1])
+        try:
+            amount = float(count[:-1]) * factor if factor else float(count)
+        except ValueError:
+            continue
+        tres.append({"type": tres_type, "name": name or None, "count": int(amount)})
+    return tres
+
+
+def sacct_to_job(record: Dict[str, str]) -> Dict[str, Any]:
+    """Map one ``sacct`` record to the layout of the slurmdb ``/jobs`` records"""
+    return_code, _, signal = record.get("ExitCode", "0:0").partition(":")
+    return {
+        "job_id": _int(record["JobIDRaw"]),
+        "name": record.get("JobName"),
+        "user": record.get("User"),
+        "account": record.get("Account"),
+        "partition": record.get("Partition"),
+        "qos": record.get("QOS"),
+        "cluster": record.get("Cluster"),
+        "nodes": record.get("NodeList"),
+        "allocation_nodes": _int(record.get("NNodes", "0")),
+        # e.g. "CANCELLED by 1234"
+        "state": {"current": record.get("State", "").split(" ")[0]},
+        "time": {
+            "submission": _int(record.get("Submit", "0")),
+            "start": _int(record.get("Start", "0")),
+            "end": _int(record.get("End", "0")),
+            "elapsed": _int(record.get("ElapsedRaw", "0")),
+        },
+        "required": {"CPUs": _int(record.get("NCPUS", "0"))},
+        "tres": {"allocated": parse_tres(record.get("AllocTRES", ""))},
+        "exit_code": {
+            "return_code": _int(return_code),
+            "signal": {"signal_id": _int(signal)},
+        },
+    }
+
+
+def json_version(meta: Dict[str, Any]) -> Optional[str]:
+    """
+    The plugin version of ``--json`` output from its ``meta`` object.
+
+    Slurm 21.08 and 22.05 name it in ``plugin.type`` (``openapi/v0.0.38``),
+    later releases in ``plugin.data_parser`` (``data_parser/v0.0.40``).
+    """
+    plugin = meta.get("plugin") or {}
+    for field in ("data_parser", "type"):
+        value = plugin.get(field) or ""
+        if "/" in value:
+            return value.rsplit("/", 1)[1]
+    return None
+
+
+def iter_json_section(name: str, lines: Iterable[str]) -> Iterator[Any]:
+    """
+    Parse the ``--json`` output of ``name``, checking its layout version.
+
+    The records are streamed, so the ``meta`` object has to precede them, as
+    it does in the supported versions.
+
+    Yields
+    ------
+    Tuple[str, dict]
+        The destination table and one record
+
+    Raises
+    ------
+    ValueError
+        If the output is not of one of the :data:`CLI_JSON_VERSIONS`
+    """
+    payloads = CLI_JSON_PAYLOADS[name]
+    version = None
+    for key, item in iter_json_items(lines, {"meta", *payloads}):
+        if key == "meta":
+            version = json_version(item)
+            if version not in CLI_JSON_VERSIONS:
+                raise ValueError(
+                    f"Unsupported layout of the {name} --json output "
+                    f"({version or 'unknown version'}), supported are "
+                    f"{', '.join(CLI_JSON_VERSIONS)}"
+                )
+        elif version is None:
+            raise ValueError(
+                f"The {name} --json output has no version (meta) before its {key}"
+            )
+        else:
+            for table in payloads[key]:
+                yield table, item
+    if version is None:
+        raise ValueError(f"The {name} --json output has no version (meta)")
+
+
+def parse_section(name: str, lines: Iterable[str]) -> Iterator[Any]:
+    """
+    Parse the output of one section.
+
+    Yields
+    ------
+    Tuple[str, dict]
+        The destination table and one record
+    """
+    if name in CLI_JSON_PAYLOADS:
+        yield from iter_json_section(name, lines)
+    elif name == "sacct":
+        for record in iter_parsable2(lines):
+            yield "dbv0_0_38_jobs", sacct_to_job(record)
+    else:
+        raise ValueError(f"Unknown CLI section: {name}")
+
+
+def mark_table(batch: List[Any], table: str) -> Any:
+    """Route ``batch`` to ``table``, merged on its key from :data:`TABLE_KEYS`"""
+    key = TABLE_KEYS.get(table)
+    if key is None:
+        return dlt.mark.with_table_name(batch, table)
+    hints = dlt.mark.make_hints(
+        table_name=table, primary_key=list(key), write_disposition="merge"
+    )
+    return dlt.mark.with_hints(batch, hints, create_table_variant=True)
+
+
+@dlt.source(
+    name="slurm_cli_source",
+    max_table_nesting=2,
+)
+def slurm_cli_source(
+    stream_command: Callable[[str], ContextManager[Iterable[Any]]],
+    sections: Tuple[str, ...] = ("squeue", "sinfo", "sacct"),
+    sacct_starttime: str = "now-1days",
+) -> List[DltResource]:
+    """
+    A DLT source running the SLURM command line tools on the cluster.
+
+    Parameters
+    ----------
+    stream_command : callable
+        Runs a remote command, returning a context manager over its output
+        lines, e.g. :meth:`SSHTunnel.stream_command`
+    sections : tuple of str, optional
+        Commands to run: any of ``"squeue"``, ``"sinfo"`` and ``"sacct"``
+    sacct_starttime : str, optional
+        ``--starttime`` of the sacct query (default: ``"now-1days"``)
+    """
+
+    fill_cluster = fill_key(["cluster"])
+
+    def slurm_cli_batch() -> Iterator[Any]:
+        command = batch_command(sections, sacct_starttime)
+        logger.debug(f"Running SLURM CLI batch: {command}")
+        with stream_command(command) as lines:
+            for name, section in iter_sections(lines):
+                batches: Dict[str, List[Any]] = {}
+                count = 0
+                for table, record in parse_section(name, section):
+                    if table in TABLE_KEYS:
+                        record = fill_cluster(record)
+                    batch = batches.setdefault(table, [])
+                    batch.append(record)
+                    count += 1
+                    if len(batch) >= DEFAULT_BATCH_SIZE:
+                        yield mark_table(batch, table)
+                        batches[table] = []
+                for table, batch in batches.items():
+                    if batch:
+                        yield mark_table(batch, table)
+                logger.info(f"...parsed {count} records from {name}")
+
+    return [dlt.resource(slurm_cli_batch, name="slurm_cli_batch")]
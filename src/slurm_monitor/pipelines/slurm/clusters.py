@@ -0,0 +1,196 @@
+"""
+Ingestion of several clusters from one process.
+
+The clusters are defined in a TOML file, one table per cluster holding the
+options of :class:`~slurm_monitor.pipelines.slurm.remote.SSHTunnel`::
+
+    [clusters.albedo]
+    ssh_host = "albedo0.dmawi.de"
+    ssh_username = "pgierz"
+    remote_host = "slurm"
+    remote_port = 6820
+
+    [clusters.levante]
+    ssh_host = "levante.dkrz.de"
+    ...
+
+Every cluster is ingested in a thread of its own, through its own tunnel on
+an automatically picked local port. Each cluster has its own pipeline, and so
+its own incremental state, but all of them write into the same tables, with a
+``cluster`` column telling the rows apart. Fetching, extraction and
+normalization run in parallel, while the loads into the shared destination
+run one at a time. The rollups, snapshots and the published database are
+updated once, after all clusters have been loaded.
+"""
+
+import inspect
+import re
+import time
+import tomllib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from ...logging import logger
+from .lake import DEFAULT_LAKE_PATH
+from .metrics import run_metrics
+from .publish import DEFAULT_PUBLISH_DIR
+from .remote import SSHTunnel, make_pipeline, run_ingestion, update_derived_tables
+
+DEFAULT_CLUSTERS_FILE = "clusters.toml"
+"""File with the cluster definitions"""
+
+DEFAULT_MAX_WORKERS = 4
+"""Maximum number of clusters ingested at the same time"""
+
+_CLUSTER_NAME = re.compile(r"\w+")
+
+
+def load_clusters(path: str = DEFAULT_CLUSTERS_FILE) -> Dict[str, Dict[str, Any]]:
+    """
+    Read the cluster definitions.
+
+    Parameters
+    ----------
+    path : str, optional
+        The TOML file (default: ``clusters.toml``)
+
+    Returns
+    -------
+    dict
+        Cluster name -> options of its :class:`SSHTunnel`
+
+    Raises
+    ------
+    ValueError
+        If there are no clusters, or a cluster definition is invalid
+    """
+    with open(path, "rb") as f:
+        clusters = tomllib.load(f).get("clusters", {})
+    if not clusters:
+        raise ValueError(f"No [clusters.<name>] tables in {path}")
+    options = set(inspect.signature(SSHTunnel).parameters)
+    for name, spec in clusters.items():
+        # The name becomes part of the pipeline name
+        if not _CLUSTER_NAME.fullmatch(name):
+            raise ValueError(
+                f"Invalid cluster name {name!r} in {path}, "
+                f"use letters, digits and underscores"
+            )
+        unknown = set(spec) - options
+        if unknown:
+            raise ValueError(
+                f"Unknown options {sorted(unknown)} of cluster {name!r} in {path}, "
+                f"known options are {sorted(options)}"
+            )
+        if "ssh_host" not in spec:
+            raise ValueError(f"Cluster {name!r} in {path} has no ssh_host")
+    return clusters
+
+
+def ingest_cluster(
+    name: str, tunnel_options: Dict[str, Any], load_options: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Ingest one cluster through a tunnel of its own, without post-load steps.
+
+    Returns
+    -------
+    dict
+        Summary of the run: cluster name, success, error, load ids and
+        duration in seconds
+    """
+    summary = {"cluster": name, "ok": False, "error": None, "load_ids": []}
+    started = time.perf_counter()
+    try:
+        with run_metrics(name), SSHTunnel(**tunnel_options) as tunnel:
+            load_infos = run_ingestion(
+                tunnel, cluster=name, post_load=False, **load_options
+            )
+        summary["load_ids"] = [
+            load_id for load_info in load_infos for load_id in load_info.loads_ids
+        ]
+        summary["ok"] = True
+    except Exception as e:
+        logger.error(f"{name}: ingestion failed: {e}")
+        summary["error"] = str(e)
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def run_clusters(
+    clusters: Dict[str, Dict[str, Any]],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    destination: str = "duckdb",
+    lake_path: str = DEFAULT_LAKE_PATH,
+    publish_dir: str = DEFAULT_PUBLISH_DIR,
+) -> List[Dict[str, Any]]:
+    """
+    Ingest ``clusters`` in parallel, then update the derived tables once.
+
+    Parameters
+    ----------
+    clusters : dict
+        Cluster name -> options of its :class:`SSHTunnel`, see
+        :func:`load_clusters`
+    max_workers : int, optional
+        Maximum number of clusters ingested at the same time (default: 4)
+    destination, lake_path, publish_dir : str, optional
+        See :func:`~slurm_monitor.pipelines.slurm.remote.run_pipeline`
+
+    Returns
+    -------
+    list of dict
+        Summary per cluster (see :func:`ingest_cluster`), followed by one of
+        the post-load steps
+    """
+    load_options = {
+        "destination": destination,
+        "lake_path": lake_path,
+        "publish_dir": publish_dir,
+    }
+    started = time.perf_counter()
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(clusters))),
+        thread_name_prefix="cluster",
+    ) as executor:
+        futures = [
+            executor.submit(ingest_cluster, name, tunnel_options, load_options)
+            for name, tunnel_options in clusters.items()
+        ]
+        summaries = [future.result() for future in futures]
+
+    load_ids = [load_id for summary in summaries for load_id in summary["load_ids"]]
+    post_load = {"cluster": "(post-load)", "ok": True, "error": None, "load_ids": []}
+    post_load_started = time.perf_counter()
+    # Also without new loads, the snapshots are stamped with every poll
+    if any(summary["ok"] for summary in summaries):
+        try:
+            update_derived_tables(
+                make_pipeline(destination, lake_path),
+                destination,
+                lake_path,
+                publish_dir,
+                load_ids,
+            )
+        except Exception as e:
+            logger.error(f"...updating the derived tables failed: {e}")
+            post_load.update(ok=False, error=str(e))
+    post_load["seconds"] = round(time.perf_counter() - post_load_started, 2)
+    summaries.append(post_load)
+
+    for summary in summaries:
+        status = "ok" if summary["ok"] else f"FAILED ({summary['error']})"
+        logger.info(
+            f"{summary['cluster']}: {summary['seconds']:.2f}s, "
+            f"{len(summary['load_ids'])} loads, {status}"
+        )
+    logger.info(
+        f"...ingested {len(clusters)} clusters in {time.perf_counter() - started:.2f}s"
+    )
+    return summaries
+
+
+def run(clusters_file: str = DEFAULT_CLUSTERS_FILE, **options) -> List[Dict[str, Any]]:
+    """Ingest all clusters defined in ``clusters_file`` once"""
+    logger.info("Starting **REMOTE** multi-cluster SLURM Ingestion Pipeline...")
+    return run_clusters(load_clusters(clusters_file), **options)
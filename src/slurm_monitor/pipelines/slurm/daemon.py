@@ -0,0 +1,336 @@
+"""
+Long-running ingestion, polling each group of resources at its own interval.
+
+Instead of a cron job starting a fresh process (importing dlt, opening SSH,
+generating a token) every minute, ``slurm-monitor daemon`` keeps one process
+running. The SSH tunnel, the SSH connection, the HTTP sessions and the token
+cache stay warm between cycles.
+
+Tasks run one after the other, so runs never overlap. A task which becomes
+due while another one is running starts as soon as that one finishes, and
+ticks missed in the meantime are skipped rather than run back to back. Failed
+tasks are retried with exponential backoff. All delays are jittered, so that
+several daemons do not hit slurmctld in lockstep.
+
+The OpenAPI spec of slurmrestd, from which the column types of the REST
+resources are taken (see schema.py), is downloaded once when the daemon
+starts. Without it, all columns are inferred from the data.
+"""
+
+import functools
+import math
+import random
+import signal
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from ...logging import logger
+from .metrics import run_metrics, serve_metrics
+from .remote import (
+    SSHTunnel,
+    get_slurm_openapi_spec,
+    get_ssh_config,
+    load_slurm_data,
+)
+from .schema import OPENAPI_FILE
+from .tasks import DEFAULT_TASKS
+from .tokens import default_token_cache
+
+DEFAULT_JITTER = 0.1
+"""Maximum random delay added to every scheduled run, relative to the delay"""
+
+DEFAULT_MAX_BACKOFF = 900
+"""Upper bound in seconds of the retry delay of failing tasks"""
+
+
+class PollingTask:
+    """
+    A function run periodically by the :class:`Scheduler`.
+
+    Parameters
+    ----------
+    name : str
+        Name of the task, used in log messages
+    func : callable
+        Called without arguments on every run
+    interval : float
+        Seconds between the starts of two runs
+    """
+
+    def __init__(self, name: str, func: Callable[[], Any], interval: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.next_run = 0.0
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+
+    def retry_delay(self, max_backoff: float = DEFAULT_MAX_BACKOFF) -> float:
+        """
+        Delay before retrying after ``self.failures`` consecutive failures.
+
+        Starts at the interval and doubles with every failure, up to
+        ``max_backoff`` (or the interval, if that is longer).
+        """
+        backoff = self.interval * 2 ** (self.failures - 1)
+        return min(backoff, max(max_backoff, self.interval))
+
+    def reschedule(
+        self,
+        started_at: float,
+        now: float,
+        ok: bool,
+        jitter: float = DEFAULT_JITTER,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+    ):
+        """
+        Set ``next_run`` after a run that started at ``started_at``.
+
+        Parameters
+        ----------
+        started_at : float
+            Clock time at which the run started
+        now : float
+            Current clock time
+        ok : bool
+            Whether the run succeeded
+        jitter : float, optional
+            Maximum random delay, relative to the delay (default: 0.1)
+        max_backoff : float, optional
+            Upper bound of the retry delay in seconds (default: 900)
+        """
+        delay = self.interval if ok else self.retry_delay(max_backoff)
+        next_run = started_at + delay
+        if next_run <= now:
+            # The run took longer than the interval: skip the missed ticks
+            # instead of catching up on them one after the other
+            missed = math.floor((now - next_run) / delay) + 1
+            self.skipped += missed
+            next_run += missed * delay
+            logger.warning(f"{self.name}: skipped {missed} overlapping run(s)")
+        self.next_run = next_run + random.uniform(0, jitter * delay)
+
+
+class Scheduler:
+    """
+    Run :class:`PollingTask` objects sequentially, each at its own interval.
+
+    Parameters
+    ----------
+    tasks : list of PollingTask
+        The tasks to schedule. They are all due immediately.
+    jitter : float, optional
+        Maximum random delay added to each run, relative to the delay
+        (default: 0.1)
+    max_backoff : float, optional
+        Upper bound in seconds of the retry delay of failing tasks
+        (default: 900)
+    clock : callable, optional
+        Monotonic clock in seconds (default: ``time.monotonic``)
+    """
+
+    def __init__(
+        self,
+        tasks: List[PollingTask],
+        jitter: float = DEFAULT_JITTER,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.tasks = tasks
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.stopped = threading.Event()
+        now = clock()
+        for task in tasks:
+            task.next_run = now
+
+    def stop(self):
+        """Stop after the currently running task, e.g. from a signal handler"""
+        self.stopped.set()
+
+    def run_once(self, task: PollingTask) -> bool:
+        """Run ``task`` once and schedule its next run"""
+        started_at = self.clock()
+        try:
+            task.func()
+        except Exception as e:
+            task.failures += 1
+            ok = False
+            logger.error(f"{task.name}: run failed ({task.failures} in a row): {e}")
+        else:
+            task.failures = 0
+            ok = True
+        task.runs += 1
+        now = self.clock()
+        task.reschedule(started_at, now, ok, self.jitter, self.max_backoff)
+        logger.info(
+            f"{task.name}: took {now - started_at:.1f}s, "
+            f"next run in {task.next_run - now:.1f}s"
+        )
+        return ok
+
+    def run(self, max_runs: Optional[int] = None):
+        """
+        Run the tasks until :meth:`stop` is called.
+
+        Parameters
+        ----------
+        max_runs : int, optional
+            Return after this many task runs in total
+        """
+        if not self.tasks:
+            logger.warning("No tasks to schedule, all of them are disabled")
+            return
+        runs = 0
+        while not self.stopped.is_set():
+            task = min(self.tasks, key=lambda task: task.next_run)
+            wait = task.next_run - self.clock()
+            if wait > 0 and self.stopped.wait(wait):
+                break
+            self.run_once(task)
+            runs += 1
+            if max_runs is not None and runs >= max_runs:
+                break
+
+
+def _rejected_token(error: BaseException) -> bool:
+    """Whether ``error`` was caused by a 401 response, i.e. an invalid token"""
+    while error is not None:
+        if isinstance(error, requests.HTTPError) and error.response is not None:
+            return error.response.status_code == 401
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def ingest(
+    ssh_tunnel: SSHTunnel,
+    endpoint_type: str,
+    resources: List[str],
+    load_options: Optional[Dict[str, Any]] = None,
+):
+    """Load ``resources`` through ``ssh_tunnel``, reusing the cached token"""
+    try:
+        with run_metrics():
+            ssh_tunnel.generate_slurm_token()
+            return ssh_tunnel.run_func(
+                load_slurm_data,
+                endpoint_type=endpoint_type,
+                resources=resources,
+                **(load_options or {}),
+            )
+    except Exception as e:
+        if _rejected_token(e):
+            logger.warning("...token was rejected, generating a new one next time")
+            default_token_cache().invalidate(
+                ssh_tunnel.ssh_host, ssh_tunnel.slurm_username
+            )
+        raise
+
+
+def download_openapi_spec(ssh_tunnel: SSHTunnel, path: str = OPENAPI_FILE) -> bool:
+    """
+    Download the OpenAPI spec of slurmrestd through ``ssh_tunnel``.
+
+    A failed download is logged, not raised: the daemon then runs with an
+    older spec at ``path``, if there is one, or infers all columns.
+
+    Returns
+    -------
+    bool
+        Whether the spec was downloaded
+    """
+    try:
+        ssh_tunnel.generate_slurm_token()
+        response = ssh_tunnel.run_func(get_slurm_openapi_spec)
+    except Exception as e:
+        logger.warning(f"...could not download the OpenAPI spec: {e}")
+        return False
+    with open(path, "w") as f:
+        f.write(response.text)
+    logger.info(f"...downloaded the OpenAPI spec to {path}")
+    return True
+
+
+def run_daemon(
+    ssh_tunnel: SSHTunnel,
+    intervals: Optional[Dict[str, float]] = None,
+    jitter: float = DEFAULT_JITTER,
+    max_backoff: float = DEFAULT_MAX_BACKOFF,
+    load_options: Optional[Dict[str, Any]] = None,
+) -> Scheduler:
+    """
+    Build the scheduler of the daemon for an open tunnel.
+
+    Parameters
+    ----------
+    ssh_tunnel : SSHTunnel
+        The tunnel all tasks load through
+    intervals : dict, optional
+        Interval in seconds per task name, overriding :data:`DEFAULT_TASKS`.
+        An interval of 0 disables the task, negative and infinite intervals are
+        rejected.
+    jitter : float, optional
+        Maximum random delay, relative to the delay (default: 0.1)
+    max_backoff : float, optional
+        Upper bound of the retry delay in seconds (default: 900)
+    load_options : dict, optional
+        Passed on to :func:`load_slurm_data`, e.g. ``destination`` and
+        ``lake_path``
+
+    Returns
+    -------
+    Scheduler
+        Call :meth:`Scheduler.run` to start polling
+    """
+    intervals = intervals or {}
+    unknown = set(intervals) - set(DEFAULT_TASKS)
+    if unknown:
+        raise ValueError(
+            f"Unknown daemon tasks {sorted(unknown)}, "
+            f"known tasks are {sorted(DEFAULT_TASKS)}"
+        )
+    invalid = sorted(
+        name
+        for name, interval in intervals.items()
+        if interval < 0 or not math.isfinite(interval)
+    )
+    if invalid:
+        raise ValueError(
+            f"Negative or infinite intervals for the daemon tasks {invalid}"
+        )
+    tasks = []
+    for name, spec in DEFAULT_TASKS.items():
+        interval = intervals.get(name, spec["interval"])
+        if not interval:
+            continue
+        func = functools.partial(
+            ingest, ssh_tunnel, spec["endpoint_type"], spec["resources"], load_options
+        )
+        tasks.append(PollingTask(name, func, interval))
+    return Scheduler(tasks, jitter=jitter, max_backoff=max_backoff)
+
+
+def run(metrics_port: Optional[int] = None, **scheduler_options):
+    """
+    Poll the cluster configured in :func:`get_ssh_config` until stopped.
+
+    If ``metrics_port`` is given, the metrics of the daemon are served there
+    in the Prometheus text format.
+    """
+    logger.info("Starting **REMOTE** SLURM Ingestion Daemon...")
+    if metrics_port is not None:
+        serve_metrics(metrics_port)
+    with SSHTunnel(**get_ssh_config()) as ssh_tunnel:
+        download_openapi_spec(ssh_tunnel)
+        scheduler = run_daemon(ssh_tunnel, **scheduler_options)
+        signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            logger.info("...daemon interrupted, shutting down")
+    return scheduler
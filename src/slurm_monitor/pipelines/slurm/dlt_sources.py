@@ -1,7 +1,6 @@
-import json
 import os
 import pdb
-from typing import List
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import dlt
 import requests
@@ -10,6 +9,16 @@ from dlt.sources.helpers.rest_client.auth import AuthConfigBase
 from dlt.sources.rest_api import RESTAPIConfig, rest_api_resources
 
 from ...logging import logger
+from .backfill import DEFAULT_WINDOW, backfill_resource
+from .fanout import (
+    derive_from_parent,
+    fanout_resource,
+    max_in_flight_for,
+    shared_session,
+)
+from .incremental import DEFAULT_UPDATE_TIME_OVERLAP, update_time_resource
+from .metrics import endpoint_hooks
+from .schema import OPENAPI_FILE, apply_openapi_hints
 
 
 class SlurmAuthConfig(AuthConfigBase):
@@ -27,6 +36,62 @@ class SlurmAuthConfig(AuthConfigBase):
         return request
 
 
+def config_endpoints(config_resources: List[Dict[str, Any]]) -> Dict[str, Tuple]:
+    """Resource name -> (path, data selector) of ``rest_api`` resource configs"""
+    return {
+        resource["name"]: (
+            resource["endpoint"]["path"],
+            resource["endpoint"]["data_selector"],
+        )
+        for resource in config_resources
+    }
+
+
+def record_requests(config_resources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Record the requests of ``rest_api`` resource configs in the metrics.
+
+    dlt sends every request with hooks of its own, which replace the hook of
+    the session, so the metrics hook is added as a response action instead.
+    """
+    for resource in config_resources:
+        endpoint = resource["endpoint"]
+        endpoint["response_actions"] = endpoint_hooks(endpoint["path"])["response"]
+    return config_resources
+
+
+ASSOCIATION_KEY = ("cluster", "account", "user", "partition")
+"""Fields identifying a slurmdb association"""
+
+WCKEY_KEY = ("cluster", "name", "user")
+"""Fields identifying a slurmdb workload characterization key"""
+
+DB_JOB_KEY = ("cluster", "job_id", "time__submission")
+"""Columns identifying a slurmdb job: job ids are reused over time, and the
+same job id may exist on several clusters of one slurmdbd"""
+
+
+def fill_key(fields: Sequence[str]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Build a function setting the missing ``fields`` of a record to ``""``.
+
+    Primary key columns must not be NULL, but e.g. account associations
+    have no user, and most associations have no partition.
+    """
+
+    def fill(record: Dict[str, Any]) -> Dict[str, Any]:
+        for field in fields:
+            if record.get(field) is None:
+                record[field] = ""
+        return record
+
+    return fill
+
+
+MAX_LOGGED_RESPONSE = 2000
+"""Number of characters of a response body logged by :func:`manual_get`"""
+
+
 def manual_get(
     resource: dict,
     username: str,
@@ -60,13 +125,18 @@ def manual_get(
     }
     url = f"{base_url}/{path}"
     response = requests.get(url, headers=headers)
-    # Check the response
+    # Check the response. Only log a prefix of the body: job listings can be
+    # hundreds of MB, and decoding and re-encoding them just to log them would
+    # hold several copies in memory.
     if response.status_code == 200:
         logger.success(f"Pinged SLURM API {path} successfully!")
-        logger.success(f"Response: {json.dumps(response.json(), indent=2)}")
+        logger.success(
+            f"Response ({len(response.content)} bytes): "
+            f"{response.text[:MAX_LOGGED_RESPONSE]}"
+        )
     else:
         logger.error(f"Failed to get {path} from SLURM API!")
-        logger.error(f"Response: {json.dumps(response.json(), indent=2)}")
+        logger.error(f"Response: {response.text[:MAX_LOGGED_RESPONSE]}")
     return response
 
 
@@ -78,94 +148,96 @@ def slurm_restdb_source(
     username: str = dlt.secrets.value,
     token: str = dlt.secrets.value,
     base_url: str = dlt.config.value,
+    backfill_start: Optional[Union[int, str]] = None,
+    backfill_end: Optional[Union[int, str]] = None,
+    backfill_window: int = DEFAULT_WINDOW,
+    backfill_max_windows: Optional[int] = None,
+    max_in_flight: Optional[Dict[str, int]] = None,
+    stream: bool = True,
+    openapi_path: Optional[str] = OPENAPI_FILE,
 ) -> List[DltResource]:
+    """
+    A DLT source for the ``/slurmdb/v0.0.38`` endpoints of slurmrestd.
+
+    The job history is fetched in time windows, see backfill.py.
+
+    Parameters
+    ----------
+    username : str
+        The username to use for authentication
+    token : str
+        The token to use for authentication
+    base_url : str
+        The base URL to use for the requests
+    backfill_start : int or str, optional
+        Beginning of the job history to load, as unix timestamp or ISO 8601
+        date. Windows loaded by earlier runs are skipped. By default, only
+        the current (open) window is fetched.
+    backfill_end : int or str, optional
+        End of the job history to load (default: now)
+    backfill_window : int, optional
+        Seconds of job history per request (default: one day)
+    backfill_max_windows : int, optional
+        Maximum number of windows to load per run
+    max_in_flight : dict, optional
+        Maximum number of concurrent requests, keyed by resource name
+        (``slurmdb_v0_0_38_get_jobs`` for the windows) or ``"default"``.
+    stream : bool, optional
+        Parse the job windows while they are received (default: True)
+    openapi_path : str, optional
+        The slurmrestd OpenAPI spec the column types are taken from (default:
+        ``slurm_openapi.json``), see schema.py. Without it, dlt infers them.
+    """
 
     auth = SlurmAuthConfig(
         username=username,
         token=token,
     )
+    jobs_in_flight = max_in_flight_for("slurmdb_v0_0_38_get_jobs", max_in_flight)
+    # All resources share one session, which also records the request metrics
+    session = shared_session(base_url, auth, jobs_in_flight)
 
     # source configuration
     source_config: RESTAPIConfig = {
         "client": {
             "base_url": base_url,
             "auth": auth,
+            "session": session,
         },
         "resources": [
-            #################################################################
-            # [NOTE] This one doesn't work
             {
                 "name": "slurmdb_v0_0_38_diag",
                 "table_name": "dbv0_0_38_diag",
                 "endpoint": {
-                    "data_selector": "$",
+                    "data_selector": "statistics",
                     "path": "/slurmdb/v0.0.38/diag",
                     "paginator": "auto",
                 },
             },
             #################################################################
-            # This endpoint may return multiple job entries since job_id is not a unique key - only the tuple (cluster, job_id, start_time) is unique. If the requested job_id is a component of a heterogeneous job all components are returned.
-            {
-                "name": "slurmdb_v0_0_38_get_job",
-                "table_name": "dbv0_0_38_error",
-                "endpoint": {
-                    "data_selector": "errors",
-                    "path": "/slurmdb/v0.0.38/job/{job_id}",
-                    "paginator": "auto",
-                    "params": {
-                        "job_id": {
-                            "type": "resolve",
-                            "resource": "slurmdb_v0_0_38_get_jobs",
-                            "field": "job_id",
-                        },
-                    },
-                },
-            },
-            #################################################################
-            # [NOTE] This one doesn't work: Protocol authentication error
-            {
-                "name": "slurmdb_v0_0_38_get_config",
-                "table_name": "dbv0_0_38_error",
-                "endpoint": {
-                    "data_selector": "errors",
-                    "path": "/slurmdb/v0.0.38/config",
-                    "paginator": "auto",
-                },
-            },
-            #################################################################
             # [NOTE] This one doesn't work, but I don't think we have that
             #        plugin active (needs "accounting_storage"??)
             {
                 "name": "slurmdb_v0_0_38_get_tres",
-                "table_name": "dbv0_0_38_error",
+                "table_name": "dbv0_0_38_tres",
+                "primary_key": "id",
+                "write_disposition": "merge",
                 "endpoint": {
-                    "data_selector": "errors",
+                    "data_selector": "TRES",
                     "path": "/slurmdb/v0.0.38/tres",
                     "paginator": "auto",
                 },
             },
-            #################################################################
-            {
-                "name": "slurmdb_v0_0_38_get_single_qos",
-                "table_name": "dbv0_0_38_error",
-                "endpoint": {
-                    "data_selector": "errors",
-                    "path": "/slurmdb/v0.0.38/qos/{qos_name}",
-                    "params": {
-                        "qos_name": {
-                            "type": "resolve",
-                            "resource": "slurmdb_v0_0_38_get_qos",
-                            "field": "qos_name",
-                        },
-                    },
-                    "paginator": "auto",
-                },
-            },
+            # The listings below return the full records, so there is no need
+            # for the per-entity endpoints (qos/{name}, user/{name}, ...), nor
+            # for /config, which returns all of them at once
             {
                 "name": "slurmdb_v0_0_38_get_qos",
-                "table_name": "dbv0_0_38_error",
+                "table_name": "dbv0_0_38_qos",
+                "primary_key": "name",
+                "write_disposition": "merge",
                 "endpoint": {
-                    "data_selector": "errors",
+                    "data_selector": "qos",
                     "path": "/slurmdb/v0.0.38/qos",
                     "params": {
                         # the parameters below can optionally be configured
@@ -176,9 +248,11 @@ def slurm_restdb_source(
             },
             {
                 "name": "slurmdb_v0_0_38_get_associations",
-                "table_name": "dbv0_0_38_error",
+                "table_name": "dbv0_0_38_associations",
+                "primary_key": list(ASSOCIATION_KEY),
+                "write_disposition": "merge",
                 "endpoint": {
-                    "data_selector": "errors",
+                    "data_selector": "associations",
                     "path": "/slurmdb/v0.0.38/associations",
                     "params": {
                         # the parameters below can optionally be configured
@@ -190,43 +264,13 @@ def slurm_restdb_source(
                     "paginator": "auto",
                 },
             },
-            {
-                "name": "slurmdb_v0_0_38_get_association",
-                "table_name": "dbv0_0_38_error",
-                "endpoint": {
-                    "data_selector": "errors",
-                    "path": "/slurmdb/v0.0.38/association",
-                    "params": {
-                        # the parameters below can optionally be configured
-                        # "cluster": "OPTIONAL_CONFIG",
-                        # "account": "OPTIONAL_CONFIG",
-                        # "user": "OPTIONAL_CONFIG",
-                        # "partition": "OPTIONAL_CONFIG",
-                    },
-                    "paginator": "auto",
-                },
-            },
-            {
-                "name": "slurmdb_v0_0_38_get_user",
-                "table_name": "dbv0_0_38_error",
-                "endpoint": {
-                    "data_selector": "errors",
-                    "path": "/slurmdb/v0.0.38/user/{user_name}",
-                    "params": {
-                        "user_name": {
-                            "type": "resolve",
-                            "resource": "slurmdb_v0_0_38_get_users",
-                            "field": "user_name",
-                        },
-                    },
-                    "paginator": "auto",
-                },
-            },
             {
                 "name": "slurmdb_v0_0_38_get_users",
-                "table_name": "dbv0_0_38_error",
+                "table_name": "dbv0_0_38_users",
+                "primary_key": "name",
+                "write_disposition": "merge",
                 "endpoint": {
-                    "data_selector": "errors",
+                    "data_selector": "users",
                     "path": "/slurmdb/v0.0.38/users",
                     "params": {
                         # the parameters below can optionally be configured
@@ -235,52 +279,24 @@ def slurm_restdb_source(
                     "paginator": "auto",
                 },
             },
-            {
-                "name": "slurmdb_v0_0_38_get_wckey",
-                "table_name": "dbv0_0_38_error",
-                "endpoint": {
-                    "data_selector": "errors",
-                    "path": "/slurmdb/v0.0.38/wckey/{wckey}",
-                    "paginator": "auto",
-                    "params": {
-                        "wckey": {
-                            "type": "resolve",
-                            "resource": "slurmdb_v0_0_38_get_wckeys",
-                            "field": "wckey",
-                        },
-                    },
-                },
-            },
             {
                 "name": "slurmdb_v0_0_38_get_wckeys",
-                "table_name": "dbv0_0_38_error",
+                "table_name": "dbv0_0_38_wckeys",
+                "primary_key": list(WCKEY_KEY),
+                "write_disposition": "merge",
                 "endpoint": {
-                    "data_selector": "errors",
+                    "data_selector": "wckeys",
                     "path": "/slurmdb/v0.0.38/wckeys",
                     "paginator": "auto",
                 },
             },
-            {
-                "name": "slurmdb_v0_0_38_get_account",
-                "table_name": "dbv0_0_38_error",
-                "endpoint": {
-                    "data_selector": "errors",
-                    "path": "/slurmdb/v0.0.38/account/{account_name}",
-                    "params": {
-                        "account_name": {
-                            "type": "resolve",
-                            "resource": "slurmdb_v0_0_38_get_accounts",
-                            "field": "account_name",
-                        }
-                    },
-                    "paginator": "auto",
-                },
-            },
             {
                 "name": "slurmdb_v0_0_38_get_accounts",
-                "table_name": "dbv0_0_38_error",
+                "table_name": "dbv0_0_38_accounts",
+                "primary_key": "name",
+                "write_disposition": "merge",
                 "endpoint": {
-                    "data_selector": "errors",
+                    "data_selector": "accounts",
                     "path": "/slurmdb/v0.0.38/accounts",
                     "params": {
                         # the parameters below can optionally be configured
@@ -289,64 +305,13 @@ def slurm_restdb_source(
                     "paginator": "auto",
                 },
             },
-            {
-                "name": "slurmdb_v0_0_38_get_jobs",
-                "table_name": "dbv0_0_38_error",
-                "endpoint": {
-                    "data_selector": "errors",
-                    "path": "/slurmdb/v0.0.38/jobs",
-                    "params": {
-                        # the parameters below can optionally be configured
-                        # "submit_time": "OPTIONAL_CONFIG",
-                        # "start_time": "OPTIONAL_CONFIG",
-                        # "end_time": "OPTIONAL_CONFIG",
-                        # "account": "OPTIONAL_CONFIG",
-                        # "association": "OPTIONAL_CONFIG",
-                        # "cluster": "OPTIONAL_CONFIG",
-                        # "constraints": "OPTIONAL_CONFIG",
-                        # "cpus_max": "OPTIONAL_CONFIG",
-                        # "cpus_min": "OPTIONAL_CONFIG",
-                        # "skip_steps": "OPTIONAL_CONFIG",
-                        # "disable_wait_for_result": "OPTIONAL_CONFIG",
-                        # "exit_code": "OPTIONAL_CONFIG",
-                        # "format": "OPTIONAL_CONFIG",
-                        # "group": "OPTIONAL_CONFIG",
-                        # "job_name": "OPTIONAL_CONFIG",
-                        # "nodes_max": "OPTIONAL_CONFIG",
-                        # "nodes_min": "OPTIONAL_CONFIG",
-                        # "partition": "OPTIONAL_CONFIG",
-                        # "qos": "OPTIONAL_CONFIG",
-                        # "reason": "OPTIONAL_CONFIG",
-                        # "reservation": "OPTIONAL_CONFIG",
-                        # "state": "OPTIONAL_CONFIG",
-                        # "step": "OPTIONAL_CONFIG",
-                        # "node": "OPTIONAL_CONFIG",
-                        # "wckey": "OPTIONAL_CONFIG",
-                    },
-                    "paginator": "auto",
-                },
-            },
-            {
-                "name": "slurmdb_v0_0_38_get_cluster",
-                "table_name": "v0",
-                "endpoint": {
-                    "data_selector": "flags",
-                    "path": "/slurmdb/v0.0.38/cluster/{cluster_name}",
-                    "paginator": "auto",
-                    "params": {
-                        "cluster_name": {
-                            "type": "resolve",
-                            "resource": "slurmdb_v0_0_38_get_clusters",
-                            "field": "cluster_name",
-                        },
-                    },
-                },
-            },
             {
                 "name": "slurmdb_v0_0_38_get_clusters",
-                "table_name": "v0",
+                "table_name": "dbv0_0_38_clusters",
+                "primary_key": "name",
+                "write_disposition": "merge",
                 "endpoint": {
-                    "data_selector": "flags",
+                    "data_selector": "clusters",
                     "path": "/slurmdb/v0.0.38/clusters",
                     "paginator": "auto",
                 },
@@ -367,18 +332,141 @@ def slurm_restdb_source(
             )
 
     try:
-        resources = rest_api_resources(source_config)
-        # for resource in resources:
-        #     logger.info(f"Resource: {resource.name}")
-        #     for value in resource:
-        #         logger.info(f"Value: {value}")
-        # breakpoint()
-        yield from resources
+        record_requests(source_config["resources"])
+        resources = {
+            resource.name: resource for resource in rest_api_resources(source_config)
+        }
+        resources["slurmdb_v0_0_38_get_associations"].add_map(fill_key(ASSOCIATION_KEY))
+        resources["slurmdb_v0_0_38_get_wckeys"].add_map(fill_key(WCKEY_KEY))
+        resources["slurmdb_v0_0_38_get_jobs"] = backfill_resource(
+            name="slurmdb_v0_0_38_get_jobs",
+            table_name="dbv0_0_38_jobs",
+            path="/slurmdb/v0.0.38/jobs",
+            data_selector="jobs",
+            base_url=base_url,
+            session=session,
+            start=backfill_start,
+            end=backfill_end,
+            window=backfill_window,
+            max_windows=backfill_max_windows,
+            max_in_flight=jobs_in_flight,
+            stream=stream,
+        ).add_map(fill_key(["cluster"]))
+        # The listing already returns complete jobs, so there is no need to
+        # fetch them one by one from /job/{job_id}
+        endpoints = config_endpoints(source_config["resources"])
+        endpoints["slurmdb_v0_0_38_get_jobs"] = ("/slurmdb/v0.0.38/jobs", "jobs")
+        apply_openapi_hints(resources, endpoints, openapi_path)
+        # Overlapping backfill windows and repeated runs return the same jobs
+        resources["slurmdb_v0_0_38_get_jobs"].apply_hints(
+            primary_key=list(DB_JOB_KEY), write_disposition="merge"
+        )
+        yield from resources.values()
     except requests.exceptions.HTTPError as e:
         logger.error(e)
         pdb.post_mortem()
 
 
+# Overview resources, which support the update_time filter (see incremental.py)
+SLURM_OVERVIEW_RESOURCES = [
+    {
+        "name": "slurm_v0_0_38_get_jobs",
+        "table_name": "v0_0_38_jobs_overview",
+        "path": "/slurm/v0.0.38/jobs",
+        "data_selector": "jobs",
+    },
+    {
+        "name": "slurm_v0_0_38_get_nodes",
+        "table_name": "v0_0_38_nodes_overview",
+        "path": "/slurm/v0.0.38/nodes",
+        "data_selector": "nodes",
+    },
+    {
+        "name": "slurm_v0_0_38_get_partitions",
+        "table_name": "v0_0_38_partitions_overview",
+        "path": "/slurm/v0.0.38/partitions",
+        "data_selector": "partitions",
+    },
+    {
+        "name": "slurm_v0_0_38_get_reservations",
+        "table_name": "v0_0_38_reservations_overview",
+        "path": "/slurm/v0.0.38/reservations",
+        "data_selector": "reservations",
+    },
+]
+
+JOB_KEY = ("cluster", "job_id")
+"""Columns identifying a slurm job: job ids are only unique within a cluster"""
+
+NAME_KEY = ("cluster", "name")
+"""Columns identifying a slurm node, partition or reservation"""
+
+SLURM_TABLE_KEYS = {
+    "v0_0_38_jobs_overview": JOB_KEY,
+    "v0_0_38_jobs": JOB_KEY,
+    "v0_0_38_nodes_overview": NAME_KEY,
+    "v0_0_38_partitions_overview": NAME_KEY,
+    "v0_0_38_reservations_overview": NAME_KEY,
+}
+"""Tables of the slurm entities and their keys. Every poll loads the changed
+entities again, which are merged into the one row per key, so the tables hold
+the current state. Rows without a cluster belong to the cluster ``""``. The
+per-node, partition and reservation tables hold whole responses (selected
+with ``"$"``), which have no key."""
+
+# Per-entity resources, resolved from the rows of their parent overview
+# resource. These are fetched concurrently (see fanout.py) instead of via
+# the sequential "resolve" params of rest_api. In bulk-only mode, rows of the
+# overview that contain all "required_fields" are used as they are, and
+# "wrap_key" reproduces the response shape of the "$" selected endpoints.
+SLURM_CHILD_RESOURCES = [
+    {
+        "name": "slurm_v0_0_38_get_job",
+        "table_name": "v0_0_38_jobs",
+        "parent": "slurm_v0_0_38_get_jobs",
+        "path": "/slurm/v0.0.38/job/{job_id}",
+        "param": "job_id",
+        "field": "job_id",
+        "data_selector": "jobs",
+        "required_fields": ["job_id", "job_state", "partition", "submit_time", "cpus"],
+        "wrap_key": None,
+    },
+    {
+        "name": "slurm_v0_0_38_get_node",
+        "table_name": "v0_0_38_nodes",
+        "parent": "slurm_v0_0_38_get_nodes",
+        "path": "/slurm/v0.0.38/node/{name}",
+        "param": "name",
+        "field": "name",
+        "data_selector": "$",
+        "required_fields": ["name", "state", "cpus", "alloc_cpus", "alloc_memory"],
+        "wrap_key": "nodes",
+    },
+    {
+        "name": "slurm_v0_0_38_get_partition",
+        "table_name": "v0_0_38_partition",
+        "parent": "slurm_v0_0_38_get_partitions",
+        "path": "/slurm/v0.0.38/partition/{partition_name}",
+        "param": "partition_name",
+        "field": "name",
+        "data_selector": "$",
+        "required_fields": ["name", "nodes"],
+        "wrap_key": "partitions",
+    },
+    {
+        "name": "slurm_v0_0_38_get_reservation",
+        "table_name": "v0_0_38_reservation",
+        "parent": "slurm_v0_0_38_get_reservations",
+        "path": "/slurm/v0.0.38/reservation/{reservation_name}",
+        "param": "reservation_name",
+        "field": "name",
+        "data_selector": "$",
+        "required_fields": ["name", "node_list", "start_time", "end_time"],
+        "wrap_key": "reservations",
+    },
+]
+
+
 @dlt.source(
     name="slurm_source",
     max_table_nesting=2,
@@ -387,16 +475,62 @@ def slurm_rest_source(
     username: str = dlt.secrets.value,
     token: str = dlt.secrets.value,
     base_url: str = dlt.config.value,
+    max_in_flight: Optional[Dict[str, int]] = None,
+    bulk_only: bool = False,
+    incremental: bool = True,
+    update_time_overlap: int = DEFAULT_UPDATE_TIME_OVERLAP,
+    stream: bool = True,
+    openapi_path: Optional[str] = OPENAPI_FILE,
 ) -> List[DltResource]:
+    """
+    A DLT source for the ``/slurm/v0.0.38`` endpoints of slurmrestd.
+
+    Parameters
+    ----------
+    username : str
+        The username to use for authentication
+    token : str
+        The token to use for authentication
+    base_url : str
+        The base URL to use for the requests
+    max_in_flight : dict, optional
+        Maximum number of concurrent requests for each per-entity resource,
+        keyed by resource name (e.g. ``{"slurm_v0_0_38_get_job": 16}``). The
+        key ``"default"`` applies to all resources not listed explicitly.
+    bulk_only : bool, optional
+        Fill the per-entity tables (``v0_0_38_jobs``, ``v0_0_38_nodes``, ...)
+        from the overview responses, and only request the entities whose
+        overview record is incomplete (default: False)
+    incremental : bool, optional
+        Only request jobs, nodes, partitions and reservations changed since
+        the previous run, using the ``update_time`` cursor kept in the
+        pipeline state (default: True)
+    update_time_overlap : int, optional
+        Seconds subtracted from the cursor to tolerate clock skew between
+        this host and slurmctld (default: 60)
+    stream : bool, optional
+        Parse the overview responses while they are received, so memory
+        does not grow with the size of the queue (default: True)
+    openapi_path : str, optional
+        The slurmrestd OpenAPI spec the column types are taken from (default:
+        ``slurm_openapi.json``), see schema.py. Without it, dlt infers them.
+    """
 
     auth = SlurmAuthConfig(
         username=username,
         token=token,
     )
+    limits = {
+        child["name"]: max_in_flight_for(child["name"], max_in_flight)
+        for child in SLURM_CHILD_RESOURCES
+    }
+    # All resources share one session, which also records the request metrics
+    session = shared_session(base_url, auth, max(limits.values()))
     source_config: RESTAPIConfig = {
         "client": {
             "base_url": base_url,
             "auth": auth,
+            "session": session,
         },
         "resources": [
             {
@@ -426,122 +560,6 @@ def slurm_rest_source(
                     "paginator": "single_page",
                 },
             },
-            {
-                "name": "slurm_v0_0_38_get_jobs",
-                "table_name": "v0_0_38_jobs_overview",
-                "endpoint": {
-                    "data_selector": "jobs",
-                    "path": "/slurm/v0.0.38/jobs",
-                    "params": {
-                        # the parameters below can optionally be configured
-                        # "update_time": "OPTIONAL_CONFIG",
-                    },
-                    "paginator": "single_page",
-                },
-            },
-            {
-                "name": "slurm_v0_0_38_get_job",
-                "table_name": "v0_0_38_jobs",
-                "endpoint": {
-                    "data_selector": "jobs",
-                    "path": "/slurm/v0.0.38/job/{job_id}",
-                    "paginator": "single_page",
-                    "params": {
-                        "job_id": {
-                            "type": "resolve",
-                            "resource": "slurm_v0_0_38_get_jobs",
-                            "field": "job_id",
-                        }
-                    },
-                },
-            },
-            {
-                "name": "slurm_v0_0_38_get_nodes",
-                "table_name": "v0_0_38_nodes_overview",
-                "endpoint": {
-                    "data_selector": "nodes",
-                    "path": "/slurm/v0.0.38/nodes",
-                    "params": {
-                        # the parameters below can optionally be configured
-                        # "update_time": "OPTIONAL_CONFIG",
-                    },
-                    "paginator": "single_page",
-                },
-            },
-            {
-                "name": "slurm_v0_0_38_get_node",
-                "table_name": "v0_0_38_nodes",
-                "endpoint": {
-                    "data_selector": "$",
-                    "path": "/slurm/v0.0.38/node/{name}",
-                    "paginator": "single_page",
-                    "params": {
-                        "name": {
-                            "type": "resolve",
-                            "resource": "slurm_v0_0_38_get_nodes",
-                            "field": "name",
-                        },
-                    },
-                },
-            },
-            {
-                "name": "slurm_v0_0_38_get_partitions",
-                "table_name": "v0_0_38_partitions_overview",
-                "endpoint": {
-                    "data_selector": "partitions",
-                    "path": "/slurm/v0.0.38/partitions",
-                    "params": {
-                        # the parameters below can optionally be configured
-                        # "update_time": "OPTIONAL_CONFIG",
-                    },
-                    "paginator": "single_page",
-                },
-            },
-            {
-                "name": "slurm_v0_0_38_get_partition",
-                "table_name": "v0_0_38_partition",
-                "endpoint": {
-                    "data_selector": "$",
-                    "path": "/slurm/v0.0.38/partition/{partition_name}",
-                    "params": {
-                        "partition_name": {
-                            "type": "resolve",
-                            "resource": "slurm_v0_0_38_get_partitions",
-                            "field": "name",
-                        },
-                    },
-                    "paginator": "single_page",
-                },
-            },
-            {
-                "name": "slurm_v0_0_38_get_reservations",
-                "table_name": "v0_0_38_reservations_overview",
-                "endpoint": {
-                    "data_selector": "reservations",
-                    "path": "/slurm/v0.0.38/reservations",
-                    "params": {
-                        # the parameters below can optionally be configured
-                        # "update_time": "OPTIONAL_CONFIG",
-                    },
-                    "paginator": "single_page",
-                },
-            },
-            {
-                "name": "slurm_v0_0_38_get_reservation",
-                "table_name": "v0_0_38_reservation",
-                "endpoint": {
-                    "data_selector": "$",
-                    "path": "/slurm/v0.0.38/reservation/{reservation_name}",
-                    "params": {
-                        "reservation_name": {
-                            "type": "resolve",
-                            "resource": "slurm_v0_0_38_get_reservations",
-                            "field": "name",
-                        },
-                    },
-                    "paginator": "single_page",
-                },
-            },
         ],
     }
 
@@ -558,13 +576,47 @@ def slurm_rest_source(
             )
 
     try:
-        resources = rest_api_resources(source_config)
-        # for resource in resources:
-        #     logger.info(f"Resource: {resource.name}")
-        #     for value in resource:
-        #         logger.info(f"Value: {value}")
-        # breakpoint()
-        yield from resources
+        record_requests(source_config["resources"])
+        resources = {
+            resource.name: resource for resource in rest_api_resources(source_config)
+        }
+        for overview in SLURM_OVERVIEW_RESOURCES:
+            resources[overview["name"]] = update_time_resource(
+                **overview,
+                base_url=base_url,
+                session=session,
+                incremental=incremental,
+                overlap=update_time_overlap,
+                stream=stream,
+            )
+        for child in SLURM_CHILD_RESOURCES:
+            resources[child["name"]] = fanout_resource(
+                resources[child["parent"]],
+                name=child["name"],
+                table_name=child["table_name"],
+                path=child["path"],
+                param=child["param"],
+                field=child["field"],
+                base_url=base_url,
+                session=session,
+                data_selector=child["data_selector"],
+                max_in_flight=limits[child["name"]],
+                derive=(
+                    derive_from_parent(child["required_fields"], child["wrap_key"])
+                    if bulk_only
+                    else None
+                ),
+            )
+        endpoints = config_endpoints(source_config["resources"])
+        for resource in SLURM_OVERVIEW_RESOURCES + SLURM_CHILD_RESOURCES:
+            endpoints[resource["name"]] = (resource["path"], resource["data_selector"])
+        apply_openapi_hints(resources, endpoints, openapi_path)
+        for resource in resources.values():
+            key = SLURM_TABLE_KEYS.get(resource.table_name)
+            if key:
+                resource.add_map(fill_key(["cluster"]))
+                resource.apply_hints(primary_key=list(key), write_disposition="merge")
+        yield from resources.values()
     except requests.exceptions.HTTPError as e:
         logger.error(e)
         pdb.post_mortem()
@@ -0,0 +1,295 @@
+"""
+Bounded-concurrency fetching of per-entity child resources.
+
+The dlt ``rest_api`` "resolve" parameters issue one blocking GET per parent
+row. For endpoints such as ``/slurm/v0.0.38/job/{job_id}`` that means one
+round trip per job, strictly one after the other. The helpers here replace
+those child resources with dlt transformers that keep up to ``max_in_flight``
+requests open per endpoint, while still yielding rows in parent order.
+"""
+
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+)
+
+import dlt
+import requests
+from dlt.common import jsonpath
+from dlt.extract.source import DltResource
+from requests.adapters import HTTPAdapter
+
+from ...logging import logger
+from .metrics import endpoint_hooks, response_hook
+
+DEFAULT_MAX_IN_FLIGHT = 8
+"""Default number of concurrent requests per child endpoint"""
+
+
+def ordered_map(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+) -> Iterator[Any]:
+    """
+    Apply ``func`` to ``items`` in a thread pool, yielding results in input order.
+
+    Unlike ``ThreadPoolExecutor.map``, at most ``max_in_flight`` calls are
+    submitted at any time, so neither the number of open requests nor the
+    number of buffered results grows with the length of ``items``.
+
+    Parameters
+    ----------
+    func : callable
+        The function to apply to each item
+    items : iterable
+        The inputs, consumed lazily
+    max_in_flight : int, optional
+        Upper bound on concurrently running calls (default: 8)
+
+    Yields
+    ------
+    Any
+        ``func(item)`` for each item, in the order of ``items``
+    """
+    if max_in_flight <= 1:
+        yield from map(func, items)
+        return
+    # The workers run in the caller's context, so that e.g. requests are
+    # recorded in the metrics scope of the caller (see metrics.py)
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        pending: Deque = deque()
+        for item in items:
+            pending.append(executor.submit(context.copy().run, func, item))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def make_session(auth: Any, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+    """
+    Build a ``requests.Session`` whose connection pool fits ``max_in_flight``.
+
+    Parameters
+    ----------
+    auth : requests.auth.AuthBase
+        Authentication to attach to every request (e.g. ``SlurmAuthConfig``)
+    max_in_flight : int, optional
+        Number of connections to keep in the pool (default: 8)
+
+    Returns
+    -------
+    requests.Session
+    """
+    session = requests.Session()
+    session.auth = auth
+    session.hooks["response"].append(response_hook)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(max_in_flight, 1))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_SESSIONS: Dict[str, requests.Session] = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def shared_session(
+    base_url: str,
+    auth: Any,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+) -> requests.Session:
+    """
+    Return the process-wide session for ``base_url``, creating it if needed.
+
+    Reusing the session keeps its pooled keep-alive connections open between
+    pipeline runs, e.g. in daemon mode. The authentication is replaced by
+    ``auth`` on every call, since tokens are refreshed, and the session is
+    replaced if its pool is smaller than ``max_in_flight``. The replaced
+    session is closed, so its idle connections do not stay open.
+
+    Parameters
+    ----------
+    base_url : str
+        The base URL the session is used for
+    auth : requests.auth.AuthBase
+        Authentication to attach to every request
+    max_in_flight : int, optional
+        Number of connections to keep in the pool (default: 8)
+
+    Returns
+    -------
+    requests.Session
+    """
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(base_url)
+        if session is None or (
+            session.get_adapter(base_url)._pool_maxsize < max_in_flight
+        ):
+            if session is not None:
+                # Requests still running on it finish, then their connections
+                # are closed instead of returned to the pool
+                session.close()
+            session = _SESSIONS[base_url] = make_session(auth, max_in_flight)
+        session.auth = auth
+        return session
+
+
+def extract_data(payload: Any, data_selector: str) -> List[Any]:
+    """
+    Select the records from a decoded response the same way dlt's
+    ``RESTClient.extract_response`` does.
+    """
+    data: Any = jsonpath.find_values(data_selector, payload)
+    data = data[0] if isinstance(data, list) and len(data) == 1 else data
+    if data is None:
+        return []
+    if not isinstance(data, list):
+        data = [data]
+    return data
+
+
+def derive_from_parent(
+    required_fields: Sequence[str],
+    wrap_key: Optional[str] = None,
+) -> Callable[[Dict[str, Any]], Optional[List[Any]]]:
+    """
+    Build a function that turns a parent row into the child records directly.
+
+    Overview endpoints such as ``/slurm/v0.0.38/jobs`` already return the full
+    record of every entity, so the per-entity request is only needed when the
+    overview row is truncated.
+
+    Parameters
+    ----------
+    required_fields : sequence of str
+        Fields that must be present (and not ``None``) in the parent row for
+        it to count as complete
+    wrap_key : str, optional
+        If given, the record is wrapped as ``{wrap_key: [row]}``, mirroring
+        the shape of detail endpoints that are selected with ``"$"``
+
+    Returns
+    -------
+    callable
+        Returns the child records for complete rows, and ``None`` for rows
+        which still have to be fetched
+    """
+
+    def derive(row: Dict[str, Any]) -> Optional[List[Any]]:
+        if any(row.get(field) is None for field in required_fields):
+            return None
+        record = dict(row)
+        return [{wrap_key: [record]}] if wrap_key else [record]
+
+    return derive
+
+
+def fanout_resource(
+    parent: DltResource,
+    name: str,
+    table_name: str,
+    path: str,
+    param: str,
+    field: str,
+    base_url: str,
+    session: requests.Session,
+    data_selector: str = "$",
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    derive: Optional[Callable[[Dict[str, Any]], Optional[List[Any]]]] = None,
+) -> DltResource:
+    """
+    Create a child resource that resolves ``path`` for every row of ``parent``.
+
+    This is the concurrent equivalent of a ``rest_api`` resource using a
+    ``{"type": "resolve", "resource": parent, "field": field}`` parameter.
+
+    Parameters
+    ----------
+    parent : DltResource
+        The resource providing the rows to resolve
+    name : str
+        Name of the new resource
+    table_name : str
+        Destination table of the new resource
+    path : str
+        Endpoint path with a ``{param}`` placeholder,
+        e.g. ``/slurm/v0.0.38/job/{job_id}``
+    param : str
+        Name of the placeholder in ``path``
+    field : str
+        Field of the parent row substituted into the placeholder
+    base_url : str
+        The base URL to use for the requests
+    session : requests.Session
+        Session used for all requests, see :func:`make_session`
+    data_selector : str, optional
+        JSONPath selecting the records in each response (default: ``"$"``)
+    max_in_flight : int, optional
+        Concurrent requests for this endpoint (default: 8)
+    derive : callable, optional
+        Produces the child records from the parent row itself, see
+        :func:`derive_from_parent`. Only rows for which it returns ``None``
+        are requested from ``path``.
+
+    Returns
+    -------
+    DltResource
+        A dlt transformer bound to ``parent``
+    """
+
+    def fetch(row: Dict[str, Any]) -> List[Any]:
+        url = f"{base_url}{path.format(**{param: row[field]})}"
+        response = session.get(url, hooks=endpoint_hooks(path))
+        response.raise_for_status()
+        return extract_data(response.json(), data_selector)
+
+    def resolve(rows: Any) -> Iterator[List[Any]]:
+        if isinstance(rows, dict):
+            rows = [rows]
+        derived = [derive(row) for row in rows] if derive else [None] * len(rows)
+        missing = [row for row, records in zip(rows, derived) if records is None]
+        logger.debug(
+            f"Resolving {len(missing)} of {len(rows)} rows for {name} "
+            f"with up to {max_in_flight} requests in flight"
+        )
+        fetched = ordered_map(fetch, missing, max_in_flight)
+        for records in derived:
+            if records is None:
+                records = next(fetched)
+            if records:
+                yield records
+
+    return dlt.transformer(
+        resolve,
+        name=name,
+        table_name=table_name,
+        data_from=parent,
+    )
+
+
+def max_in_flight_for(
+    resource_name: str,
+    max_in_flight: Optional[Dict[str, int]] = None,
+) -> int:
+    """Look up the concurrency limit of one endpoint, falling back to the default"""
+    if not max_in_flight:
+        return DEFAULT_MAX_IN_FLIGHT
+    return int(
+        max_in_flight.get(
+            resource_name, max_in_flight.get("default", DEFAULT_MAX_IN_FLIGHT)
+        )
+    )
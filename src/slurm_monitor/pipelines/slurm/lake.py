@@ -0,0 +1,390 @@
+"""
+Parquet "lake" destination, as an alternative to the single DuckDB file.
+
+With the DuckDB destination, the pipeline and the dashboard contend for one
+database file. In lake mode, every load writes immutable Parquet files,
+partitioned by table and load date::
+
+    slurm_lake/slurm_data/v0_0_38_jobs/date=2026-10-18/<load_id>.<file_id>.parquet
+
+Readers query them with DuckDB's ``read_parquet`` and hive partitioning, so
+they never block ingestion, and a ``date`` filter only opens the files of the
+matching days. Since a job is loaded on or after the day it was submitted,
+``date >= <first day of interest>`` is a safe filter for job queries.
+
+dlt's filesystem destination cannot merge plain Parquet files, so the tables
+which are merged on their keys in DuckDB (``SLURM_TABLE_KEYS`` in
+dlt_sources.py) are appended to in the lake: every load adds another version
+of the changed entities, and readers take the latest version of every key.
+
+The rollups of rollups.py are maintained in the lake as well, partitioned by
+day of submission (``rollups/jobs_hourly/date=.../data.parquet``), or by day
+of the job's end for the usage rollup. After each load, only the days touched
+by that load are recomputed and replaced. The latest versions of the jobs of
+all touched days are read in a single scan of the load-date partitions from
+the earliest touched day on; dlt's layout placeholders only know the load
+time, so the raw job tables cannot be partitioned by submission day instead.
+"""
+
+import glob
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, List, Optional, Tuple
+
+from ...logging import logger
+from .metrics import METRICS_COLUMNS, METRICS_TABLE
+from .rollups import (
+    DB_JOBS_TABLE,
+    DB_TRES_TABLE,
+    JOBS_TABLE,
+    ROLLUP_BUCKET,
+    duration_bucket_sql,
+    job_tres_sql,
+)
+
+DEFAULT_LAKE_PATH = "slurm_lake"
+"""Directory of the Parquet lake"""
+
+LAKE_DATASET = "slurm_data"
+"""Dataset name, i.e. the directory of the tables inside the lake"""
+
+LAKE_LAYOUT = "{table_name}/date={YYYY}-{MM}-{DD}/{load_id}.{file_id}.{ext}"
+"""File layout of the lake, partitioned by table and load date"""
+
+
+def lake_destination(path: str = DEFAULT_LAKE_PATH):
+    """The dlt filesystem destination writing the lake at ``path``"""
+    from dlt.destinations import filesystem
+
+    return filesystem(bucket_url=os.path.abspath(path), layout=LAKE_LAYOUT)
+
+
+def table_glob(path: str, table_name: str) -> str:
+    """Glob matching all Parquet files of a lake table"""
+    return os.path.join(path, LAKE_DATASET, table_name, "*", "*.parquet")
+
+
+def rollup_glob(path: str, rollup: str) -> str:
+    """Glob matching all Parquet files of a lake rollup"""
+    return os.path.join(path, "rollups", rollup, "*", "*.parquet")
+
+
+def metrics_glob(path: str, table_name: str = METRICS_TABLE) -> str:
+    """Glob matching all Parquet files of the lake pipeline metrics"""
+    return os.path.join(path, "metrics", table_name, "*", "*.parquet")
+
+
+def read_parquet_sql(pattern: str) -> str:
+    """``read_parquet`` call for a hive-partitioned glob"""
+    return f"read_parquet('{pattern}', hive_partitioning = true, union_by_name = true)"
+
+
+def loads_version_query(path: str = DEFAULT_LAKE_PATH) -> str:
+    """
+    Query returning the number of loads in the lake.
+
+    dlt writes one file per completed load into ``_dlt_loads``, so listing
+    them is enough. The count changes with every load, unlike the highest
+    load id, which stays the same when a package extracted earlier is loaded
+    late. It can be used as ``version_query`` of the dashboard query cache.
+    """
+    pattern = os.path.join(path, LAKE_DATASET, "_dlt_loads", "*.jsonl")
+    return f"SELECT count(*)::VARCHAR FROM glob('{pattern}')"
+
+
+def create_lake_views(conn: Any, path: str = DEFAULT_LAKE_PATH) -> List[str]:
+    """
+    Create a view in schema ``slurm_data`` for every table, rollup and the
+    pipeline metrics in the lake.
+
+    The views read the Parquet files with hive partitioning, so they have an
+    additional ``date`` column, and filters on it skip whole partitions.
+    Tables added by later loads need another call.
+
+    Parameters
+    ----------
+    conn : duckdb.DuckDBPyConnection
+        The connection to create the views in, e.g. an in-memory one
+    path : str, optional
+        Directory of the lake (default: ``slurm_lake``)
+
+    Returns
+    -------
+    list of str
+        The names of the views
+    """
+    conn.execute(f"CREATE SCHEMA IF NOT EXISTS {LAKE_DATASET}")
+    views = {}
+    for kind, directory, pattern in [
+        ("table", os.path.join(path, LAKE_DATASET), table_glob),
+        ("rollup", os.path.join(path, "rollups"), rollup_glob),
+        ("metrics", os.path.join(path, "metrics"), metrics_glob),
+    ]:
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            # Internal dlt tables are not partitioned
+            if not name.startswith("_") and next(glob.iglob(pattern(path, name)), None):
+                views[name] = read_parquet_sql(pattern(path, name))
+    for name, relation in views.items():
+        conn.execute(
+            f"CREATE OR REPLACE VIEW {LAKE_DATASET}.{name} AS SELECT * FROM {relation}"
+        )
+    return list(views)
+
+
+def _day(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def update_lake_rollups(
+    path: str = DEFAULT_LAKE_PATH,
+    load_ids: Optional[List[str]] = None,
+) -> List[str]:
+    """
+    Recompute the lake rollups of the days touched by ``load_ids``.
+
+    Parameters
+    ----------
+    path : str, optional
+        Directory of the lake (default: ``slurm_lake``)
+    load_ids : list of str, optional
+        The loads to process, e.g. ``load_info.loads_ids``. If not given,
+        all days are recomputed. An empty list means nothing was loaded.
+
+    Returns
+    -------
+    list of str
+        The recomputed days, as ``YYYY-MM-DD``
+    """
+    import duckdb
+
+    if load_ids is not None and not load_ids:
+        return []
+    jobs_glob = table_glob(path, JOBS_TABLE)
+    conn = duckdb.connect()
+    if not conn.execute("SELECT count(*) FROM glob(?)", [jobs_glob]).fetchone()[0]:
+        conn.close()
+        return []
+    jobs = read_parquet_sql(jobs_glob)
+    where = ""
+    if load_ids:
+        # The new files are in the partitions of their load dates
+        load_days = sorted({_day(int(float(load_id))) for load_id in load_ids})
+        ids = ", ".join(f"'{load_id}'" for load_id in load_ids)
+        days = ", ".join(f"'{day}'" for day in load_days)
+        where = f"AND date IN ({days}) AND _dlt_load_id IN ({ids})"
+    touched = [
+        row[0]
+        for row in conn.execute(
+            f"""
+            SELECT DISTINCT strftime(to_timestamp(submit_time), '%Y-%m-%d')
+            FROM {jobs}
+            WHERE submit_time > 0 {where}
+            ORDER BY 1
+            """
+        ).fetchall()
+    ]
+    if not touched:
+        conn.close()
+        return []
+    hour = f"submit_time - submit_time % {ROLLUP_BUCKET}"
+    duration = "(end_time - start_time) / 60"
+    columns = [
+        row[0] for row in conn.execute(f"DESCRIBE SELECT * FROM {jobs}").fetchall()
+    ]
+    cluster = "coalesce(cluster, '')" if "cluster" in columns else "''"
+    submit_day = "strftime(to_timestamp(submit_time), '%Y-%m-%d')"
+    days = ", ".join(f"'{day}'" for day in touched)
+    # Versions of jobs submitted on a day were loaded on that day or later
+    conn.execute(
+        f"""
+        CREATE TEMP TABLE latest_jobs AS
+        SELECT
+            {submit_day} AS day,
+            coalesce(partition, '') AS partition,
+            {hour} AS hour,
+            job_state,
+            cpus,
+            start_time,
+            end_time
+        FROM {jobs}
+        WHERE date >= '{touched[0]}' AND {submit_day} IN ({days})
+        QUALIFY row_number() OVER (
+            PARTITION BY {cluster}, job_id ORDER BY _dlt_load_id DESC
+        ) = 1
+        """
+    )
+    for day in touched:
+        latest_jobs = f"SELECT * EXCLUDE (day) FROM latest_jobs WHERE day = '{day}'"
+        rollups = {
+            "jobs_hourly": f"""
+                SELECT partition, hour, job_state,
+                    count(*) AS job_count, sum(cpus)::BIGINT AS cpu_sum
+                FROM ({latest_jobs})
+                GROUP BY ALL
+            """,
+            "jobs_duration_hourly": f"""
+                SELECT partition, hour,
+                    ({duration_bucket_sql(duration)})::BIGINT AS duration_bucket,
+                    count(*) AS job_count,
+                    sum({duration})::DOUBLE AS duration_sum,
+                    max({duration})::DOUBLE AS duration_max
+                FROM ({latest_jobs})
+                WHERE start_time > 0 AND end_time > start_time
+                GROUP BY ALL
+            """,
+        }
+        for rollup, query in rollups.items():
+            directory = os.path.join(path, "rollups", rollup, f"date={day}")
+            os.makedirs(directory, exist_ok=True)
+            target = os.path.join(directory, "data.parquet")
+            # Readers either see the old or the new file, never a partial one
+            conn.execute(f"COPY ({query}) TO '{target}.tmp' (FORMAT parquet)")
+            os.replace(f"{target}.tmp", target)
+    conn.close()
+    logger.info(f"...recomputed lake rollups of {len(touched)} days")
+    return touched
+
+
+def update_lake_usage(
+    path: str = DEFAULT_LAKE_PATH,
+    load_ids: Optional[List[str]] = None,
+) -> List[str]:
+    """
+    Recompute the lake usage rollup of the days touched by ``load_ids``.
+
+    The lake counterpart of :func:`~slurm_monitor.pipelines.slurm.rollups.update_usage`,
+    partitioned by the day the jobs ended (``rollups/usage_daily/date=...``).
+
+    Parameters
+    ----------
+    path : str, optional
+        Directory of the lake (default: ``slurm_lake``)
+    load_ids : list of str, optional
+        The loads to process. If not given, all days are recomputed. An
+        empty list means nothing was loaded.
+
+    Returns
+    -------
+    list of str
+        The recomputed days, as ``YYYY-MM-DD``
+    """
+    import duckdb
+
+    if load_ids is not None and not load_ids:
+        return []
+    jobs_glob = table_glob(path, DB_JOBS_TABLE)
+    conn = duckdb.connect()
+    if not conn.execute("SELECT count(*) FROM glob(?)", [jobs_glob]).fetchone()[0]:
+        conn.close()
+        return []
+    jobs = read_parquet_sql(jobs_glob)
+    where = ""
+    if load_ids:
+        load_days = sorted({_day(int(float(load_id))) for load_id in load_ids})
+        ids = ", ".join(f"'{load_id}'" for load_id in load_ids)
+        days = ", ".join(f"'{day}'" for day in load_days)
+        where = f"AND date IN ({days}) AND _dlt_load_id IN ({ids})"
+    end_day = "strftime(to_timestamp(time__end), '%Y-%m-%d')"
+    touched = [
+        row[0]
+        for row in conn.execute(
+            f"SELECT DISTINCT {end_day} FROM {jobs} WHERE time__end > 0 {where} "
+            f"ORDER BY 1"
+        ).fetchall()
+    ]
+    columns = [
+        row[0] for row in conn.execute(f"DESCRIBE SELECT * FROM {jobs}").fetchall()
+    ]
+    cluster = "coalesce(cluster, '')" if "cluster" in columns else "''"
+    tres_glob = table_glob(path, DB_TRES_TABLE)
+    tres = [read_parquet_sql(tres_glob), []]
+    if conn.execute("SELECT count(*) FROM glob(?)", [tres_glob]).fetchone()[0]:
+        tres[1] = [
+            row[0]
+            for row in conn.execute(f"DESCRIBE SELECT * FROM {tres[0]}").fetchall()
+        ]
+    cpus = job_tres_sql(columns, *tres, "cpu")
+    gpus = job_tres_sql(columns, *tres, "gres", "gpu")
+    hours = "(time__end - time__start) / 3600"
+    if touched:
+        days = ", ".join(f"'{day}'" for day in touched)
+        # Versions of jobs which ended on a day were loaded on that day or later
+        conn.execute(
+            f"""
+            CREATE TEMP TABLE latest_jobs AS
+            SELECT
+                {end_day} AS end_day,
+                {cluster} AS cluster,
+                coalesce("user", '') AS user_name,
+                coalesce(account, '') AS account,
+                coalesce(qos, '') AS qos,
+                {cpus} AS cpus,
+                {gpus} AS gpus,
+                time__start,
+                time__end
+            FROM {jobs} j
+            WHERE date >= '{touched[0]}' AND {end_day} IN ({days})
+            QUALIFY row_number() OVER (
+                PARTITION BY {cluster}, job_id, time__submission
+                ORDER BY _dlt_load_id DESC
+            ) = 1
+            """
+        )
+    for day in touched:
+        query = f"""
+            SELECT
+                cluster,
+                time__end - time__end % 86400 AS day,
+                user_name,
+                account,
+                qos,
+                count(*) AS job_count,
+                sum(coalesce(cpus, 0) * {hours})::DOUBLE AS cpu_hours,
+                sum(coalesce(gpus, 0) * {hours})::DOUBLE AS gpu_hours
+            FROM latest_jobs
+            WHERE end_day = '{day}'
+                AND time__start > 0 AND time__end > time__start
+            GROUP BY ALL
+        """
+        directory = os.path.join(path, "rollups", "usage_daily", f"date={day}")
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, "data.parquet")
+        conn.execute(f"COPY ({query}) TO '{target}.tmp' (FORMAT parquet)")
+        os.replace(f"{target}.tmp", target)
+    conn.close()
+    if touched:
+        logger.info(f"...recomputed lake usage of {len(touched)} days")
+    return touched
+
+
+def write_lake_metrics(
+    path: str, rows: List[Tuple], load_id: Optional[str], cluster: str
+):
+    """
+    Write drained pipeline metrics into the lake, one file per run.
+
+    The lake counterpart of :func:`~slurm_monitor.pipelines.slurm.metrics.write_metrics`,
+    partitioned by day like the tables (``metrics/pipeline_metrics/date=...``).
+    """
+    import duckdb
+
+    if not rows:
+        return
+    ts = int(time.time())
+    directory = os.path.join(path, "metrics", METRICS_TABLE, f"date={_day(ts)}")
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, f"{load_id or ts}.{cluster or 'all'}.parquet")
+    conn = duckdb.connect()
+    try:
+        conn.execute(f"CREATE TABLE metrics ({METRICS_COLUMNS})")
+        conn.executemany(
+            "INSERT INTO metrics VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(load_id, ts, cluster, *row) for row in rows],
+        )
+        conn.execute(f"COPY metrics TO '{target}.tmp' (FORMAT parquet)")
+    finally:
+        conn.close()
+    os.replace(f"{target}.tmp", target)
@@ -0,0 +1,416 @@
+"""
+Instrumentation of the ingestion: requests, bytes, rows and stage timings.
+
+Every request made through the shared sessions (see fanout.py) is recorded
+by a response hook, per endpoint: count, errors, latency histogram and
+response bytes. Ingestion stages (SSH tunnel startup, token generation, dlt
+extract, normalize and load, post-load steps) are timed with :func:`timed`,
+and normalize reports the rows per table.
+
+Metrics are recorded twice:
+
+* into the scope of the current ingestion (see :func:`run_metrics`), which
+  :func:`~slurm_monitor.pipelines.slurm.remote.run_pipeline` writes to the
+  ``pipeline_metrics`` table after every run, and then clears,
+* into process-wide counters per cluster, which only ever grow, and which
+  the daemon can serve in the Prometheus text format (see
+  :func:`serve_metrics`).
+
+The scope is a context variable, so concurrent ingestions of several
+clusters in their own threads do not mix their metrics. Worker threads of
+:func:`~slurm_monitor.pipelines.slurm.fanout.ordered_map` inherit it.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import functools
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+from urllib.parse import urlsplit
+
+from ...logging import logger
+
+if TYPE_CHECKING:
+    import dlt
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+"""Upper bounds of the request latency histogram buckets in seconds"""
+
+METRICS_TABLE = "pipeline_metrics"
+"""Table the metrics of every pipeline run are written to"""
+
+METRICS_COLUMNS = """
+    load_id VARCHAR,
+    ts BIGINT,
+    cluster VARCHAR,
+    kind VARCHAR,
+    name VARCHAR,
+    count BIGINT,
+    errors BIGINT,
+    seconds DOUBLE,
+    bytes BIGINT,
+    rows BIGINT,
+    histogram BIGINT[]
+"""
+"""Columns of :data:`METRICS_TABLE`. ``kind`` is ``endpoint``, ``stage`` or
+``table``; ``histogram`` holds the request counts per latency bucket (see
+:data:`LATENCY_BUCKETS`, plus one bucket for slower requests)."""
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_label(url: str) -> str:
+    """
+    The path of ``url``, with numeric ids replaced by ``{id}``.
+
+    Only a fallback for requests sent without :func:`endpoint_hooks`, e.g. by
+    the ``rest_api`` resources, which request fixed paths.
+    """
+    return _ID_SEGMENT.sub("/{id}", urlsplit(url).path)
+
+
+def response_endpoint(response: Any) -> str:
+    """The endpoint label the response hook recorded ``response`` under"""
+    return getattr(response, "metrics_endpoint", None) or endpoint_label(response.url)
+
+
+def endpoint_hooks(endpoint: str) -> Dict[str, List[Callable]]:
+    """
+    Request hooks recording a request under the path template ``endpoint``.
+
+    Pass them as ``hooks`` of a request, in place of the hook of the session
+    (see :func:`~slurm_monitor.pipelines.slurm.fanout.make_session`), so that
+    e.g. all ``/slurm/v0.0.38/node/{name}`` requests share one label instead
+    of one per node.
+    """
+    return {"response": [functools.partial(response_hook, endpoint=endpoint)]}
+
+
+class Metrics:
+    """Thread-safe counters of requests, rows and stages"""
+
+    def __init__(self, cluster: str = ""):
+        self.cluster = cluster
+        self.endpoints: Dict[str, Dict[str, Any]] = {}
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.rows: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, endpoint: str) -> Dict[str, Any]:
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = {
+                "count": 0,
+                "errors": 0,
+                "seconds": 0.0,
+                "bytes": 0,
+                "histogram": [0] * (len(LATENCY_BUCKETS) + 1),
+            }
+        return self.endpoints[endpoint]
+
+    def observe_request(
+        self, endpoint: str, seconds: float, nbytes: Optional[int], ok: bool = True
+    ):
+        """Record one request; ``nbytes`` may follow with :meth:`add_bytes`"""
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats["count"] += 1
+            stats["errors"] += not ok
+            stats["seconds"] += seconds
+            stats["bytes"] += nbytes or 0
+            stats["histogram"][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def add_bytes(self, endpoint: str, nbytes: int):
+        """Record the bytes of a streamed response, once it has been read"""
+        with self._lock:
+            self._endpoint(endpoint)["bytes"] += nbytes
+
+    def observe_stage(self, stage: str, seconds: float):
+        """Record one run of an ingestion stage"""
+        with self._lock:
+            stats = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0})
+            stats["count"] += 1
+            stats["seconds"] += seconds
+
+    def add_rows(self, table: str, rows: int):
+        """Record rows extracted into ``table``"""
+        with self._lock:
+            self.rows[table] = self.rows.get(table, 0) + rows
+
+    def drain(self) -> List[Tuple]:
+        """
+        Return all metrics as :data:`METRICS_TABLE` rows, and clear them.
+
+        The rows lack the leading ``load_id``, ``ts`` and ``cluster`` columns.
+        """
+        with self._lock:
+            rows = [
+                (
+                    "endpoint",
+                    endpoint,
+                    stats["count"],
+                    stats["errors"],
+                    stats["seconds"],
+                    stats["bytes"],
+                    None,
+                    list(stats["histogram"]),
+                )
+                for endpoint, stats in sorted(self.endpoints.items())
+            ]
+            rows += [
+                (
+                    "stage",
+                    stage,
+                    stats["count"],
+                    None,
+                    stats["seconds"],
+                    None,
+                    None,
+                    None,
+                )
+                for stage, stats in sorted(self.stages.items())
+            ]
+            rows += [
+                ("table", table, None, None, None, None, count, None)
+                for table, count in sorted(self.rows.items())
+            ]
+            self.endpoints.clear()
+            self.stages.clear()
+            self.rows.clear()
+        return rows
+
+
+_PROCESS: Dict[str, Metrics] = {}
+_PROCESS_LOCK = threading.Lock()
+_CURRENT: contextvars.ContextVar[Optional[Metrics]] = contextvars.ContextVar(
+    "slurm_monitor_metrics", default=None
+)
+
+
+def process_metrics(cluster: str = "") -> Metrics:
+    """The process-wide, cumulative metrics of ``cluster``"""
+    with _PROCESS_LOCK:
+        if cluster not in _PROCESS:
+            _PROCESS[cluster] = Metrics(cluster)
+        return _PROCESS[cluster]
+
+
+@contextlib.contextmanager
+def run_metrics(cluster: Optional[str] = None) -> Iterator[Metrics]:
+    """
+    Scope collecting the metrics of one ingestion.
+
+    If a scope is active already, it is reused, so that e.g. the tunnel
+    startup before a session and the pipeline runs of the session end up in
+    the same scope.
+    """
+    current = _CURRENT.get()
+    if current is not None:
+        yield current
+        return
+    token = _CURRENT.set(Metrics(cluster or ""))
+    try:
+        yield _CURRENT.get()
+    finally:
+        _CURRENT.reset(token)
+
+
+def _targets() -> List[Metrics]:
+    current = _CURRENT.get()
+    if current is None:
+        return [process_metrics()]
+    return [current, process_metrics(current.cluster)]
+
+
+@contextlib.contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Time the block as one run of ``stage``, also if it fails"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        for metrics in _targets():
+            metrics.observe_stage(stage, seconds)
+
+
+def record_rows(row_counts: Dict[str, int]):
+    """Record rows per table, e.g. ``normalize_info.row_counts``"""
+    for metrics in _targets():
+        for table, rows in row_counts.items():
+            if not table.startswith("_dlt"):
+                metrics.add_rows(table, rows)
+
+
+def response_hook(
+    response: Any, *args, endpoint: Optional[str] = None, **kwargs
+) -> Any:
+    """
+    ``requests`` response hook recording the request.
+
+    The request is recorded under ``endpoint``, see :func:`endpoint_hooks`,
+    or the path of its URL. The latency is the time until the headers
+    arrived. The body of streamed responses is not touched here; their bytes
+    are counted while they are read, see :func:`count_bytes`.
+    """
+    response.metrics_endpoint = endpoint or endpoint_label(response.url)
+    nbytes = None if kwargs.get("stream") else len(response.content)
+    for metrics in _targets():
+        metrics.observe_request(
+            response.metrics_endpoint,
+            response.elapsed.total_seconds(),
+            nbytes,
+            response.ok,
+        )
+    return response
+
+
+def record_bytes(endpoint: str, nbytes: int):
+    """Record the size of a streamed response body, see :func:`response_endpoint`"""
+    for metrics in _targets():
+        metrics.add_bytes(endpoint, nbytes)
+
+
+def count_bytes(chunks: Iterable[bytes], endpoint: str) -> Iterator[bytes]:
+    """Pass on the chunks of a streamed response, recording their size"""
+    nbytes = 0
+    try:
+        for chunk in chunks:
+            nbytes += len(chunk)
+            yield chunk
+    finally:
+        record_bytes(endpoint, nbytes)
+
+
+def write_metrics(
+    pipeline: "dlt.Pipeline", rows: List[Tuple], load_id: Optional[str], cluster: str
+):
+    """
+    Append drained metrics (see :meth:`Metrics.drain`) to ``pipeline_metrics``.
+
+    Parameters
+    ----------
+    pipeline : dlt.Pipeline
+        A pipeline with a DuckDB destination
+    rows : list of tuple
+        The metrics
+    load_id : str, optional
+        The load of the run, if it loaded anything
+    cluster : str
+        The cluster of the run, ``""`` without one
+    """
+    if not rows:
+        return
+    with pipeline.sql_client() as client:
+        if not client.has_dataset():
+            return
+        table = client.make_qualified_table_name(METRICS_TABLE)
+        client.execute_sql(f"CREATE TABLE IF NOT EXISTS {table} ({METRICS_COLUMNS})")
+        ts = int(time.time())
+        client.native_connection.executemany(
+            f"INSERT INTO {table} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(load_id, ts, cluster, *row) for row in rows],
+        )
+
+
+def _labels(**labels: str) -> str:
+    pairs = ",".join(
+        f'{name}="{value}"' for name, value in labels.items() if value is not None
+    )
+    return f"{{{pairs}}}" if pairs else ""
+
+
+def prometheus_text(prefix: str = "slurm_monitor") -> str:
+    """The process-wide metrics of all clusters, in Prometheus text format"""
+    with _PROCESS_LOCK:
+        registries = list(_PROCESS.values())
+    families: Dict[str, Tuple[str, str, List[str]]] = {
+        "http_requests_total": ("counter", "Requests to slurmrestd", []),
+        "http_request_errors_total": ("counter", "Requests that failed", []),
+        "http_response_bytes_total": ("counter", "Bytes received", []),
+        "http_request_duration_seconds": (
+            "histogram",
+            "Time until the response headers arrived",
+            [],
+        ),
+        "rows_total": ("counter", "Rows extracted, per table", []),
+        "stage_duration_seconds": ("summary", "Duration of ingestion stages", []),
+    }
+    for metrics in registries:
+        cluster = metrics.cluster or None
+        with metrics._lock:
+            for endpoint, stats in sorted(metrics.endpoints.items()):
+                labels = _labels(cluster=cluster, endpoint=endpoint)
+                families["http_requests_total"][2].append(f"{labels} {stats['count']}")
+                families["http_request_errors_total"][2].append(
+                    f"{labels} {stats['errors']}"
+                )
+                families["http_response_bytes_total"][2].append(
+                    f"{labels} {stats['bytes']}"
+                )
+                histogram = families["http_request_duration_seconds"][2]
+                cumulative = 0
+                for bound, count in zip([*LATENCY_BUCKETS, "+Inf"], stats["histogram"]):
+                    cumulative += count
+                    bucket = _labels(cluster=cluster, endpoint=endpoint, le=str(bound))
+                    histogram.append(f"_bucket{bucket} {cumulative}")
+                histogram.append(f"_sum{labels} {stats['seconds']}")
+                histogram.append(f"_count{labels} {stats['count']}")
+            for table, count in sorted(metrics.rows.items()):
+                labels = _labels(cluster=cluster, table=table)
+                families["rows_total"][2].append(f"{labels} {count}")
+            for stage, stats in sorted(metrics.stages.items()):
+                labels = _labels(cluster=cluster, stage=stage)
+                summary = families["stage_duration_seconds"][2]
+                summary.append(f"_sum{labels} {stats['seconds']}")
+                summary.append(f"_count{labels} {stats['count']}")
+    lines = []
+    for family, (kind, description, samples) in families.items():
+        name = f"{prefix}_{family}"
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample in samples:
+            # Samples start with their suffix or labels
+            lines.append(f"{name}{sample}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"metrics endpoint: {format % args}")
+
+
+def serve_metrics(port: int, host: str = "") -> ThreadingHTTPServer:
+    """
+    Serve :func:`prometheus_text` at ``http://<host>:<port>/metrics``.
+
+    The server runs in a daemon thread; call ``shutdown()`` to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"...serving Prometheus metrics on port {server.server_port}")
+    return server
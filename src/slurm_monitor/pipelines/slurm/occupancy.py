@@ -0,0 +1,249 @@
+"""
+Allocated CPUs per partition over time, from the job intervals.
+
+Every job that ran contributes ``cpus`` between its start and end time. The
+occupancy of a partition in a time bucket is the mean number of CPUs
+allocated during the bucket, i.e. the CPU seconds of all jobs overlapping it
+divided by its length. Instead of looping over the buckets of every job, the
+queries are an interval sweep in DuckDB:
+
+* every job emits at most three events: its CPU seconds in the first and in
+  the last bucket it overlaps, and ``+cpus``/``-cpus`` rate changes for the
+  full buckets in between,
+* the events are summed per partition and bucket, and a running sum over the
+  buckets (a window function) turns the rate changes into the CPU seconds of
+  the full buckets.
+
+The work is linear in the number of jobs, plus the number of buckets, so a
+million job intervals take well under a second (see
+``dev/benchmarks/occupancy.py``).
+
+The intervals come from the slurm job table (``v0_0_38_jobs``) and the
+slurmdb job history (``dbv0_0_38_jobs``), whichever exist, with the latest
+version of every job counted once. The CPUs of the slurmdb jobs are their
+allocated TRES, see :func:`~slurm_monitor.pipelines.slurm.rollups.job_tres_sql`.
+"""
+
+from typing import Dict, List, Optional
+
+from .rollups import (
+    DB_JOBS_TABLE,
+    DB_TRES_TABLE,
+    JOBS_TABLE,
+    TRES_COLUMNS,
+    job_tres_sql,
+)
+
+OCCUPANCY_BUCKET = 300
+"""Default length of one occupancy bucket in seconds (five minutes)"""
+
+MAX_BUCKETS = 2000
+"""Maximum number of buckets per partition, see :func:`occupancy_bucket`"""
+
+JOB_COLUMNS = {
+    # table: columns needed for the intervals
+    JOBS_TABLE: ["job_id", "partition", "job_state", "start_time", "end_time", "cpus"],
+    DB_JOBS_TABLE: [
+        "job_id",
+        "partition",
+        "state__current",
+        "time__start",
+        "time__end",
+    ],
+    # Only needed if the job table has no tres__allocated column
+    DB_TRES_TABLE: TRES_COLUMNS,
+}
+"""Columns of the job tables the intervals are taken from"""
+
+
+def occupancy_bucket(
+    start: int,
+    end: int,
+    bucket: int = OCCUPANCY_BUCKET,
+    max_buckets: int = MAX_BUCKETS,
+) -> int:
+    """
+    Bucket length for the time range ``start`` to ``end``.
+
+    ``bucket``, or the smallest multiple of it that keeps the number of
+    buckets at ``max_buckets``, so that the result of :func:`occupancy_sql`
+    stays small for long time ranges.
+    """
+    buckets = -(-(end - start) // bucket)
+    return bucket * max(1, -(-buckets // max_buckets))
+
+
+def job_intervals_sql(
+    columns: Dict[str, List[str]], dataset: str = "slurm_data"
+) -> Optional[str]:
+    """
+    Query returning the run time interval of every job that ran.
+
+    Parameters
+    ----------
+    columns : dict
+        Table name -> its column names, for the job tables in the dataset,
+        e.g. from ``information_schema.columns``. Tables without all of the
+        :data:`JOB_COLUMNS` are left out.
+    dataset : str, optional
+        Schema of the tables (default: ``slurm_data``)
+
+    Returns
+    -------
+    str or None
+        Query returning partition, start_time, end_time and cpus, None if
+        there is no job table. Running jobs end now.
+    """
+    slurm_columns = list(columns.get(JOBS_TABLE, []))
+    db_columns = list(columns.get(DB_JOBS_TABLE, []))
+    # The slurmdb history always knows the cluster, the slurm job table only
+    # in multi-cluster mode. If it does not, there is just one cluster.
+    if "cluster" in slurm_columns or not slurm_columns:
+        cluster = "coalesce(cluster, '')"
+    else:
+        cluster = "''"
+    parts = []
+    if set(JOB_COLUMNS[JOBS_TABLE]) <= set(slurm_columns):
+        parts.append(
+            f"""
+            SELECT
+                {cluster if "cluster" in slurm_columns else "''"} AS cluster,
+                job_id,
+                coalesce(partition, '') AS partition,
+                job_state AS state,
+                start_time,
+                end_time,
+                cpus,
+                _dlt_load_id
+            FROM {dataset}.{JOBS_TABLE}
+            """
+        )
+    if set(JOB_COLUMNS[DB_JOBS_TABLE]) <= set(db_columns):
+        cpus = job_tres_sql(
+            db_columns,
+            f"{dataset}.{DB_TRES_TABLE}",
+            list(columns.get(DB_TRES_TABLE, [])),
+            "cpu",
+        )
+        parts.append(
+            f"""
+            SELECT
+                {cluster if "cluster" in db_columns else "''"} AS cluster,
+                job_id,
+                coalesce(partition, '') AS partition,
+                state__current AS state,
+                time__start AS start_time,
+                time__end AS end_time,
+                {cpus} AS cpus,
+                _dlt_load_id
+            FROM {dataset}.{DB_JOBS_TABLE} j
+            """
+        )
+    if not parts:
+        return None
+    union = " UNION ALL ".join(parts)
+    return f"""
+        SELECT
+            partition,
+            start_time,
+            CASE
+                WHEN end_time > start_time THEN end_time
+                ELSE epoch(current_timestamp)::BIGINT
+            END AS end_time,
+            cpus
+        FROM (
+            SELECT *
+            FROM ({union})
+            QUALIFY row_number() OVER (
+                PARTITION BY cluster, job_id ORDER BY _dlt_load_id DESC
+            ) = 1
+        )
+        WHERE start_time > 0 AND state <> 'PENDING' AND cpus > 0
+    """
+
+
+def occupancy_sql(
+    intervals: str, start: int, end: int, bucket: int = OCCUPANCY_BUCKET
+) -> str:
+    """
+    Query returning the allocated CPUs per partition and time bucket.
+
+    Parameters
+    ----------
+    intervals : str
+        Table or query with the columns partition, start_time, end_time (unix
+        timestamps) and cpus, e.g. from :func:`job_intervals_sql`
+    start, end : int
+        The time range, as unix timestamps. ``start`` is rounded down to a
+        multiple of ``bucket``.
+    bucket : int, optional
+        Length of one bucket in seconds (default: 300)
+
+    Returns
+    -------
+    str
+        Query returning partition, ts (start of the bucket) and alloc_cpus
+        (mean over the bucket) for every partition with jobs in the range and
+        every bucket, including those without any job
+    """
+    start -= start % bucket
+    n_buckets = max(1, -(-(end - start) // bucket))
+    end = start + n_buckets * bucket
+    return f"""
+        WITH spans AS (
+            SELECT
+                partition,
+                cpus,
+                s,
+                e,
+                s // {bucket} AS first_bucket,
+                e // {bucket} AS last_bucket
+            FROM (
+                SELECT
+                    partition,
+                    cpus,
+                    greatest(start_time, {start}) - {start} AS s,
+                    least(end_time, {end}) - {start} AS e
+                FROM ({intervals})
+                WHERE start_time < {end} AND end_time > {start}
+            )
+            WHERE e > s
+        ),
+        events AS (
+            SELECT
+                partition,
+                first_bucket AS b,
+                cpus * (least(e, (first_bucket + 1) * {bucket}) - s) AS seconds,
+                0 AS rate
+            FROM spans
+            UNION ALL
+            SELECT partition, first_bucket + 1, 0, cpus
+            FROM spans
+            WHERE last_bucket > first_bucket
+            UNION ALL
+            SELECT partition, last_bucket, cpus * (e - last_bucket * {bucket}), -cpus
+            FROM spans
+            WHERE last_bucket > first_bucket
+        ),
+        buckets AS (
+            SELECT partition, b, sum(seconds) AS seconds, sum(rate) AS rate
+            FROM events
+            GROUP BY ALL
+        ),
+        grid AS (
+            SELECT partition, range AS b
+            FROM (SELECT DISTINCT partition FROM buckets), range({n_buckets})
+        )
+        SELECT
+            partition,
+            {start} + b * {bucket} AS ts,
+            (
+                coalesce(seconds, 0)
+                + {bucket} * sum(coalesce(rate, 0)) OVER (
+                    PARTITION BY partition ORDER BY b
+                )
+            ) / {bucket} AS alloc_cpus
+        FROM grid
+        LEFT JOIN buckets USING (partition, b)
+        ORDER BY partition, ts
+    """
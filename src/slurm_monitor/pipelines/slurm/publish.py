@@ -0,0 +1,182 @@
+"""
+Read-only snapshots of the DuckDB database for the dashboards.
+
+DuckDB allows either one writing process or several reading ones per file.
+The pipeline therefore only ever writes ``slurm_pipeline.duckdb``, its staging
+database. After every load (and the post-load steps), the staging database is
+copied into a new, immutable snapshot file, and a pointer file naming the
+latest snapshot is atomically replaced::
+
+    published/
+        CURRENT                             -> slurm_1792289825.161697.duckdb
+        slurm_1792289820.923695.duckdb
+        slurm_1792289825.161697.duckdb
+
+Readers open the file named in ``CURRENT`` read-only, so loads never wait for
+the dashboard and the dashboard never waits for a load. Old snapshots are
+deleted once ``keep`` newer ones exist; readers which still have one open keep
+reading it until they switch to the new one.
+
+Every snapshot is a full copy of the staging database, so its cost grows with
+the history kept in it, not with the size of the load. :func:`publish_due`
+therefore publishes at most once per ``interval`` (default: every 5 minutes)
+and skips the copy while another one is running, instead of after every load
+of the daemon's 30 second tasks. The copy reads a consistent view of the
+database without holding the destination lock, so loads of other clusters go
+on meanwhile. With a history of many GB, raise the interval, or disable
+publishing (``slurm-monitor daemon --no-publish``) and have the dashboard read
+the Parquet lake instead.
+"""
+
+import glob
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+
+from ...logging import logger
+
+if TYPE_CHECKING:
+    import dlt
+
+DEFAULT_PUBLISH_DIR = "published"
+"""Directory of the published snapshots"""
+
+DEFAULT_KEEP = 3
+"""Number of published snapshots to keep"""
+
+POINTER_FILE = "CURRENT"
+"""File in the publish directory naming the latest snapshot"""
+
+DEFAULT_PUBLISH_INTERVAL = 300.0
+"""Minimum seconds between two snapshots published by :func:`publish_due`"""
+
+_ATTACHED = "slurm_publish"
+
+_PUBLISH_LOCK = threading.Lock()
+# Absolute publish directory -> monotonic time of its last snapshot
+_last_published: Dict[str, float] = {}
+
+
+def published_snapshot(publish_dir: str = DEFAULT_PUBLISH_DIR) -> Optional[str]:
+    """
+    Path of the latest published snapshot.
+
+    Parameters
+    ----------
+    publish_dir : str, optional
+        Directory of the published snapshots (default: ``published``)
+
+    Returns
+    -------
+    str or None
+        The path, or None if nothing was published yet
+    """
+    try:
+        with open(os.path.join(publish_dir, POINTER_FILE)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(publish_dir, name) if name else None
+
+
+def publish_snapshot(
+    pipeline: "dlt.Pipeline",
+    publish_dir: str = DEFAULT_PUBLISH_DIR,
+    keep: int = DEFAULT_KEEP,
+) -> Optional[str]:
+    """
+    Copy the pipeline database into a new snapshot and publish it.
+
+    Parameters
+    ----------
+    pipeline : dlt.Pipeline
+        A pipeline with a DuckDB destination
+    publish_dir : str, optional
+        Directory of the published snapshots (default: ``published``)
+    keep : int, optional
+        Number of snapshots to keep, including the new one (default: 3)
+
+    Returns
+    -------
+    str or None
+        Path of the new snapshot, None if the pipeline has not loaded
+        anything yet
+    """
+    os.makedirs(publish_dir, exist_ok=True)
+    with pipeline.sql_client() as client:
+        if not client.has_dataset():
+            return None
+        # Named by the time of publishing rather than by the latest load id:
+        # a package loaded late has an older id, and the node and queue
+        # snapshots change with every poll, also without new loads
+        name = f"slurm_{time.time():.6f}.duckdb"
+        path = os.path.join(publish_dir, name)
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            # Left behind by an interrupted copy
+            os.remove(tmp_path)
+        database = client.execute_sql("SELECT current_database()")[0][0]
+        client.execute_sql(f"ATTACH '{tmp_path}' AS {_ATTACHED}")
+        try:
+            client.execute_sql(f"COPY FROM DATABASE {database} TO {_ATTACHED}")
+        finally:
+            client.execute_sql(f"DETACH {_ATTACHED}")
+    os.replace(tmp_path, path)
+    pointer = os.path.join(publish_dir, POINTER_FILE)
+    with open(f"{pointer}.tmp", "w") as f:
+        f.write(name)
+    os.replace(f"{pointer}.tmp", pointer)
+    logger.info(f"...published {path}")
+
+    # The names are timestamps, so they sort by age
+    snapshots = sorted(glob.glob(os.path.join(publish_dir, "slurm_*.duckdb")))
+    for old in snapshots[:-keep]:
+        os.remove(old)
+    return path
+
+
+def publish_due(
+    pipeline: "dlt.Pipeline",
+    publish_dir: str = DEFAULT_PUBLISH_DIR,
+    interval: float = DEFAULT_PUBLISH_INTERVAL,
+    keep: int = DEFAULT_KEEP,
+) -> Optional[str]:
+    """
+    Publish a snapshot, unless one was published less than ``interval`` ago.
+
+    Also skips the snapshot if another thread is copying one right now; the
+    next load after the interval publishes the data of both.
+
+    Parameters
+    ----------
+    pipeline : dlt.Pipeline
+        A pipeline with a DuckDB destination
+    publish_dir : str, optional
+        Directory of the published snapshots (default: ``published``)
+    interval : float, optional
+        Minimum seconds between two snapshots of ``publish_dir`` published by
+        this process (default: 300). 0 publishes after every load.
+    keep : int, optional
+        Number of snapshots to keep, including the new one (default: 3)
+
+    Returns
+    -------
+    str or None
+        Path of the new snapshot, None if none was published
+    """
+    key = os.path.abspath(publish_dir)
+    last = _last_published.get(key)
+    if last is not None and time.monotonic() - last < interval:
+        logger.debug(f"...last snapshot is less than {interval:.0f}s old")
+        return None
+    if not _PUBLISH_LOCK.acquire(blocking=False):
+        logger.debug("...another snapshot is being published")
+        return None
+    try:
+        path = publish_snapshot(pipeline, publish_dir, keep)
+        if path:
+            _last_published[key] = time.monotonic()
+        return path
+    finally:
+        _PUBLISH_LOCK.release()
@@ -4,16 +4,31 @@
 Remote interaction with SLURM REST API and SLURM CLI through SSH tunnels
 using Paramiko and subprocess
 """
+import atexit
+import contextlib
+import socket
 import subprocess
+import tempfile
+import threading
 import time
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
 
-import dlt
 import paramiko
 import requests
 
 from ...logging import logger
-from .dlt_sources import slurm_rest_source, slurm_restdb_source
+from .lake import DEFAULT_LAKE_PATH
+from .metrics import Metrics, run_metrics, timed
+from .publish import DEFAULT_PUBLISH_DIR, DEFAULT_PUBLISH_INTERVAL
+from .tokens import TokenCache, default_token_cache
+
+# dlt and DuckDB take most of the startup time, so the modules using them
+# are only imported by the functions running pipelines. The tunnel, tokens
+# and pings (e.g. ``slurm-monitor ping``) work without them.
+if TYPE_CHECKING:
+    import dlt
+
+    from .backfill import TimeLike
 
 
 class SlurmRestAPIError(Exception):
@@ -38,9 +53,218 @@ class SlurmdbEndpointError(SlurmRestAPIError):
     name = "slurmdb"
 
 
+class SSHSession:
+    """
+    One authenticated, keep-alive SSH connection shared by many commands.
+
+    Every command runs in its own exec channel of the same paramiko
+    transport, so the key exchange and authentication happen once instead of
+    once per command. Commands may run concurrently from several threads, up
+    to ``max_channels`` at a time (OpenSSH allows 10 sessions per connection
+    by default). A broken connection is re-established transparently.
+    """
+
+    def __init__(
+        self,
+        ssh_host: str,
+        ssh_port: int = 22,
+        ssh_username: str = None,
+        ssh_password: Optional[str] = None,
+        ssh_key_path: Optional[str] = None,
+        keepalive: int = 30,
+        max_channels: int = 8,
+    ):
+        self.ssh_host = ssh_host
+        self.ssh_port = ssh_port
+        self.ssh_username = ssh_username
+        self.ssh_password = ssh_password
+        self.ssh_key_path = ssh_key_path
+        self.keepalive = keepalive
+
+        self.client = None
+        self._lock = threading.Lock()
+        self._channels = threading.BoundedSemaphore(max_channels)
+
+    def is_alive(self) -> bool:
+        """Check that the transport is connected, authenticated and responsive"""
+        transport = self.client.get_transport() if self.client else None
+        if transport is None or not transport.is_active():
+            return False
+        if not transport.is_authenticated():
+            return False
+        try:
+            transport.send_ignore()
+        except (paramiko.SSHException, EOFError, OSError):
+            return False
+        return True
+
+    def connect(self) -> paramiko.SSHClient:
+        """Return the connected client, (re-)connecting if it is not healthy"""
+        with self._lock:
+            if self.is_alive():
+                return self.client
+            self._close()
+            client = paramiko.SSHClient()
+            client.load_system_host_keys()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            # Connect with either password or key
+            if self.ssh_key_path:
+                key = paramiko.RSAKey.from_private_key_file(self.ssh_key_path)
+                client.connect(
+                    self.ssh_host,
+                    port=self.ssh_port,
+                    username=self.ssh_username,
+                    pkey=key,
+                )
+            else:
+                client.connect(
+                    self.ssh_host,
+                    port=self.ssh_port,
+                    username=self.ssh_username,
+                    password=self.ssh_password,
+                )
+            client.get_transport().set_keepalive(self.keepalive)
+            logger.debug(f"SSH session to {self.ssh_host} established")
+            self.client = client
+            return client
+
+    def execute(self, command: str, retries: int = 1) -> Tuple[str, str, int]:
+        """
+        Execute a command in a new channel of the shared connection.
+
+        Parameters
+        ----------
+        command : str
+            The command to execute
+        retries : int, optional
+            How often to reconnect and retry if the connection is broken
+            (default: 1)
+
+        Returns
+        -------
+        Tuple[str, str, int]
+            stdout, stderr and exit status of the command
+        """
+        with self._channels:
+            for attempt in range(retries + 1):
+                try:
+                    client = self.connect()
+                    _, stdout, stderr = client.exec_command(command)
+                    output = stdout.read().decode("utf-8").strip()
+                    error = stderr.read().decode("utf-8").strip()
+                    return output, error, stdout.channel.recv_exit_status()
+                except (paramiko.SSHException, EOFError, OSError) as e:
+                    if attempt == retries:
+                        raise
+                    logger.warning(f"SSH session to {self.ssh_host} broken: {e}")
+                    with self._lock:
+                        self._close()
+
+    @contextlib.contextmanager
+    def stream(self, command: str, bufsize: int = 1 << 16) -> Iterator[Any]:
+        """
+        Execute a command and stream its stdout instead of reading it at once.
+
+        Use this for commands with large outputs::
+
+            with session.stream("squeue --json") as stdout:
+                for line in stdout:
+                    ...
+
+        Unlike :meth:`execute`, a broken connection is not retried, since the
+        output may already be partially consumed.
+
+        Raises
+        ------
+        SlurmCliError
+            If the command exits with a non-zero status, after its output was
+            consumed
+
+        Yields
+        ------
+        paramiko.ChannelFile
+            The stdout of the command, iterable line by line
+        """
+        with self._channels:
+            client = self.connect()
+            _, stdout, stderr = client.exec_command(command, bufsize=bufsize)
+            try:
+                yield stdout
+                status = stdout.channel.recv_exit_status()
+                error = stderr.read().decode("utf-8").strip()
+                # The output may be incomplete, it must not be loaded
+                if status:
+                    raise SlurmCliError(f"Command exited with {status}: {error}")
+                if error:
+                    logger.warning(f"Command wrote to stderr: {error}")
+            finally:
+                stdout.channel.close()
+
+    def _close(self):
+        if self.client:
+            self.client.close()
+            self.client = None
+
+    def close(self):
+        """Close the connection"""
+        with self._lock:
+            self._close()
+
+
+_SSH_SESSIONS: Dict[Tuple[str, int, str], SSHSession] = {}
+_SSH_SESSIONS_LOCK = threading.Lock()
+
+
+def get_ssh_session(
+    ssh_host: str,
+    ssh_port: int = 22,
+    ssh_username: str = None,
+    **kwargs,
+) -> SSHSession:
+    """
+    Get the shared :class:`SSHSession` for a host and user, creating it once.
+
+    Additional keyword arguments are passed on to :class:`SSHSession` when the
+    session is created.
+    """
+    key = (ssh_host, ssh_port, ssh_username)
+    with _SSH_SESSIONS_LOCK:
+        if key not in _SSH_SESSIONS:
+            _SSH_SESSIONS[key] = SSHSession(
+                ssh_host, ssh_port=ssh_port, ssh_username=ssh_username, **kwargs
+            )
+        return _SSH_SESSIONS[key]
+
+
+@atexit.register
+def close_ssh_sessions():
+    """Close all shared SSH sessions"""
+    with _SSH_SESSIONS_LOCK:
+        for session in _SSH_SESSIONS.values():
+            session.close()
+        _SSH_SESSIONS.clear()
+
+
+def find_free_port(host: str = "localhost") -> int:
+    """Ask the OS for a currently unused local TCP port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
 class SSHTunnel:
     """
     Create an SSH tunnel using Paramiko to access a remote service.
+
+    The tunnel can be used as a context manager, which keeps it open for the
+    whole block, e.g. one ingestion session or the lifetime of the daemon::
+
+        with SSHTunnel(**get_ssh_config()) as tunnel:
+            tunnel.run_func(ping_slurm_api)
+            tunnel.run_func(load_slurm_data, endpoint_type="slurm")
+
+    If no ``local_port`` is given, a free one is picked automatically, so
+    that several tunnels can run side by side.
     """
 
     def __init__(
@@ -52,7 +276,8 @@ class SSHTunnel:
         ssh_key_path: Optional[str] = None,
         remote_host: str = "localhost",
         remote_port: int = 8080,
-        local_port: int = 8080,
+        local_port: Optional[int] = None,
+        ready_timeout: float = 10.0,
     ):
         self.ssh_host = ssh_host
         self.ssh_port = ssh_port
@@ -62,6 +287,8 @@ class SSHTunnel:
         self.remote_host = remote_host
         self.remote_port = remote_port
         self.local_port = local_port
+        self.auto_port = local_port is None
+        self.ready_timeout = ready_timeout
 
         self.client = None
         self.transport = None
@@ -72,15 +299,42 @@ class SSHTunnel:
         self.slurm_username = None
         self.slurm_jwt_token = None
 
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
     def start(self):
         """Start the SSH tunnel using the ssh command"""
         if self.is_running:
             return
 
+        # A port picked automatically may be taken by someone else before
+        # ssh binds it, in which case we simply try another one.
+        attempts = 3 if self.auto_port else 1
+        for attempt in range(attempts):
+            if self.auto_port:
+                self.local_port = find_free_port()
+            try:
+                with timed("tunnel_start"):
+                    self._start_process()
+                return
+            except RuntimeError:
+                if attempt == attempts - 1:
+                    raise
+                logger.warning(f"SSH tunnel failed on port {self.local_port}, retrying")
+
+    def _start_process(self):
         # Build the SSH command
         cmd = [
             "ssh",
             "-N",
+            "-o",
+            "ExitOnForwardFailure=yes",
+            "-o",
+            "ServerAliveInterval=30",
             "-L",
             f"{self.local_port}:{self.remote_host}:{self.remote_port}",
         ]
@@ -98,24 +352,51 @@ class SSHTunnel:
 
         logger.debug(f"Starting SSH tunnel with command: {' '.join(cmd)}")
 
-        # Start the SSH tunnel process
+        # Start the SSH tunnel process. stderr goes to a file rather than a
+        # pipe, so that a long-lived tunnel can never block on a full pipe.
+        stderr = tempfile.TemporaryFile()
         self.process = subprocess.Popen(
-            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=stderr
         )
 
-        # Wait a moment for the tunnel to establish
-        time.sleep(0.1)
-
-        # Check if the process is still running
-        if self.process.poll() is not None:
-            stdout, stderr = self.process.communicate()
-            raise RuntimeError(f"SSH tunnel failed to start: {stderr.decode('utf-8')}")
+        # Wait until the local end of the tunnel accepts connections
+        deadline = time.monotonic() + self.ready_timeout
+        while True:
+            if self.process.poll() is not None:
+                stderr.seek(0)
+                raise RuntimeError(
+                    f"SSH tunnel failed to start: {stderr.read().decode('utf-8')}"
+                )
+            try:
+                socket.create_connection(("localhost", self.local_port), 0.5).close()
+                break
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                self.process.terminate()
+                self.process.wait()
+                raise RuntimeError(
+                    f"SSH tunnel not ready on port {self.local_port} "
+                    f"after {self.ready_timeout}s"
+                )
+            time.sleep(0.05)
 
         self.is_running = True
         logger.debug(
             f"SSH tunnel established: localhost:{self.local_port} -> {self.remote_host}:{self.remote_port}"
         )
 
+    def is_alive(self) -> bool:
+        """Check that the tunnel was started and its ssh process is still running"""
+        return self.is_running and self.process.poll() is None
+
+    def ensure_running(self):
+        """Start the tunnel, or restart it if its ssh process died"""
+        if self.is_running and not self.is_alive():
+            logger.warning("SSH tunnel died, restarting...")
+            self.is_running = False
+        self.start()
+
     def stop(self):
         """Stop the SSH tunnel"""
         if not self.is_running:
@@ -132,62 +413,65 @@ class SSHTunnel:
         """
         Execute a command on the remote server and return the output.
 
+        The command runs over the SSH session shared by all tunnels to the
+        same host and user, see :func:`get_ssh_session`.
+
         Args:
             command: The command to execute
 
         Returns:
             The command output (stdout)
         """
-        # Create a new SSH client for command execution
-        client = paramiko.SSHClient()
-        client.load_system_host_keys()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        session = get_ssh_session(
+            self.ssh_host,
+            ssh_port=self.ssh_port,
+            ssh_username=self.ssh_username,
+            ssh_password=self.ssh_password,
+            ssh_key_path=self.ssh_key_path,
+        )
+        output, error, _ = session.execute(command)
 
-        # [FIXME] This can be a with statement...
-        try:
-            # Connect with either password or key
-            if self.ssh_key_path:
-                key = paramiko.RSAKey.from_private_key_file(self.ssh_key_path)
-                client.connect(
-                    self.ssh_host,
-                    port=self.ssh_port,
-                    username=self.ssh_username,
-                    pkey=key,
-                )
-            else:
-                client.connect(
-                    self.ssh_host,
-                    port=self.ssh_port,
-                    username=self.ssh_username,
-                    password=self.ssh_password,
-                )
+        if error:
+            logger.error(f"Warning: Command produced error output: {error}")
 
-            # Execute the command
-            stdin, stdout, stderr = client.exec_command(command)
-            output = stdout.read().decode("utf-8").strip()
-            error = stderr.read().decode("utf-8").strip()
+        return output
 
-            if error:
-                logger.error(f"Warning: Command produced error output: {error}")
+    def stream_command(self, command: str):
+        """
+        Execute a command on the remote server and stream its output.
 
-            return output
-        finally:
-            client.close()
+        See :meth:`SSHSession.stream`.
+        """
+        session = get_ssh_session(
+            self.ssh_host,
+            ssh_port=self.ssh_port,
+            ssh_username=self.ssh_username,
+            ssh_password=self.ssh_password,
+            ssh_key_path=self.ssh_key_path,
+        )
+        return session.stream(command)
 
     def generate_slurm_token(
         self,
         username: str = None,
         lifespan: int = 3600,
+        cache: Optional[TokenCache] = None,
     ) -> str:
         """
         Generate a SLURM Java Web Token (JWT) using the scontrol command.
 
+        Tokens are cached per (host, user), and ``scontrol`` only runs again
+        shortly before the cached token expires.
+
         Parameters
         ----------
         username : str, optional
             The username to generate the token for
         lifespan : str, optional
             The token lifespan in seconds (default: 1 hour)
+        cache : TokenCache, optional
+            The cache to use (default: the process-wide cache, see
+            :func:`default_token_cache`)
 
         Returns
         -------
@@ -197,13 +481,21 @@ class SSHTunnel:
         """
         if username is None:
             username = self.ssh_username
-        command = f"scontrol token username={username} lifespan={lifespan}"
-        response = self.execute_command(command)
-        var_name, token = response.split("=")
+        if cache is None:
+            cache = default_token_cache()
+
+        def scontrol_token():
+            command = f"scontrol token username={username} lifespan={lifespan}"
+            with timed("token"):
+                response = self.execute_command(command)
+            var_name, token = response.split("=")
+
+            if not token or "error" in token.lower():
+                raise RuntimeError(f"Failed to generate SLURM token: {token}")
+            logger.success("Token generated successfully!")
+            return var_name, token
 
-        if not token or "error" in token.lower():
-            raise RuntimeError(f"Failed to generate SLURM token: {token}")
-        logger.success("Token generated successfully!")
+        var_name, token = cache.get(self.ssh_host, username, scontrol_token, lifespan)
 
         self.slurm_username = username
         self.slurm_jwt_token = token
@@ -215,8 +507,7 @@ class SSHTunnel:
         parameter, username, and token.
         """
         tunnel_was_already_running = self.is_running
-        if not self.is_running:
-            self.start()
+        self.ensure_running()
 
         # Override the base_url to use local tunnel endpoint
         kwargs["base_url"] = f"http://localhost:{self.local_port}"
@@ -329,20 +620,252 @@ def get_slurm_openapi_spec(
     return response
 
 
+DESTINATIONS = ("duckdb", "parquet")
+"""Supported destinations: one DuckDB file, or a partitioned Parquet lake"""
+
+DUCKDB_PATH = "slurm_pipeline.duckdb"
+"""Database file of the DuckDB destination"""
+
+# Pipelines of several clusters share one destination, see clusters.py. They
+# extract and normalize in parallel, but load one at a time.
+_DESTINATION_LOCK = threading.RLock()
+
+
+def make_pipeline(
+    destination: str = "duckdb",
+    lake_path: str = DEFAULT_LAKE_PATH,
+    cluster: Optional[str] = None,
+) -> "dlt.Pipeline":
+    """
+    The ingestion pipeline writing to ``destination``.
+
+    Parameters
+    ----------
+    destination : str, optional
+        ``"duckdb"`` for ``slurm_pipeline.duckdb`` (default), or ``"parquet"``
+        for the Parquet lake at ``lake_path`` (see lake.py)
+    lake_path : str, optional
+        Directory of the Parquet lake (default: ``slurm_lake``)
+    cluster : str, optional
+        Name of the cluster loaded by the pipeline. Every cluster has a
+        pipeline (and incremental state) of its own, writing into the same
+        tables as the others.
+    """
+    import dlt
+
+    from .lake import lake_destination
+
+    suffix = f"_{cluster}" if cluster else ""
+    if destination == "duckdb":
+        return dlt.pipeline(
+            pipeline_name=f"slurm_pipeline{suffix}",
+            destination=dlt.destinations.duckdb(DUCKDB_PATH),
+            dataset_name="slurm_data",
+        )
+    if destination == "parquet":
+        # A pipeline of its own, so that its incremental state is not shared
+        # with the DuckDB pipeline
+        return dlt.pipeline(
+            pipeline_name=f"slurm_lake_pipeline{suffix}",
+            destination=lake_destination(lake_path),
+            dataset_name="slurm_data",
+        )
+    raise ValueError(f"Unknown destination {destination!r}, use one of {DESTINATIONS}")
+
+
+def tag_cluster(source: Any, cluster: str) -> Any:
+    """
+    Add a ``cluster`` column to all tables of ``source``.
+
+    The column is also added to the primary key of resources which have one,
+    so that rows of different clusters are never merged.
+    """
+    from dlt.extract.exceptions import DataItemRequiredForDynamicTableHints
+
+    def set_cluster(item: Dict[str, Any]) -> Dict[str, Any]:
+        item["cluster"] = cluster
+        return item
+
+    for resource in source.resources.values():
+        resource.add_map(set_cluster)
+        try:
+            columns = resource.compute_table_schema().get("columns", {})
+        except DataItemRequiredForDynamicTableHints:
+            continue
+        primary_key = [
+            name for name, column in columns.items() if column.get("primary_key")
+        ]
+        if primary_key and "cluster" not in primary_key:
+            resource.apply_hints(primary_key=["cluster", *primary_key])
+    return source
+
+
+def update_derived_tables(
+    pipeline: "dlt.Pipeline",
+    destination: str = "duckdb",
+    lake_path: str = DEFAULT_LAKE_PATH,
+    publish_dir: Optional[str] = DEFAULT_PUBLISH_DIR,
+    load_ids: Optional[List[str]] = None,
+    publish_interval: float = DEFAULT_PUBLISH_INTERVAL,
+):
+    """
+    Run the post-load steps: rollups, snapshots and publishing.
+
+    Parameters
+    ----------
+    pipeline : dlt.Pipeline
+        Any pipeline writing to ``destination``
+    destination, lake_path : str, optional
+        See :func:`make_pipeline`
+    publish_dir : str, optional
+        Where to publish a read-only snapshot of the DuckDB database for the
+        dashboards (see publish.py), None to not publish one
+    load_ids : list of str, optional
+        The new loads, for the lake rollups
+    publish_interval : float, optional
+        Minimum seconds between two published snapshots (default: 300), see
+        :func:`publish_due`. The snapshot is copied outside the destination
+        lock.
+    """
+    from .lake import update_lake_rollups, update_lake_usage
+    from .publish import publish_due
+    from .rollups import update_rollups, update_usage
+    from .snapshots import update_snapshots
+
+    with _DESTINATION_LOCK:
+        if destination == "parquet":
+            update_lake_rollups(lake_path, load_ids)
+            update_lake_usage(lake_path, load_ids)
+            return
+        update_rollups(pipeline)
+        update_usage(pipeline)
+        update_snapshots(pipeline)
+    if publish_dir:
+        publish_due(pipeline, publish_dir, publish_interval)
+
+
+def run_pipeline(
+    source: Any,
+    destination: str = "duckdb",
+    lake_path: str = DEFAULT_LAKE_PATH,
+    publish_dir: Optional[str] = DEFAULT_PUBLISH_DIR,
+    cluster: Optional[str] = None,
+    post_load: bool = True,
+    skip_unchanged: bool = True,
+    publish_interval: float = DEFAULT_PUBLISH_INTERVAL,
+) -> Dict[str, Any]:
+    """
+    Run ``source`` into ``destination`` and update the derived tables.
+
+    Parameters
+    ----------
+    source : dlt.sources.DltSource
+        The source to load
+    destination, lake_path, cluster : str, optional
+        See :func:`make_pipeline`. With a ``cluster``, all rows are tagged
+        with it, see :func:`tag_cluster`.
+    publish_dir : str, optional
+        See :func:`update_derived_tables`
+    post_load : bool, optional
+        Update the derived tables after the load (default: True). The
+        multi-cluster orchestrator does so once after all clusters instead.
+    skip_unchanged : bool, optional
+        Only load the job and node rows which changed since they were last
+        loaded into DuckDB (default: True), see changes.py
+    publish_interval : float, optional
+        See :func:`update_derived_tables`
+    """
+    from .changes import ChangeTracker
+    from .incremental import skipped_rows
+    from .metrics import record_rows
+
+    pipeline = make_pipeline(destination, lake_path, cluster)
+    if cluster:
+        tag_cluster(source, cluster)
+    loader_file_format = "parquet" if destination == "parquet" else None
+    tracker = None
+    with run_metrics(cluster) as metrics:
+        with _DESTINATION_LOCK:
+            pipeline.sync_destination()
+            if skip_unchanged and destination == "duckdb":
+                tracker = ChangeTracker(pipeline)
+                tracker.track(source)
+        # Like pipeline.run, which would hold the lock for the whole run.
+        # Packages left by an interrupted run are normalized and loaded too.
+        with timed("extract"):
+            pipeline.extract(source, loader_file_format=loader_file_format)
+        with timed("normalize"):
+            normalize_info = pipeline.normalize()
+        record_rows(normalize_info.row_counts)
+        with _DESTINATION_LOCK, timed("load"):
+            load_info = pipeline.load()
+            if tracker:
+                tracker.commit()
+        for resource, skipped in skipped_rows(pipeline).items():
+            logger.info(f"...{resource}: skipped {skipped} unchanged rows")
+        if post_load:
+            # The data is loaded, a broken derived table must not fail the run
+            try:
+                with timed("post_load"):
+                    update_derived_tables(
+                        pipeline,
+                        destination,
+                        lake_path,
+                        publish_dir,
+                        load_info.loads_ids,
+                        publish_interval,
+                    )
+            except Exception as e:
+                logger.error(f"...updating the derived tables failed: {e}")
+        _write_metrics(pipeline, destination, lake_path, metrics, load_info, cluster)
+    return load_info
+
+
+def _write_metrics(
+    pipeline: "dlt.Pipeline",
+    destination: str,
+    lake_path: str,
+    metrics: Metrics,
+    load_info: Any,
+    cluster: Optional[str],
+):
+    """Write the metrics collected so far to the ``pipeline_metrics`` table"""
+    from .lake import write_lake_metrics
+    from .metrics import write_metrics
+
+    rows = metrics.drain()
+    load_id = load_info.loads_ids[-1] if load_info.loads_ids else None
+    try:
+        with _DESTINATION_LOCK:
+            if destination == "parquet":
+                write_lake_metrics(lake_path, rows, load_id, cluster or "")
+            else:
+                write_metrics(pipeline, rows, load_id, cluster or "")
+    except Exception as e:
+        # The data is loaded already, missing metrics are not worth failing for
+        logger.warning(f"...failed to write pipeline metrics: {e}")
+
+
 def load_slurm_data(**config) -> Dict[str, Any]:
     """
-    Load data from the SLURM REST API into a DuckDB database.
+    Load data from the SLURM REST API into a DuckDB database or Parquet lake.
 
     Parameters
     ----------
     config : dict
         Dictionary containing all relevant config sections (rest,
-        credentials, resources, etc.)
+        credentials, resources, etc.). ``resources`` restricts the load to
+        the given resource names, and ``source_options`` are passed on to
+        the dlt source. ``destination``, ``lake_path``, ``publish_dir``,
+        ``cluster``, ``post_load``, ``skip_unchanged`` and
+        ``publish_interval`` are passed on to :func:`run_pipeline`.
     Returns
     -------
     load_info : dict
         Information about the load operation
     """
+    from .dlt_sources import slurm_rest_source, slurm_restdb_source
+
     dispatch_endpoints = {
         "slurm": slurm_rest_source,
         "slurmdb": slurm_restdb_source,
@@ -351,20 +874,141 @@ def load_slurm_data(**config) -> Dict[str, Any]:
     base_url = config.get("base_url")
     username = config.get("username")
     token = config.get("token")
+    resources = config.get("resources")
+    source_options = config.get("source_options", {})
+    destination = config.get("destination", "duckdb")
+    lake_path = config.get("lake_path", DEFAULT_LAKE_PATH)
+    publish_dir = config.get("publish_dir", DEFAULT_PUBLISH_DIR)
+    cluster = config.get("cluster")
+    post_load = config.get("post_load", True)
+    skip_unchanged = config.get("skip_unchanged", True)
+    publish_interval = config.get("publish_interval", DEFAULT_PUBLISH_INTERVAL)
+
+    source = dispatch_endpoints[endpoint_type](
+        username=username,
+        token=token,
+        base_url=base_url,
+        **source_options,
+    )
+    if resources:
+        source = source.with_resources(*resources)
+    return run_pipeline(
+        source,
+        destination,
+        lake_path,
+        publish_dir,
+        cluster,
+        post_load,
+        skip_unchanged,
+        publish_interval,
+    )
+
+
+def load_slurm_cli_data(
+    ssh_tunnel: SSHTunnel,
+    sections: Optional[List[str]] = None,
+    sacct_starttime: str = "now-1days",
+    destination: str = "duckdb",
+    lake_path: str = DEFAULT_LAKE_PATH,
+    publish_dir: Optional[str] = DEFAULT_PUBLISH_DIR,
+    cluster: Optional[str] = None,
+    post_load: bool = True,
+) -> Dict[str, Any]:
+    """
+    Load data from the SLURM command line tools into a DuckDB database.
+
+    All ``sections`` run in one remote command over one SSH channel, and
+    their output is parsed while it streams in.
+
+    Parameters
+    ----------
+    ssh_tunnel : SSHTunnel
+        The tunnel whose SSH connection runs the commands
+    sections : list of str, optional
+        Any of ``"squeue"``, ``"sinfo"`` and ``"sacct"`` (default: all)
+    sacct_starttime : str, optional
+        ``--starttime`` of the sacct query (default: ``"now-1days"``)
+    destination : str, optional
+        ``"duckdb"`` (default) or ``"parquet"``, see :func:`make_pipeline`
+    lake_path : str, optional
+        Directory of the Parquet lake (default: ``slurm_lake``)
+    publish_dir : str, optional
+        Directory of the snapshots for the dashboards (default: ``published``)
+    cluster : str, optional
+        Tag all rows with this cluster name, see :func:`run_pipeline`
+    post_load : bool, optional
+        Update the derived tables after the load (default: True)
+
+    Returns
+    -------
+    load_info : dict
+        Information about the load operation
+    """
+    from .cli_backend import slurm_cli_source
 
-    pipeline = dlt.pipeline(
-        pipeline_name="slurm_pipeline",
-        destination="duckdb",
-        dataset_name="slurm_data",
+    source = slurm_cli_source(
+        stream_command=ssh_tunnel.stream_command,
+        sections=tuple(sections or ("squeue", "sinfo", "sacct")),
+        sacct_starttime=sacct_starttime,
     )
-    load_info = pipeline.run(
-        dispatch_endpoints[endpoint_type](
-            username=username,
-            token=token,
-            base_url=base_url,
+    return run_pipeline(source, destination, lake_path, publish_dir, cluster, post_load)
+
+
+def backfill_slurmdb_jobs(
+    start: "TimeLike",
+    end: Optional["TimeLike"] = None,
+    window: Optional[int] = None,
+    windows_per_run: int = 30,
+    **config,
+) -> List[Any]:
+    """
+    Load the slurmdb job history between ``start`` and ``end``.
+
+    The history is loaded in several pipeline runs of ``windows_per_run``
+    windows each. Completed windows are checkpointed in the pipeline state
+    after every run, so calling this again after an interruption continues
+    with the first missing window.
+
+    Parameters
+    ----------
+    start : int, str or datetime
+        Beginning of the history, as unix timestamp or ISO 8601 date
+    end : int, str or datetime, optional
+        End of the history (default: now)
+    window : int, optional
+        Seconds of history per request (default: one day, see
+        :data:`~slurm_monitor.pipelines.slurm.backfill.DEFAULT_WINDOW`)
+    windows_per_run : int, optional
+        Number of windows loaded per pipeline run (default: 30)
+    config : dict
+        Passed on to :func:`load_slurm_data` (base_url, username, token)
+
+    Returns
+    -------
+    list
+        The load info of every pipeline run
+    """
+    source_options = {
+        "backfill_start": start,
+        "backfill_end": end,
+        "backfill_max_windows": windows_per_run,
+    }
+    if window:
+        source_options["backfill_window"] = window
+    load_infos = []
+    while True:
+        load_info = load_slurm_data(
+            endpoint_type="slurmdb",
+            resources=["slurmdb_v0_0_38_get_jobs"],
+            source_options=source_options,
+            **config,
         )
-    )
-    return load_info
+        load_infos.append(load_info)
+        state = load_info.pipeline.state["sources"]["slurmdb_source"]["resources"]
+        pending = state["slurmdb_v0_0_38_get_jobs"]["pending_windows"]
+        logger.info(f"...backfill: {pending} windows left")
+        if not pending:
+            return load_infos
 
 
 def get_ssh_config():
@@ -379,31 +1023,59 @@ def get_ssh_config():
     }
 
 
-def handle_endpoint_error(tunnel, e):
-    logger.error(f"...failed to use REST API for endpoint: {e.endpoint}")
+# Errors of the REST API pings after which the CLI backend is used instead.
+# Connection errors and timeouts mean slurmrestd itself is down.
+FALLBACK_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+
+def handle_endpoint_error(tunnel, e, endpoint: str):
+    logger.error(f"...failed to use REST API for endpoint {endpoint}: {e}")
     tunnel.execute_command("sinfo && scontrol ping")
-    logger.info(f"...using SLURM CLI for SLURM data ingestion: {e.name}")
+    logger.info(f"...using SLURM CLI for SLURM data ingestion: {endpoint}")
 
 
 def run():
     logger.info("Starting **REMOTE** SLURM Ingestion Pipeline...")
     ssh_config = get_ssh_config()
-    ssh_tunnel = SSHTunnel(**ssh_config)
+    with run_metrics(), SSHTunnel(**ssh_config) as ssh_tunnel:
+        run_ingestion(ssh_tunnel)
+
+
+def run_ingestion(ssh_tunnel: SSHTunnel, **load_options) -> List[Any]:
+    """
+    Run one ingestion session over an already configured tunnel.
+
+    The tunnel is started on first use if it is not running yet, and stays
+    open for all endpoints of the session.
+
+    Parameters
+    ----------
+    ssh_tunnel : SSHTunnel
+        The tunnel to the cluster
+    load_options : dict
+        Passed on to :func:`load_slurm_data` and :func:`load_slurm_cli_data`,
+        e.g. ``destination`` or ``cluster``
+
+    Returns
+    -------
+    list
+        The load info of every pipeline run
+    """
     # [TODO] It would be good to be able to select a preference here. Now,
     #        we prefer REST over CLI, hard-coded.
     try:
         ssh_tunnel.generate_slurm_token()
         ssh_tunnel.run_func(ping_slurm_api)
         slurm_data_ingestion_backend = "rest"
-    except SlurmEndpointError as e:
-        handle_endpoint_error(ssh_tunnel, e)
+    except (SlurmEndpointError, *FALLBACK_ERRORS) as e:
+        handle_endpoint_error(ssh_tunnel, e, "slurm")
         slurm_data_ingestion_backend = "cli"
     try:
         ssh_tunnel.generate_slurm_token()
         ssh_tunnel.run_func(ping_slurmdb_api)
         slurmdb_data_ingestion_backend = "rest"
-    except SlurmdbEndpointError as e:
-        handle_endpoint_error(ssh_tunnel, e)
+    except (SlurmdbEndpointError, *FALLBACK_ERRORS) as e:
+        handle_endpoint_error(ssh_tunnel, e, "slurmdb")
         slurmdb_data_ingestion_backend = "cli"
     logger.info("...set ingestion backends: ")
     logger.info(f"{slurm_data_ingestion_backend=}")
@@ -421,15 +1093,19 @@ def run():
 
     # [NOTE] Groovy. We got pretty far by now. I can now ping the SLURM API
     #        through the SSH Tunnel. Now, we hook up the pipeline...
+    cli_sections = []
+    load_infos = []
     if slurm_data_ingestion_backend == "rest":
         pipeline_result = ssh_tunnel.run_func(
             load_slurm_data,
             endpoint_type="slurm",
+            **load_options,
         )
+        load_infos.append(pipeline_result)
         logger.success("Pipeline run complete!")
         logger.success(f"Load info: {pipeline_result}")
     elif slurm_data_ingestion_backend == "cli":
-        raise NotImplementedError("CLI ingestion not implemented yet for slurm!")
+        cli_sections += ["squeue", "sinfo"]
     else:
         raise NotImplementedError(
             f"Unknown ingestion backend: {slurm_data_ingestion_backend}"
@@ -439,16 +1115,28 @@ def run():
         pipeline_result = ssh_tunnel.run_func(
             load_slurm_data,
             endpoint_type="slurmdb",
+            **load_options,
         )
+        load_infos.append(pipeline_result)
         logger.success("Pipeline run complete!")
         logger.success(f"Load info: {pipeline_result}")
     elif slurmdb_data_ingestion_backend == "cli":
-        raise NotImplementedError("CLI ingestion not implemented yet for slurmdb!")
+        cli_sections += ["sacct"]
     else:
         raise NotImplementedError(
             f"Unknown ingestion backend: {slurmdb_data_ingestion_backend}"
         )
 
+    # All CLI sections share one remote invocation
+    if cli_sections:
+        pipeline_result = load_slurm_cli_data(
+            ssh_tunnel, sections=cli_sections, **load_options
+        )
+        load_infos.append(pipeline_result)
+        logger.success("CLI pipeline run complete!")
+        logger.success(f"Load info: {pipeline_result}")
+    return load_infos
+
 
 if __name__ == "__main__":
     run()
@@ -0,0 +1,496 @@
+"""
+Pre-aggregated rollup tables for the dashboard.
+
+The job tables hold one row per job, merged on every load (see
+``SLURM_TABLE_KEYS`` in dlt_sources.py), so they grow with the job history.
+Aggregating them on every dashboard interaction means a full scan over the
+whole history. Instead, a post-load step maintains small rollup tables, one
+row per partition and hour of submission:
+
+``jobs_hourly``
+    Job count and CPU sum per partition, hour and job state
+``jobs_duration_hourly``
+    Job count, duration sum and maximum duration per partition, hour and
+    duration bucket
+
+The dashboard never reads single jobs: the duration histogram is the sum of
+the bucket counts, and means and quantiles per partition are estimated from
+the buckets by :func:`duration_summary_sql`, so the size of its queries and
+their results does not grow with the job history.
+
+The slurmdb job history gets one more rollup, one row per cluster, day of
+the job's end, user, account and QoS:
+
+``usage_daily``
+    Job count, CPU-hours and GPU-hours of the finished jobs
+
+After every load, the hours (or days) touched by new loads are recomputed;
+all other hours are left alone. New loads are those completed after the
+stored watermark (see :func:`new_loads_sql`). Jobs loaded by the
+multi-cluster orchestrator (see clusters.py) are told apart by their
+``cluster`` column.
+"""
+
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, List, Optional, Sequence
+
+from ...logging import logger
+
+if TYPE_CHECKING:
+    import dlt
+
+JOBS_TABLE = "v0_0_38_jobs"
+"""The per-job table the rollups are computed from"""
+
+DB_JOBS_TABLE = "dbv0_0_38_jobs"
+"""The slurmdb job history the usage rollup is computed from"""
+
+DB_TRES_TABLE = f"{DB_JOBS_TABLE}__tres__allocated"
+"""Child table of the allocated TRES of the jobs, without the OpenAPI hints"""
+
+TRES_COLUMNS = ["_dlt_parent_id", "type", "name", "count"]
+"""Columns of :data:`DB_TRES_TABLE` needed by :func:`job_tres_sql`"""
+
+ROLLUP_BUCKET = 3600
+"""Length of one rollup bucket in seconds (one hour)"""
+
+DURATION_BUCKETS = [0, 1, 5, 10, 30, 60, 120, 240, 480, 720, 1440, 2880, 4320, 10080]
+"""Lower bounds of the job duration histogram buckets, in minutes"""
+
+DURATION_QUANTILES = (0.5, 0.9, 0.99)
+"""Quantiles of the job duration reported by :func:`duration_summary_sql`"""
+
+ROLLUP_TABLES = {
+    "jobs_hourly": """
+        partition VARCHAR,
+        hour BIGINT,
+        job_state VARCHAR,
+        job_count BIGINT,
+        cpu_sum BIGINT
+    """,
+    "jobs_duration_hourly": """
+        partition VARCHAR,
+        hour BIGINT,
+        duration_bucket BIGINT,
+        job_count BIGINT,
+        duration_sum DOUBLE,
+        duration_max DOUBLE
+    """,
+    "rollup_watermarks": """
+        name VARCHAR,
+        inserted_at TIMESTAMP WITH TIME ZONE
+    """,
+}
+
+USAGE_BUCKET = 86400
+"""Length of one usage rollup bucket in seconds (one day)"""
+
+USAGE_TABLES = {
+    "usage_daily": """
+        cluster VARCHAR,
+        day BIGINT,
+        user_name VARCHAR,
+        account VARCHAR,
+        qos VARCHAR,
+        job_count BIGINT,
+        cpu_hours DOUBLE,
+        gpu_hours DOUBLE
+    """,
+    "rollup_watermarks": ROLLUP_TABLES["rollup_watermarks"],
+}
+
+
+def duration_bucket_sql(minutes: str) -> str:
+    """SQL expression mapping a duration in minutes to its bucket"""
+    cases = " ".join(
+        f"WHEN {minutes} >= {lower} THEN {lower}"
+        for lower in reversed(DURATION_BUCKETS)
+    )
+    return f"CASE {cases} ELSE 0 END"
+
+
+def tres_count_sql(column: str, tres_type: str, tres_name: Optional[str] = None) -> str:
+    """
+    SQL expression for the count of one TRES in the JSON list ``column``.
+
+    slurmdb lists the trackable resources of a job as ``[{"type": "cpu",
+    "count": 16, ...}, {"type": "gres", "name": "gpu", "count": 2, ...}]``,
+    e.g. in ``tres__allocated``. The expression is NULL for an empty list.
+    """
+    condition = f"t.type = '{tres_type}'"
+    if tres_name is not None:
+        condition += f" AND t.name = '{tres_name}'"
+    structure = '[{"type": "VARCHAR", "name": "VARCHAR", "count": "BIGINT"}]'
+    return (
+        f"list_sum(list_transform(list_filter("
+        f"from_json({column}::VARCHAR, '{structure}'), t -> {condition}), "
+        f"t -> t.count))"
+    )
+
+
+def job_tres_sql(
+    columns: Sequence[str],
+    tres_relation: str,
+    tres_columns: Sequence[str],
+    tres_type: str,
+    tres_name: Optional[str] = None,
+) -> str:
+    """
+    SQL expression for the count of one allocated TRES of the slurmdb job ``j``.
+
+    With the OpenAPI column hints (see schema.py), ``tres__allocated`` is a
+    JSON column of the job table. Without them, dlt unnests the list into the
+    child table :data:`DB_TRES_TABLE`. Jobs loaded by the CLI backend before
+    it reported ``AllocTRES`` have neither, and their count is NULL.
+
+    Parameters
+    ----------
+    columns : list of str
+        The columns of the job table, which is aliased ``j`` in the query
+    tres_relation : str
+        Table or query of the child table
+    tres_columns : list of str
+        The columns of the child table, empty if it does not exist
+    tres_type, tres_name : str
+        See :func:`tres_count_sql`
+    """
+    if "tres__allocated" in columns:
+        return tres_count_sql("j.tres__allocated", tres_type, tres_name)
+    if "_dlt_id" not in columns or not set(TRES_COLUMNS) <= set(tres_columns):
+        return "NULL"
+    condition = f"t.type = '{tres_type}'"
+    if tres_name is not None:
+        condition += f" AND t.name = '{tres_name}'"
+    return (
+        f"(SELECT sum(t.count) FROM {tres_relation} t "
+        f"WHERE t._dlt_parent_id = j._dlt_id AND {condition})"
+    )
+
+
+def duration_summary_sql(
+    relation: str, quantiles: Sequence[float] = DURATION_QUANTILES
+) -> str:
+    """
+    Query summarising the job durations of ``relation`` per partition.
+
+    Quantiles are estimated from the duration buckets: within the bucket a
+    quantile falls into, the jobs are assumed to be spread evenly between the
+    lower bound of the bucket and the longest job in it. One more row,
+    partition ``(all)``, summarises all partitions together.
+
+    Parameters
+    ----------
+    relation : str
+        Table or query with the columns of ``jobs_duration_hourly``, e.g.
+        already filtered to a time range
+    quantiles : sequence of float, optional
+        The quantiles to estimate (default: 0.5, 0.9 and 0.99)
+
+    Returns
+    -------
+    str
+        Query returning partition, job_count, mean_minutes, one ``p<q>``
+        column per quantile (``p50``, ...) and max_minutes
+    """
+    estimates = "".join(
+        f"""
+            arg_min(
+                lower + (upper - lower) * ({q} * total - (cumulative - jobs)) / jobs,
+                lower
+            ) FILTER (WHERE cumulative >= {q} * total) AS "p{q * 100:g}","""
+        for q in quantiles
+    )
+    return f"""
+        WITH buckets AS (
+            SELECT
+                CASE WHEN grouping(partition) = 1 THEN '(all)' ELSE partition END
+                    AS name,
+                duration_bucket AS lower,
+                sum(job_count) AS jobs,
+                sum(duration_sum) AS duration_sum,
+                max(duration_max) AS upper
+            FROM ({relation})
+            GROUP BY GROUPING SETS ((partition, duration_bucket), (duration_bucket))
+        ),
+        cumulative AS (
+            SELECT
+                *,
+                sum(jobs) OVER (PARTITION BY name ORDER BY lower) AS cumulative,
+                sum(jobs) OVER (PARTITION BY name) AS total
+            FROM buckets
+        )
+        SELECT
+            name AS partition,
+            sum(jobs) AS job_count,
+            sum(duration_sum) / sum(jobs) AS mean_minutes,{estimates}
+            max(upper) AS max_minutes
+        FROM cumulative
+        GROUP BY name
+        ORDER BY name = '(all)' DESC, job_count DESC
+    """
+
+
+def table_exists(client: Any, table_name: str) -> bool:
+    """Whether ``table_name`` exists in the dataset of ``client``"""
+    return bool(
+        client.execute_sql(
+            "SELECT count(*) FROM information_schema.tables "
+            "WHERE table_schema = ? AND table_name = ?",
+            client.dataset_name,
+            table_name,
+        )[0][0]
+    )
+
+
+def table_columns(client: Any, table_name: str) -> List[str]:
+    """The column names of ``table_name``, empty if it does not exist"""
+    rows = client.execute_sql(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = ? AND table_name = ? ORDER BY ordinal_position",
+        client.dataset_name,
+        table_name,
+    )
+    return [row[0] for row in rows]
+
+
+def cluster_sql(client: Any, table_name: str) -> str:
+    """
+    SQL expression for the cluster of the rows of ``table_name``.
+
+    Tables loaded without a cluster tag have no ``cluster`` column, in which
+    case all rows belong to the cluster ``''``.
+    """
+    has_cluster = client.execute_sql(
+        "SELECT count(*) FROM information_schema.columns "
+        "WHERE table_schema = ? AND table_name = ? AND column_name = 'cluster'",
+        client.dataset_name,
+        table_name,
+    )[0][0]
+    return "coalesce(cluster, '')" if has_cluster else "''"
+
+
+def get_watermark(client: Any, name: str) -> Optional[datetime]:
+    """Completion time of the last load processed by the post-load step ``name``"""
+    table = client.make_qualified_table_name("rollup_watermarks")
+    rows = client.execute_sql(f"SELECT inserted_at FROM {table} WHERE name = ?", name)
+    return rows[0][0] if rows else None
+
+
+def set_watermark(client: Any, name: str, inserted_at: datetime):
+    """Record the loads up to ``inserted_at`` as processed by the step ``name``"""
+    table = client.make_qualified_table_name("rollup_watermarks")
+    client.execute_sql(f"DELETE FROM {table} WHERE name = ?", name)
+    client.execute_sql(f"INSERT INTO {table} VALUES (?, ?)", name, inserted_at)
+
+
+def last_load(client: Any) -> Optional[datetime]:
+    """Completion time of the latest load of the dataset, None without loads"""
+    loads = client.make_qualified_table_name("_dlt_loads")
+    return client.execute_sql(f"SELECT max(inserted_at) FROM {loads}")[0][0]
+
+
+def new_loads_sql(client: Any, watermark: Optional[datetime]) -> str:
+    """
+    Query of the ids of the loads completed after ``watermark``.
+
+    Load ids are the times the load packages were extracted, not loaded. The
+    package of a cluster whose load failed is loaded by its next run, after
+    the packages of other clusters extracted later, so its rows would be
+    missed by a step comparing ``_dlt_load_id`` with the last id it
+    processed. Loads into the destination are serialized, so the time they
+    completed (``inserted_at`` of ``_dlt_loads``) only grows.
+
+    Parameters
+    ----------
+    client : SqlClientBase
+        Client of the dataset
+    watermark : datetime, optional
+        See :func:`get_watermark`. None selects all loads.
+    """
+    loads = client.make_qualified_table_name("_dlt_loads")
+    if watermark is None:
+        return f"SELECT load_id FROM {loads}"
+    return (
+        f"SELECT load_id FROM {loads} "
+        f"WHERE inserted_at > '{watermark.isoformat()}'::TIMESTAMPTZ"
+    )
+
+
+def update_rollups(pipeline: "dlt.Pipeline", full: bool = False) -> List[int]:
+    """
+    Recompute the rollup hours touched by the loads since the last update.
+
+    Parameters
+    ----------
+    pipeline : dlt.Pipeline
+        The pipeline whose dataset holds the job table
+    full : bool, optional
+        Rebuild all hours, e.g. after changing the buckets (default: False)
+
+    Returns
+    -------
+    list of int
+        The recomputed hours, as unix timestamps
+    """
+    with pipeline.sql_client() as client:
+        if not client.has_dataset():
+            return []
+        jobs = client.make_qualified_table_name(JOBS_TABLE)
+        tables = {
+            name: client.make_qualified_table_name(name) for name in ROLLUP_TABLES
+        }
+        if not table_exists(client, JOBS_TABLE):
+            return []
+        for name, columns in ROLLUP_TABLES.items():
+            client.execute_sql(f"CREATE TABLE IF NOT EXISTS {tables[name]} ({columns})")
+
+        watermark = None if full else get_watermark(client, JOBS_TABLE)
+        latest = last_load(client)
+        if latest is None or latest == watermark:
+            return []
+
+        hour = f"submit_time - submit_time % {ROLLUP_BUCKET}"
+        client.execute_sql(
+            f"CREATE OR REPLACE TEMP TABLE rollup_hours AS "
+            f"SELECT DISTINCT {hour} AS hour FROM {jobs} "
+            f"WHERE submit_time > 0 "
+            f"AND _dlt_load_id IN ({new_loads_sql(client, watermark)})"
+        )
+        # Every job submitted in one of the touched hours
+        touched_jobs = f"""
+            SELECT
+                coalesce(partition, '') AS partition,
+                {hour} AS hour,
+                job_state,
+                cpus,
+                start_time,
+                end_time
+            FROM {jobs}
+            WHERE {hour} IN (SELECT hour FROM rollup_hours)
+        """
+        duration = "(end_time - start_time) / 60"
+        with client.begin_transaction():
+            for name in ("jobs_hourly", "jobs_duration_hourly"):
+                client.execute_sql(
+                    f"DELETE FROM {tables[name]} "
+                    f"WHERE hour IN (SELECT hour FROM rollup_hours)"
+                )
+            client.execute_sql(
+                f"""
+                INSERT INTO {tables["jobs_hourly"]}
+                SELECT partition, hour, job_state, count(*), sum(cpus)
+                FROM ({touched_jobs})
+                GROUP BY ALL
+                """
+            )
+            client.execute_sql(
+                f"""
+                INSERT INTO {tables["jobs_duration_hourly"]}
+                SELECT
+                    partition,
+                    hour,
+                    {duration_bucket_sql(duration)},
+                    count(*),
+                    sum({duration}),
+                    max({duration})
+                FROM ({touched_jobs})
+                WHERE start_time > 0 AND end_time > start_time
+                GROUP BY ALL
+                """
+            )
+            set_watermark(client, JOBS_TABLE, latest)
+        hours = [row[0] for row in client.execute_sql("SELECT hour FROM rollup_hours")]
+        client.execute_sql("DROP TABLE rollup_hours")
+    logger.info(f"...recomputed {len(hours)} rollup hours")
+    return sorted(hours)
+
+
+def update_usage(pipeline: "dlt.Pipeline", full: bool = False) -> List[int]:
+    """
+    Recompute the usage rollup days touched by the loads since the last update.
+
+    A job counts on the (UTC) day it ended, with its allocated CPUs and GPUs
+    times its run time. Running jobs are counted once they have finished.
+
+    Parameters
+    ----------
+    pipeline : dlt.Pipeline
+        The pipeline whose dataset holds the slurmdb job history
+    full : bool, optional
+        Rebuild all days (default: False)
+
+    Returns
+    -------
+    list of int
+        The recomputed days, as unix timestamps
+    """
+    with pipeline.sql_client() as client:
+        if not client.has_dataset() or not table_exists(client, DB_JOBS_TABLE):
+            return []
+        jobs = client.make_qualified_table_name(DB_JOBS_TABLE)
+        usage = client.make_qualified_table_name("usage_daily")
+        for name, columns in USAGE_TABLES.items():
+            table = client.make_qualified_table_name(name)
+            client.execute_sql(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+
+        watermark = None if full else get_watermark(client, DB_JOBS_TABLE)
+        latest = last_load(client)
+        if latest is None or latest == watermark:
+            return []
+
+        day = f"time__end - time__end % {USAGE_BUCKET}"
+        cluster = cluster_sql(client, DB_JOBS_TABLE)
+        tres = [
+            client.make_qualified_table_name(DB_TRES_TABLE),
+            table_columns(client, DB_TRES_TABLE),
+        ]
+        columns = table_columns(client, DB_JOBS_TABLE)
+        cpus = job_tres_sql(columns, *tres, "cpu")
+        gpus = job_tres_sql(columns, *tres, "gres", "gpu")
+        client.execute_sql(
+            f"CREATE OR REPLACE TEMP TABLE usage_days AS "
+            f"SELECT DISTINCT {day} AS day FROM {jobs} "
+            f"WHERE time__end > 0 "
+            f"AND _dlt_load_id IN ({new_loads_sql(client, watermark)})"
+        )
+        hours = "(time__end - time__start) / 3600"
+        with client.begin_transaction():
+            client.execute_sql(
+                f"DELETE FROM {usage} WHERE day IN (SELECT day FROM usage_days)"
+            )
+            # Every job that ended on one of the touched days
+            client.execute_sql(
+                f"""
+                INSERT INTO {usage}
+                SELECT
+                    cluster,
+                    day,
+                    user_name,
+                    account,
+                    qos,
+                    count(*),
+                    sum(coalesce(cpus, 0) * {hours}),
+                    sum(coalesce(gpus, 0) * {hours})
+                FROM (
+                    SELECT
+                        {cluster} AS cluster,
+                        {day} AS day,
+                        coalesce("user", '') AS user_name,
+                        coalesce(account, '') AS account,
+                        coalesce(qos, '') AS qos,
+                        {cpus} AS cpus,
+                        {gpus} AS gpus,
+                        time__start,
+                        time__end
+                    FROM {jobs} j
+                    WHERE {day} IN (SELECT day FROM usage_days)
+                )
+                WHERE time__start > 0 AND time__end > time__start
+                GROUP BY ALL
+                """
+            )
+            set_watermark(client, DB_JOBS_TABLE, latest)
+        days = [row[0] for row in client.execute_sql("SELECT day FROM usage_days")]
+        client.execute_sql("DROP TABLE usage_days")
+    logger.info(f"...recomputed {len(days)} usage days")
+    return sorted(days)
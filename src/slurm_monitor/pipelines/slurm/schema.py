@@ -0,0 +1,199 @@
+"""
+Column hints for the dlt sources, generated from the slurmrestd OpenAPI spec.
+
+Without hints, dlt infers the schema from the data on every run and turns
+every list in the nested slurmrestd responses into a child table of its own
+(``v0_0_38_nodes__nodes``, ``dbv0_0_38_jobs__steps__tres__requested``, ...).
+The spec which :func:`~slurm_monitor.pipelines.slurm.remote.run` downloads
+into ``slurm_openapi.json`` describes every response, so the columns of each
+resource are declared up front instead:
+
+* scalars get their type from the spec (``integer`` -> ``bigint``, ...),
+* objects are flattened into ``parent__child`` columns, like dlt does, down to
+  :data:`MAX_NESTING` levels; deeper objects are kept as one JSON column,
+* arrays are kept as one JSON column instead of becoming a child table.
+
+Every resource then loads into exactly one table with stable column types.
+Fields missing from the spec are still inferred by dlt as before.
+"""
+
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from dlt.common.normalizers.naming.snake_case import NamingConvention
+from dlt.common.schema.typing import TColumnSchema
+from dlt.extract.source import DltResource
+
+from ...logging import logger
+
+OPENAPI_FILE = "slurm_openapi.json"
+"""The spec downloaded by :func:`~slurm_monitor.pipelines.slurm.remote.run`"""
+
+MAX_NESTING = 2
+"""Levels of objects flattened into columns, as ``max_table_nesting`` of the
+sources"""
+
+OPENAPI_TYPES = {
+    "integer": "bigint",
+    "number": "double",
+    "boolean": "bool",
+    "string": "text",
+}
+"""OpenAPI type -> dlt data type of the scalar columns"""
+
+_NAMING = NamingConvention()
+_PARAMETER = re.compile(r"{\w+}")
+
+
+def load_openapi_spec(path: str = OPENAPI_FILE) -> Optional[Dict[str, Any]]:
+    """The OpenAPI spec at ``path``, or None if it has not been downloaded"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def resolve(spec: Dict[str, Any], schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Follow local ``$ref``\\ s and merge ``allOf`` of ``schema``"""
+    while "$ref" in schema:
+        node: Any = spec
+        for part in schema["$ref"].lstrip("#/").split("/"):
+            node = node[part]
+        schema = node
+    if "allOf" in schema:
+        merged: Dict[str, Any] = {"type": "object", "properties": {}}
+        for part in schema["allOf"]:
+            part = resolve(spec, part)
+            merged["properties"].update(part.get("properties", {}))
+        return merged
+    return schema
+
+
+def _path_item(spec: Dict[str, Any], path: str) -> Optional[Dict[str, Any]]:
+    # The names of path parameters may differ from the spec
+    if path in spec.get("paths", {}):
+        return spec["paths"][path]
+    template = _PARAMETER.sub("{}", path)
+    for candidate, item in spec.get("paths", {}).items():
+        if _PARAMETER.sub("{}", candidate) == template:
+            return item
+    return None
+
+
+def record_schema(
+    spec: Dict[str, Any], path: str, data_selector: str
+) -> Optional[Dict[str, Any]]:
+    """
+    Schema of the records ``data_selector`` selects from the response of ``path``.
+
+    Parameters
+    ----------
+    spec : dict
+        The OpenAPI spec
+    path : str
+        Endpoint path as in the spec, e.g. ``/slurm/v0.0.38/job/{job_id}``
+    data_selector : str
+        ``"$"`` or a dotted path of keys, e.g. ``"jobs"``
+
+    Returns
+    -------
+    dict or None
+        The schema of one record, None if the spec does not describe it
+    """
+    try:
+        response = _path_item(spec, path)["get"]["responses"]["200"]
+        schema = resolve(spec, response)["content"]["application/json"]["schema"]
+    except (KeyError, TypeError):
+        return None
+    schema = resolve(spec, schema)
+    if data_selector != "$":
+        for key in data_selector.lstrip("$.").split("."):
+            schema = resolve(spec, schema.get("properties", {}).get(key, {}))
+    if schema.get("type") == "array":
+        schema = resolve(spec, schema.get("items", {}))
+    return schema if schema.get("properties") else None
+
+
+def columns_from_schema(
+    spec: Dict[str, Any],
+    schema: Dict[str, Any],
+    nesting: int = MAX_NESTING,
+    path: Tuple[str, ...] = (),
+) -> Dict[str, TColumnSchema]:
+    """
+    dlt column hints for records of ``schema``.
+
+    Parameters
+    ----------
+    spec : dict
+        The OpenAPI spec, to resolve references
+    schema : dict
+        Schema of the records, see :func:`record_schema`
+    nesting : int, optional
+        Levels of objects to flatten into columns (default: 2)
+
+    Returns
+    -------
+    dict
+        Column name -> column schema
+    """
+    columns: Dict[str, TColumnSchema] = {}
+    for key, prop in schema.get("properties", {}).items():
+        prop = resolve(spec, prop)
+        fragments = path + (_NAMING.normalize_identifier(key),)
+        kind = prop.get("type", "object" if "properties" in prop else None)
+        if kind == "object" and prop.get("properties") and nesting > 0:
+            columns.update(columns_from_schema(spec, prop, nesting - 1, fragments))
+            continue
+        if kind in ("object", "array"):
+            data_type = "json"
+        elif kind in OPENAPI_TYPES:
+            data_type = OPENAPI_TYPES[kind]
+        else:
+            # Let dlt infer it
+            continue
+        name = _NAMING.shorten_fragments(*fragments)
+        columns[name] = {"name": name, "data_type": data_type}
+    return columns
+
+
+def apply_openapi_hints(
+    resources: Dict[str, DltResource],
+    endpoints: Dict[str, Tuple[str, str]],
+    openapi_path: Optional[str] = OPENAPI_FILE,
+) -> List[str]:
+    """
+    Declare the columns of ``resources`` as described by the OpenAPI spec.
+
+    Parameters
+    ----------
+    resources : dict
+        Resource name -> resource, e.g. of a source being built
+    endpoints : dict
+        Resource name -> (endpoint path, data selector)
+    openapi_path : str, optional
+        The spec (default: ``slurm_openapi.json``). If it is None or does not
+        exist, nothing is changed.
+
+    Returns
+    -------
+    list of str
+        The names of the resources that got column hints
+    """
+    spec = load_openapi_spec(openapi_path) if openapi_path else None
+    if spec is None:
+        logger.debug(f"No OpenAPI spec at {openapi_path}, inferring all columns")
+        return []
+    hinted = []
+    for name, (path, data_selector) in endpoints.items():
+        if name not in resources:
+            continue
+        schema = record_schema(spec, path, data_selector)
+        if schema is None:
+            continue
+        resources[name].apply_hints(columns=columns_from_schema(spec, schema))
+        hinted.append(name)
+    logger.debug(f"Column hints from {openapi_path} for {len(hinted)} resources")
+    return hinted
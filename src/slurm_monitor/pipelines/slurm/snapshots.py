@@ -0,0 +1,390 @@
+"""
+Compact time series of node and queue state.
+
+With ``update_time`` polling, every load only contains the nodes and jobs
+that changed, so the raw tables cannot answer "what did the cluster look like
+at time t". After every load, this post-load step
+
+1. upserts the changed nodes and jobs (the rows of the merged node and job
+   tables written by loads completed since the last update, see
+   ``new_loads_sql`` in rollups.py) into small, dictionary-encoded
+   current-state tables,
+2. appends one snapshot of them, per node (state, allocated CPUs and memory)
+   and per partition (pending and running jobs), stamped with the poll time.
+   A snapshot is taken after every poll, also when nothing changed, so the
+   series has no gaps while the pipeline is running.
+3. applies the retention policy: raw snapshots are kept for 7 days, then
+   averaged over 5 minutes, and those averages are kept for 90 days before
+   they are averaged over hours.
+
+Averages are weighted by time: a raw snapshot holds until the next snapshot
+of the same node or partition, for at most one bucket, and the coarser tables
+record the seconds they cover. A state which lasted 4 minutes outweighs one
+seen by several polls within a few seconds, and the downsampled state of a
+node is the one it was in for the most seconds.
+
+Node, partition and state names are dictionary-encoded as integer ids (see
+``snapshot_names``), so each snapshot row is a handful of integers in DuckDB's
+compressed column storage. The views ``node_history`` and
+``partition_history`` decode the names and union all three resolutions.
+
+Nodes loaded by the multi-cluster orchestrator (see clusters.py) are named
+``<cluster>/<node>``, and queued jobs are identified by cluster and job id.
+Partitions are counted by name, across clusters, like in the rollups.
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+import dlt
+
+from ...logging import logger
+from .rollups import (
+    ROLLUP_TABLES,
+    cluster_sql,
+    get_watermark,
+    last_load,
+    new_loads_sql,
+    set_watermark,
+    table_exists,
+)
+
+NODES_TABLE = "v0_0_38_nodes_overview"
+"""The node table the snapshots are taken from"""
+
+QUEUE_TABLE = "v0_0_38_jobs_overview"
+"""The job table the queue snapshots are taken from"""
+
+ACTIVE_JOB_STATES = ("PENDING", "RUNNING")
+"""Job states counted per partition"""
+
+RETENTION = {
+    # table: (keep for seconds, downsample into, bucket of that table)
+    "": (7 * 86400, "_5min", 300),
+    "_5min": (90 * 86400, "_hourly", 3600),
+}
+"""Retention policy: resolution suffix -> (age limit, coarser suffix, bucket)"""
+
+SNAPSHOT_TABLES = {
+    "rollup_watermarks": ROLLUP_TABLES["rollup_watermarks"],
+    "snapshot_names": "kind VARCHAR, id INTEGER, name VARCHAR",
+    "node_current": (
+        "node_id INTEGER, state_id INTEGER, alloc_cpus INTEGER, alloc_memory BIGINT"
+    ),
+    "queue_current": (
+        "job_id BIGINT, partition_id INTEGER, state_id INTEGER, cluster_id INTEGER"
+    ),
+    "node_snapshots": (
+        "ts BIGINT, node_id INTEGER, state_id INTEGER, "
+        "alloc_cpus INTEGER, alloc_memory BIGINT"
+    ),
+    "partition_snapshots": (
+        "ts BIGINT, partition_id INTEGER, pending INTEGER, running INTEGER"
+    ),
+}
+for _suffix in ("_5min", "_hourly"):
+    SNAPSHOT_TABLES[f"node_snapshots{_suffix}"] = (
+        "ts BIGINT, node_id INTEGER, state_id INTEGER, "
+        "alloc_cpus DOUBLE, alloc_memory DOUBLE, seconds INTEGER"
+    )
+    SNAPSHOT_TABLES[f"partition_snapshots{_suffix}"] = (
+        "ts BIGINT, partition_id INTEGER, pending DOUBLE, running DOUBLE, "
+        "seconds INTEGER"
+    )
+
+# How the columns of each series are combined when downsampling
+_AGGREGATES = {
+    "node_snapshots": {
+        "keys": "node_id",
+        "mode": "state_id",
+        "mean": ["alloc_cpus", "alloc_memory"],
+    },
+    "partition_snapshots": {
+        "keys": "partition_id",
+        "mode": None,
+        "mean": ["pending", "running"],
+    },
+}
+
+
+def _encode(client: Any, t: Dict[str, str], kind: str, names_sql: str):
+    """Add ids for the names returned by ``names_sql`` missing in the dictionary"""
+    client.execute_sql(
+        f"""
+        INSERT INTO {t["snapshot_names"]}
+        SELECT
+            ?,
+            (SELECT coalesce(max(id), 0) FROM {t["snapshot_names"]} WHERE kind = ?)
+                + row_number() OVER (ORDER BY name),
+            name
+        FROM (
+            SELECT DISTINCT name FROM ({names_sql}) WHERE name IS NOT NULL
+            EXCEPT
+            SELECT name FROM {t["snapshot_names"]} WHERE kind = ?
+        )
+        """,
+        kind,
+        kind,
+        kind,
+    )
+
+
+def _id(t: Dict[str, str], kind: str, name: str) -> str:
+    """SQL expression looking up the dictionary id of ``name``"""
+    return (
+        f"(SELECT id FROM {t['snapshot_names']} "
+        f"WHERE kind = '{kind}' AND name = {name})"
+    )
+
+
+def _update_nodes(client: Any, t: Dict[str, str], new_loads: str):
+    nodes = client.make_qualified_table_name(NODES_TABLE)
+    cluster = cluster_sql(client, NODES_TABLE)
+    changed = f"""
+        SELECT
+            CASE WHEN {cluster} = '' THEN name ELSE {cluster} || '/' || name END
+                AS name,
+            state,
+            alloc_cpus,
+            alloc_memory
+        FROM {nodes}
+        WHERE _dlt_load_id IN ({new_loads})
+    """
+    _encode(client, t, "node", f"SELECT name FROM ({changed})")
+    _encode(client, t, "node_state", f"SELECT state AS name FROM ({changed})")
+    client.execute_sql(
+        f"""
+        DELETE FROM {t["node_current"]} WHERE node_id IN (
+            SELECT {_id(t, "node", "c.name")} FROM ({changed}) c
+        )
+        """
+    )
+    client.execute_sql(
+        f"""
+        INSERT INTO {t["node_current"]}
+        SELECT
+            {_id(t, "node", "c.name")},
+            {_id(t, "node_state", "c.state")},
+            alloc_cpus,
+            alloc_memory
+        FROM ({changed}) c
+        """
+    )
+
+
+def _update_queue(client: Any, t: Dict[str, str], new_loads: str):
+    jobs = client.make_qualified_table_name(QUEUE_TABLE)
+    cluster = cluster_sql(client, QUEUE_TABLE)
+    changed = f"""
+        SELECT
+            nullif({cluster}, '') AS cluster,
+            job_id,
+            coalesce(partition, '') AS partition,
+            job_state
+        FROM {jobs}
+        WHERE _dlt_load_id IN ({new_loads})
+    """
+    active = ", ".join(f"'{state}'" for state in ACTIVE_JOB_STATES)
+    _encode(client, t, "cluster", f"SELECT cluster AS name FROM ({changed})")
+    _encode(client, t, "partition", f"SELECT partition AS name FROM ({changed})")
+    _encode(client, t, "job_state", f"SELECT job_state AS name FROM ({changed})")
+    client.execute_sql(
+        f"""
+        DELETE FROM {t["queue_current"]} q
+        USING ({changed}) c
+        WHERE q.job_id = c.job_id
+            AND q.cluster_id IS NOT DISTINCT FROM {_id(t, "cluster", "c.cluster")}
+        """
+    )
+    # Finished jobs leave the queue, so the table stays the size of the queue
+    client.execute_sql(
+        f"""
+        INSERT INTO {t["queue_current"]}
+        SELECT
+            job_id,
+            {_id(t, "partition", "c.partition")},
+            {_id(t, "job_state", "c.job_state")},
+            {_id(t, "cluster", "c.cluster")}
+        FROM ({changed}) c
+        WHERE job_state IN ({active})
+        """
+    )
+
+
+def _take_snapshot(client: Any, t: Dict[str, str], ts: int):
+    # Two polls within the same second: the later state replaces the earlier
+    for series in _AGGREGATES:
+        client.execute_sql(f"DELETE FROM {t[series]} WHERE ts = ?", ts)
+    client.execute_sql(
+        f"INSERT INTO {t['node_snapshots']} SELECT ?, * FROM {t['node_current']}",
+        ts,
+    )
+    client.execute_sql(
+        f"""
+        INSERT INTO {t["partition_snapshots"]}
+        SELECT
+            ?,
+            p.id,
+            count(*) FILTER (WHERE s.name = 'PENDING'),
+            count(*) FILTER (WHERE s.name = 'RUNNING')
+        FROM {t["snapshot_names"]} p
+        LEFT JOIN {t["queue_current"]} q ON q.partition_id = p.id
+        LEFT JOIN {t["snapshot_names"]} s
+            ON s.kind = 'job_state' AND s.id = q.state_id
+        WHERE p.kind = 'partition'
+        GROUP BY p.id
+        """,
+        ts,
+    )
+
+
+def _downsample(client: Any, t: Dict[str, str], now: int):
+    """Move snapshots past their retention into the next coarser table"""
+    for series, spec in _AGGREGATES.items():
+        keys = spec["keys"]
+        columns = [keys, *([spec["mode"]] if spec["mode"] else []), *spec["mean"]]
+        for suffix, (keep, coarser, bucket) in RETENTION.items():
+            source, target = t[f"{series}{suffix}"], t[f"{series}{coarser}"]
+            cutoff = now - keep
+            cutoff -= cutoff % bucket
+            if suffix:
+                # Coarser rows cover whole buckets of this one
+                pieces = f"""
+                    SELECT ts - ts % {bucket} AS bucket, {", ".join(columns)}, seconds
+                    FROM {source}
+                    WHERE ts < {cutoff}
+                """
+            else:
+                # A raw snapshot holds until the next one, for at most one
+                # bucket, and is split between the buckets it overlaps
+                pieces = f"""
+                    SELECT
+                        bucket,
+                        {", ".join(columns)},
+                        least(until, bucket + {bucket}) - greatest(ts, bucket)
+                            AS seconds
+                    FROM (
+                        SELECT
+                            *,
+                            unnest(range(ts - ts % {bucket}, until, {bucket}))
+                                AS bucket
+                        FROM (
+                            SELECT
+                                *,
+                                least(
+                                    lead(ts) OVER (PARTITION BY {keys} ORDER BY ts),
+                                    ts + {bucket}
+                                ) AS until
+                            FROM {source}
+                        )
+                        WHERE ts < {cutoff}
+                    )
+                    WHERE bucket < {cutoff}
+                """
+            means = ", ".join(
+                f"sum({column} * seconds) / nullif(sum(seconds), 0)"
+                for column in spec["mean"]
+            )
+            mode = ""
+            if spec["mode"]:
+                # The state with the most seconds in the bucket
+                mode = f"arg_max({spec['mode']}, mode_seconds), "
+                pieces = f"""
+                    SELECT
+                        *,
+                        sum(seconds) OVER (
+                            PARTITION BY bucket, {keys}, {spec["mode"]}
+                        ) AS mode_seconds
+                    FROM ({pieces})
+                """
+            client.execute_sql(
+                f"""
+                INSERT INTO {target}
+                SELECT bucket, {keys}, {mode}{means}, sum(seconds)
+                FROM ({pieces})
+                GROUP BY bucket, {keys}
+                """
+            )
+            client.execute_sql(f"DELETE FROM {source} WHERE ts < {cutoff}")
+
+
+def _create_views(client: Any, t: Dict[str, str]):
+    name = t["snapshot_names"]
+    for series, columns, dims in [
+        (
+            "node",
+            "alloc_cpus, alloc_memory",
+            [("node_id", "node", "node"), ("state_id", "node_state", "state")],
+        ),
+        ("partition", "pending, running", [("partition_id", "partition", "partition")]),
+    ]:
+        parts = []
+        for suffix, resolution in [("", 1), ("_5min", 300), ("_hourly", 3600)]:
+            ids = ", ".join(column for column, _, _ in dims)
+            parts.append(
+                f"SELECT ts, {resolution} AS resolution, {ids}, {columns} "
+                f"FROM {t[f'{series}_snapshots{suffix}']}"
+            )
+        joins = " ".join(
+            f"LEFT JOIN {name} d{i} ON d{i}.kind = '{kind}' AND d{i}.id = s.{column}"
+            for i, (column, kind, _) in enumerate(dims)
+        )
+        names = ", ".join(
+            f'd{i}.name AS "{label}"' for i, (_, _, label) in enumerate(dims)
+        )
+        view = client.make_qualified_table_name(f"{series}_history")
+        client.execute_sql(
+            f"CREATE OR REPLACE VIEW {view} AS "
+            f"SELECT s.ts, s.resolution, {names}, {columns} "
+            f"FROM ({' UNION ALL '.join(parts)}) s {joins}"
+        )
+
+
+def update_snapshots(
+    pipeline: dlt.Pipeline, now: Optional[int] = None
+) -> Optional[int]:
+    """
+    Append a snapshot of the node and queue state after a poll.
+
+    Parameters
+    ----------
+    pipeline : dlt.Pipeline
+        The pipeline whose dataset holds the node and job tables
+    now : int, optional
+        Unix time of the poll, which the snapshot is stamped with (default:
+        the current time)
+
+    Returns
+    -------
+    int or None
+        Timestamp of the new snapshot, None if no node or job table was loaded
+        yet
+    """
+    ts = int(time.time() if now is None else now)
+    with pipeline.sql_client() as client:
+        if not client.has_dataset():
+            return None
+        sources = [
+            table for table in (NODES_TABLE, QUEUE_TABLE) if table_exists(client, table)
+        ]
+        if not sources:
+            return None
+        t = {name: client.make_qualified_table_name(name) for name in SNAPSHOT_TABLES}
+        for name, columns in SNAPSHOT_TABLES.items():
+            client.execute_sql(f"CREATE TABLE IF NOT EXISTS {t[name]} ({columns})")
+        _create_views(client, t)
+
+        watermark = get_watermark(client, "snapshots")
+        latest = last_load(client)
+        new_loads = new_loads_sql(client, watermark)
+        with client.begin_transaction():
+            if latest != watermark:
+                if NODES_TABLE in sources:
+                    _update_nodes(client, t, new_loads)
+                if QUEUE_TABLE in sources:
+                    _update_queue(client, t, new_loads)
+                set_watermark(client, "snapshots", latest)
+            _take_snapshot(client, t, ts)
+            _downsample(client, t, ts)
+    logger.info(f"...appended node and queue snapshot at {ts}")
+    return ts
@@ -0,0 +1,272 @@
+"""
+Streaming parsers for large SLURM outputs.
+
+``squeue --json``, ``sacct`` and the slurmrestd job listings can be hundreds
+of MB. The parsers here consume the output chunk by chunk and yield one
+record at a time, so memory stays bounded by the size of a single record
+rather than the size of the whole document.
+"""
+
+import json
+import re
+from typing import Any, Container, Dict, Iterable, Iterator, List, Tuple, Union
+
+import requests
+
+from .fanout import extract_data
+from .metrics import count_bytes, record_bytes, response_endpoint
+
+Chunk = Union[str, bytes]
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+"""Size of the chunks handed to the JSON decoder"""
+
+DEFAULT_BATCH_SIZE = 1000
+"""Number of records handed to dlt at once"""
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_TOP_LEVEL_KEY = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*\Z")
+
+
+def rechunk(pieces: Iterable[Chunk], size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Join small pieces (e.g. lines) into decoded text chunks of about ``size``.
+
+    Bytes are decoded as UTF-8, also when a multi-byte character is split
+    between two pieces.
+    """
+    buffer: List[str] = []
+    length = 0
+    pending = b""
+    for piece in pieces:
+        if isinstance(piece, bytes):
+            piece = pending + piece
+            try:
+                piece, pending = piece.decode("utf-8"), b""
+            except UnicodeDecodeError as e:
+                if e.start < len(piece) - 3:
+                    raise
+                piece, pending = piece[: e.start].decode("utf-8"), piece[e.start :]
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if pending:
+        buffer.append(pending.decode("utf-8"))
+    if buffer:
+        yield "".join(buffer)
+
+
+class _JSONStream:
+    """A text buffer over an iterator of chunks, refilled on demand"""
+
+    def __init__(self, chunks: Iterable[Chunk], chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.chunks = rechunk(chunks, chunk_size)
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Append the next chunk, returning False at the end of the input"""
+        if self.eof:
+            return False
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.eof = True
+            return False
+        # Drop what was consumed already, so the buffer does not grow
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ("" at the end)"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(
+                f"Expected {char!r} in JSON stream, got {self.peek()!r} "
+                f"at {self.buffer[self.pos : self.pos + 40]!r}"
+            )
+        self.pos += 1
+
+    def expect_end(self):
+        """Raise if anything but whitespace is left, as ``json.loads`` does"""
+        if self.peek():
+            raise ValueError(
+                "Extra data after the JSON document: "
+                f"{self.buffer[self.pos : self.pos + 40]!r}"
+            )
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # A number at the very end of the buffer may continue in the
+            # next chunk ("1" + "2", but also "1." + "5" where only "1" was
+            # decoded), so only accept values followed by something else.
+            if _NUMBER_TAIL.match(self.buffer, end) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_items(
+    chunks: Iterable[Chunk],
+    keys: Container[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Yield the elements of top-level arrays of a JSON object one by one.
+
+    For ``{"meta": {...}, "jobs": [{...}, {...}]}`` and ``keys={"jobs"}``,
+    this yields ``("jobs", {...})`` for every job without ever holding the
+    whole document in memory. Values of other top-level keys are decoded and
+    discarded.
+
+    Parameters
+    ----------
+    chunks : iterable of str or bytes
+        The document, in pieces of any size (lines, network chunks, ...)
+    keys : container of str
+        The top-level keys whose arrays to stream
+    chunk_size : int, optional
+        Size of the text chunks handed to the decoder (default: 64 KiB)
+
+    Yields
+    ------
+    Tuple[str, Any]
+        The top-level key and one element of its array
+    """
+    stream = _JSONStream(chunks, chunk_size)
+    stream.expect("{")
+    if stream.peek() == "}":
+        stream.pos += 1
+        stream.expect_end()
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key in keys and stream.peek() == "[":
+            stream.expect("[")
+            if stream.peek() != "]":
+                while True:
+                    yield key, stream.value()
+                    if stream.peek() != ",":
+                        break
+                    stream.pos += 1
+            stream.expect("]")
+        elif key in keys:
+            # A single object instead of an array counts as one element
+            value = stream.value()
+            if value is not None:
+                yield key, value
+        else:
+            stream.value()
+        if stream.peek() != ",":
+            break
+        stream.pos += 1
+    stream.expect("}")
+    stream.expect_end()
+
+
+def iter_json_array(chunks: Iterable[Chunk], key: str) -> Iterator[Any]:
+    """Yield the elements of the top-level array ``key`` one by one"""
+    for _, item in iter_json_items(chunks, {key}):
+        yield item
+
+
+def iter_parsable2(lines: Iterable[Chunk], delimiter: str = "|") -> Iterator[Dict]:
+    """
+    Parse the ``--parsable2`` output of ``sacct``/``sinfo``/``squeue``.
+
+    The first line is the header naming the fields, every following line
+    is one record.
+
+    Yields
+    ------
+    dict
+        Field name -> value, all values as strings
+    """
+    header = None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.rstrip("\r\n")
+        if not line:
+            continue
+        values = line.split(delimiter)
+        if header is None:
+            header = values
+            continue
+        yield dict(zip(header, values))
+
+
+def batched(items: Iterable[Any], size: int = DEFAULT_BATCH_SIZE) -> Iterator[List]:
+    """Group ``items`` into lists of at most ``size``"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_response_records(
+    response: requests.Response,
+    data_selector: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[List[Any]]:
+    """
+    Yield the records of a response in batches, while it is being received.
+
+    The response should be requested with ``stream=True``. Selectors naming
+    a top-level key (e.g. ``"jobs"``) are parsed incrementally, so only one
+    network chunk and one batch of records are held in memory at a time.
+    Any other JSONPath falls back to decoding the whole body.
+
+    Parameters
+    ----------
+    response : requests.Response
+        The (streamed) response
+    data_selector : str
+        JSONPath selecting the records, as in the dlt resource definitions
+    batch_size : int, optional
+        Number of records per batch (default: 1000)
+
+    Yields
+    ------
+    list
+        A batch of records
+    """
+    # Bodies of non-streamed responses were counted by the response hook
+    streamed = not response._content_consumed
+    if not _TOP_LEVEL_KEY.fullmatch(data_selector):
+        records = extract_data(response.json(), data_selector)
+        if streamed:
+            record_bytes(response_endpoint(response), len(response.content))
+        if records:
+            yield records
+        return
+    chunks = response.iter_content(chunk_size=DEFAULT_CHUNK_SIZE)
+    if streamed:
+        chunks = count_bytes(chunks, response_endpoint(response))
+    yield from batched(iter_json_array(chunks, data_selector), batch_size)
@@ -0,0 +1,52 @@
+"""
+The tasks of the daemon, in a module of their own.
+
+The command line interface validates ``--interval`` options against them
+without importing dlt.
+"""
+
+from typing import Any, Dict
+
+DEFAULT_TASKS: Dict[str, Dict[str, Any]] = {
+    "jobs_nodes": {
+        "endpoint_type": "slurm",
+        "resources": [
+            "slurm_v0_0_38_get_jobs",
+            "slurm_v0_0_38_get_job",
+            "slurm_v0_0_38_get_nodes",
+            "slurm_v0_0_38_get_node",
+        ],
+        "interval": 30,
+    },
+    "partitions": {
+        "endpoint_type": "slurm",
+        "resources": [
+            "slurm_v0_0_38_get_partitions",
+            "slurm_v0_0_38_get_partition",
+            "slurm_v0_0_38_get_reservations",
+            "slurm_v0_0_38_get_reservation",
+            "slurm_v0_0_38_diag",
+            "slurm_v0_0_38_slurmctld_get_licenses",
+        ],
+        "interval": 600,
+    },
+    "slurmdb_jobs": {
+        "endpoint_type": "slurmdb",
+        "resources": ["slurmdb_v0_0_38_get_jobs"],
+        "interval": 3600,
+    },
+    "slurmdb_accounting": {
+        "endpoint_type": "slurmdb",
+        "resources": [
+            "slurmdb_v0_0_38_get_associations",
+            "slurmdb_v0_0_38_get_users",
+            "slurmdb_v0_0_38_get_accounts",
+            "slurmdb_v0_0_38_get_qos",
+            "slurmdb_v0_0_38_get_wckeys",
+            "slurmdb_v0_0_38_get_tres",
+            "slurmdb_v0_0_38_get_clusters",
+        ],
+        "interval": 21600,
+    },
+}
+"""Default tasks of the daemon: resources loaded together, and their interval"""
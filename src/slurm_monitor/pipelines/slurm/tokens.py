@@ -0,0 +1,143 @@
+"""
+Cache for SLURM JSON Web Tokens (JWT).
+
+Generating a token means running ``scontrol token`` on the cluster over SSH.
+Tokens stay valid for their whole ``lifespan``, so they are cached per
+(host, user) and only regenerated shortly before they expire. The cache is
+held in memory and can optionally be persisted to a file readable only by
+the current user, so that consecutive processes (e.g. cron runs) share it.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from ...logging import logger
+
+DEFAULT_REFRESH_MARGIN = 0.1
+"""Fraction of the lifespan before expiry at which a token is refreshed"""
+
+TOKEN_CACHE_ENV_VAR = "SLURM_MONITOR_TOKEN_CACHE"
+"""Environment variable pointing to the file of the default token cache"""
+
+
+class TokenCache:
+    """
+    Expiry-aware cache of SLURM tokens keyed by (host, user).
+
+    Parameters
+    ----------
+    path : str, optional
+        File to persist the cache to. It is created with mode 0600. If not
+        given, tokens are only cached in memory.
+    refresh_margin : float, optional
+        Refresh tokens once less than this fraction of their lifespan is
+        left (default: 0.1)
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        refresh_margin: float = DEFAULT_REFRESH_MARGIN,
+    ):
+        self.path = path
+        self.refresh_margin = refresh_margin
+        self._tokens: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    @staticmethod
+    def _key(host: str, user: str) -> str:
+        return f"{user}@{host}"
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                self._tokens = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable token cache {self.path}: {e}")
+            self._tokens = {}
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        # The mode only applies to new files, not to one left by a crash
+        os.fchmod(fd, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._tokens, f)
+        os.replace(tmp_path, self.path)
+
+    def is_fresh(self, entry: Dict, now: Optional[float] = None) -> bool:
+        """Whether a cached entry is still outside of its refresh margin"""
+        now = time.time() if now is None else now
+        margin = self.refresh_margin * entry["lifespan"]
+        return now < entry["issued_at"] + entry["lifespan"] - margin
+
+    def get(
+        self,
+        host: str,
+        user: str,
+        generate: Callable[[], Tuple[str, str]],
+        lifespan: int = 3600,
+    ) -> Tuple[str, str]:
+        """
+        Return a valid token for (host, user), generating one if needed.
+
+        Parameters
+        ----------
+        host : str
+            The host the token was generated on
+        user : str
+            The SLURM user the token belongs to
+        generate : callable
+            Called without arguments to generate a new token, returning the
+            shell variable name and the token
+        lifespan : int, optional
+            Lifespan of newly generated tokens in seconds (default: 3600)
+
+        Returns
+        -------
+        Tuple[str, str]
+            The shell variable name and the token
+        """
+        key = self._key(host, user)
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry and self.is_fresh(entry):
+                return entry["var_name"], entry["token"]
+            issued_at = time.time()
+            var_name, token = generate()
+            self._tokens[key] = {
+                "var_name": var_name,
+                "token": token,
+                "issued_at": issued_at,
+                "lifespan": lifespan,
+            }
+            if self.path:
+                self._save()
+            return var_name, token
+
+    def invalidate(self, host: str, user: str):
+        """Drop the token of (host, user), e.g. after it was rejected"""
+        with self._lock:
+            if self._tokens.pop(self._key(host, user), None) and self.path:
+                self._save()
+
+
+_DEFAULT_TOKEN_CACHE: Optional[TokenCache] = None
+
+
+def default_token_cache() -> TokenCache:
+    """
+    The token cache shared by all tunnels and sources of this process.
+
+    It is persisted to the file named by ``$SLURM_MONITOR_TOKEN_CACHE`` if
+    that variable is set.
+    """
+    global _DEFAULT_TOKEN_CACHE
+    if _DEFAULT_TOKEN_CACHE is None:
+        _DEFAULT_TOKEN_CACHE = TokenCache(path=os.environ.get(TOKEN_CACHE_ENV_VAR))
+    return _DEFAULT_TOKEN_CACHE
@@ -0,0 +1,4 @@
+import os
+
+# Tests must not phone home: the telemetry thread blocks the exit without network
+os.environ.setdefault("RUNTIME__DLTHUB_TELEMETRY", "false")
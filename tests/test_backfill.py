@@ -0,0 +1,80 @@
+import dlt
+
+from slurm_monitor.pipelines.slurm import backfill
+from slurm_monitor.pipelines.slurm.backfill import DEFAULT_WINDOW, backfill_resource
+
+DAY = 20000 * DEFAULT_WINDOW
+"""Start of the window the first run falls into"""
+
+
+class FakeResponse:
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"jobs": self.jobs}
+
+
+class FakeSession:
+    """Serves the jobs submitted in the requested window, up to ``now``"""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.now = 0
+
+    def get(self, url, params=None, stream=False, hooks=None):
+        return FakeResponse(
+            [
+                job
+                for job in self.jobs
+                if params["start_time"] <= job["submit"] < params["end_time"]
+                and job["submit"] <= self.now
+            ]
+        )
+
+
+def test_backfill_resumes_after_window_boundary(tmp_path, monkeypatch):
+    jobs = [
+        {"job_id": 1, "submit": DAY + 1000},
+        # Submitted after the first run, before the window closed
+        {"job_id": 2, "submit": DAY + DEFAULT_WINDOW - 100},
+        {"job_id": 3, "submit": DAY + DEFAULT_WINDOW + 100},
+    ]
+    session = FakeSession(jobs)
+    pipeline = dlt.pipeline(
+        pipeline_name="test_backfill",
+        pipelines_dir=str(tmp_path),
+        destination=dlt.destinations.duckdb(str(tmp_path / "test.duckdb")),
+        dataset_name="slurm_data",
+    )
+    loaded = []
+    for now in (DAY + 2000, DAY + DEFAULT_WINDOW + 200):
+        session.now = now
+        monkeypatch.setattr(backfill.time, "time", lambda: now)
+        resource = backfill_resource(
+            name="jobs",
+            table_name="jobs",
+            path="/jobs",
+            data_selector="jobs",
+            base_url="http://slurmrestd",
+            session=session,
+            stream=False,
+        )
+        pipeline.run(resource)
+        with pipeline.sql_client() as client:
+            loaded = [
+                row[0]
+                for row in client.execute_sql(
+                    "SELECT DISTINCT job_id FROM jobs ORDER BY job_id"
+                )
+            ]
+    assert loaded == [1, 2, 3]
@@ -0,0 +1,98 @@
+import duckdb
+import pytest
+
+from slurm_monitor.dashboards.cache import QueryCache
+
+VERSION_QUERY = "SELECT max(version) FROM versions"
+
+
+@pytest.fixture
+def conn():
+    conn = duckdb.connect()
+    conn.execute("CREATE TABLE versions (version VARCHAR)")
+    conn.execute("INSERT INTO versions VALUES ('1')")
+    conn.execute("CREATE TABLE jobs AS SELECT range AS job_id FROM range(10)")
+    yield conn
+    conn.close()
+
+
+def count_jobs(cache):
+    return int(cache.query("SELECT count(*) AS n FROM jobs")["n"].iloc[0])
+
+
+def test_hits_and_copies(conn):
+    cache = QueryCache(conn, version_query=VERSION_QUERY)
+    first = cache.query("SELECT ?::INT AS x", [1])
+    first.loc[0, "x"] = 99
+    assert cache.query("SELECT ?::INT AS x", [1])["x"].tolist() == [1]
+    assert cache.query("SELECT ?::INT AS x", [2])["x"].tolist() == [2]
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.stats()["data_version"] == "1"
+
+
+def test_lru_eviction(conn):
+    cache = QueryCache(conn, max_entries=2, version_query=VERSION_QUERY)
+    cache.query("SELECT ?::INT AS x", [1])
+    cache.query("SELECT ?::INT AS x", [2])
+    # Using 1 makes 2 the least recently used entry
+    cache.query("SELECT ?::INT AS x", [1])
+    cache.query("SELECT ?::INT AS x", [3])
+    assert cache.evictions == 1
+    assert cache.stats()["entries"] == 2
+
+    misses = cache.misses
+    cache.query("SELECT ?::INT AS x", [1])
+    cache.query("SELECT ?::INT AS x", [3])
+    assert cache.misses == misses
+    cache.query("SELECT ?::INT AS x", [2])
+    assert cache.misses == misses + 1
+
+
+def test_byte_budget(conn):
+    sql = "SELECT range AS x FROM range(?)"
+    size = int(conn.execute(sql, [1000]).df().memory_usage(deep=True).sum())
+    cache = QueryCache(conn, max_bytes=int(2.5 * size), version_query=VERSION_QUERY)
+    for n in [1000, 1001, 1002]:
+        cache.query(sql, [n])
+    # Only two results of about 8 kB fit into the budget
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert cache.evictions == 1
+    assert stats["size_kib"] * 1024 <= cache.max_bytes
+
+    # A result larger than the whole budget is returned, but not kept
+    assert len(cache.query(sql, [10000])) == 10000
+    assert cache.stats()["entries"] <= 1
+    assert cache._bytes <= cache.max_bytes
+
+
+def test_invalidation_on_new_version(conn):
+    versions = []
+    cache = QueryCache(
+        conn,
+        version_query=VERSION_QUERY,
+        on_new_version=lambda conn: versions.append(
+            conn.execute(VERSION_QUERY).fetchone()[0]
+        ),
+    )
+    assert count_jobs(cache) == 10
+    conn.execute("INSERT INTO jobs VALUES (10)")
+    # The new row is not seen until the data version changes
+    assert count_jobs(cache) == 10
+    assert cache.invalidations == 0
+
+    conn.execute("INSERT INTO versions VALUES ('2')")
+    assert count_jobs(cache) == 11
+    assert cache.invalidations == 1
+    assert cache.stats()["data_version"] == "2"
+    assert versions == ["1", "2"]
+
+
+def test_no_loads_yet():
+    conn = duckdb.connect()
+    cache = QueryCache(conn)
+    # Without a pipeline run there is no _dlt_loads table to read the version of
+    assert cache.data_version() is None
+    assert cache.query("SELECT 1 AS x")["x"].tolist() == [1]
+    assert cache.query("SELECT 1 AS x")["x"].tolist() == [1]
+    assert cache.hits == 1
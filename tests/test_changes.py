@@ -0,0 +1,105 @@
+import dlt
+import pytest
+
+from slurm_monitor.pipelines.slurm.changes import HASH_RETENTION, ChangeTracker
+
+NOW = 300000 * 3600
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    return dlt.pipeline(
+        pipeline_name="test_changes",
+        pipelines_dir=str(tmp_path),
+        destination=dlt.destinations.duckdb(str(tmp_path / "slurm.duckdb")),
+        dataset_name="slurm_data",
+    )
+
+
+def job(job_id, state):
+    return {"cluster": "albedo", "job_id": job_id, "job_state": state}
+
+
+def run(pipeline, jobs, now):
+    """One poll of ``jobs``, filtered and committed like in the orchestrator"""
+
+    @dlt.source(name="slurm")
+    def source():
+        return dlt.resource(
+            jobs,
+            name="v0_0_38_jobs_overview",
+            primary_key=["cluster", "job_id"],
+            write_disposition="merge",
+        )
+
+    source = source()
+    tracker = ChangeTracker(pipeline)
+    tracker.track(source)
+    pipeline.run(source)
+    tracker.commit(now)
+    return tracker
+
+
+def query(pipeline, sql, *params):
+    with pipeline.sql_client() as client:
+        return [tuple(row) for row in client.execute_sql(sql, *params)]
+
+
+def loaded(pipeline):
+    """Job ids and states of the rows loaded by the last load"""
+    return query(
+        pipeline,
+        "SELECT job_id, job_state FROM v0_0_38_jobs_overview "
+        "WHERE _dlt_load_id = (SELECT max(load_id) FROM _dlt_loads) ORDER BY 1",
+    )
+
+
+def hashes(pipeline):
+    return query(
+        pipeline,
+        "SELECT key, updated - ? FROM row_hashes ORDER BY key::INT",
+        NOW,
+    )
+
+
+def test_unchanged_rows_are_skipped_and_changed_rows_merged(pipeline):
+    run(pipeline, [job(1, "PENDING"), job(2, "RUNNING")], NOW)
+    assert hashes(pipeline) == [("1", 0), ("2", 0)]
+
+    tracker = run(
+        pipeline, [job(1, "RUNNING"), job(2, "RUNNING"), job(3, "PENDING")], NOW + 60
+    )
+    assert tracker.skipped == {"v0_0_38_jobs_overview": 1}
+    assert loaded(pipeline) == [(1, "RUNNING"), (3, "PENDING")]
+    # The changed row replaced the old one, the skipped one is still there
+    assert query(
+        pipeline,
+        "SELECT job_id, job_state FROM v0_0_38_jobs_overview ORDER BY 1",
+    ) == [(1, "RUNNING"), (2, "RUNNING"), (3, "PENDING")]
+    # Only the hashes of the loaded rows were stored again
+    assert hashes(pipeline) == [("1", 60), ("2", 0), ("3", 60)]
+
+    # Nothing changed, nothing is loaded
+    tracker = run(pipeline, [job(1, "RUNNING"), job(3, "PENDING")], NOW + 120)
+    assert tracker.skipped == {"v0_0_38_jobs_overview": 2}
+    assert tracker.pending == {}
+
+
+def test_hashes_of_unchanged_rows_are_refreshed(pipeline):
+    run(pipeline, [job(1, "RUNNING"), job(2, "COMPLETED")], NOW)
+
+    # Seen unchanged after half the retention, the hash of job 1 is refreshed
+    later = NOW + HASH_RETENTION // 2 + 1
+    run(pipeline, [job(1, "RUNNING")], later)
+    assert hashes(pipeline) == [("1", later - NOW), ("2", 0)]
+
+    # Seen again before half the retention passed, it is not stored again
+    run(pipeline, [job(1, "RUNNING")], later + 60)
+    assert hashes(pipeline) == [("1", later - NOW), ("2", 0)]
+
+    # Job 2 was not seen for the retention and is dropped, job 1 stays skipped
+    end = NOW + HASH_RETENTION + 60
+    tracker = run(pipeline, [job(1, "RUNNING")], end)
+    assert tracker.skipped == {"v0_0_38_jobs_overview": 1}
+    assert tracker.pending == {}
+    assert hashes(pipeline) == [("1", end - NOW)]
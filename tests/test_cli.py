@@ -0,0 +1,41 @@
+import pytest
+from click.testing import CliRunner
+
+from slurm_monitor.cli import cli, parse_intervals
+from slurm_monitor.pipelines.slurm.tasks import DEFAULT_TASKS
+
+
+@pytest.mark.parametrize(
+    "interval",
+    [
+        "jobs_nodes=0",
+        "jobs_nodes=-5",
+        "jobs_nodes",
+        "jobs_nodes=soon",
+        "jobs_nodes=inf",
+        "slurmdb_accounting=nan",
+        "jobs_node=30",
+        "=30",
+    ],
+)
+def test_daemon_rejects_invalid_intervals(interval):
+    result = CliRunner().invoke(cli, ["daemon", "--interval", interval])
+    assert result.exit_code == 2
+    assert "Invalid value for '--interval'" in result.output
+
+
+def test_parse_intervals():
+    values = ["jobs_nodes=10", "partitions=off", "slurmdb_accounting=1e4"]
+    assert parse_intervals(None, None, values) == {
+        "jobs_nodes": 10.0,
+        "partitions": 0.0,
+        "slurmdb_accounting": 10000.0,
+    }
+
+
+def test_daemon_help_lists_all_tasks():
+    result = CliRunner().invoke(cli, ["daemon", "--help"])
+    assert result.exit_code == 0
+    help_text = " ".join(result.output.split())
+    for name, task in DEFAULT_TASKS.items():
+        assert f"{name}={task['interval']}" in help_text
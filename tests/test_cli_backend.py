@@ -0,0 +1,163 @@
+import json
+import os
+import subprocess
+
+import pytest
+
+from slurm_monitor.pipelines.slurm import cli_backend
+from slurm_monitor.pipelines.slurm.cli_backend import (
+    batch_command,
+    iter_sections,
+    parse_section,
+    parse_tres,
+    sacct_to_job,
+)
+from slurm_monitor.pipelines.slurm.streaming import iter_parsable2
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+def data_path(name):
+    return os.path.join(DATA, name)
+
+
+def read_lines(name):
+    with open(data_path(name), "rb") as f:
+        return f.readlines()
+
+
+def test_batch_command_sections_and_exit_status(monkeypatch):
+    monkeypatch.setattr(
+        cli_backend,
+        "cli_commands",
+        lambda sacct_starttime: {
+            "squeue": f"cat {data_path('squeue_v0.0.38.json')}",
+            # A failing command in the middle of the batch
+            "sinfo": f"sh -c 'cat {data_path('sinfo_v0.0.38.json')}; exit 3'",
+            "sacct": f"cat {data_path('sacct.txt')}",
+        },
+    )
+    command = batch_command(["squeue", "sinfo", "sacct"])
+    result = subprocess.run(["sh", "-c", command], capture_output=True)
+    assert result.returncode == 3
+
+    lines = result.stdout.splitlines(keepends=True)
+    sections = {}
+    for name, section in iter_sections(lines):
+        sections[name] = list(parse_section(name, section))
+    assert list(sections) == ["squeue", "sinfo", "sacct"]
+    assert [table for table, _ in sections["squeue"]] == [
+        "v0_0_38_jobs_overview",
+        "v0_0_38_jobs",
+    ] * 2
+    assert sections["squeue"][0][1]["name"] == "fesom – spinup"
+    assert [(table, item["name"]) for table, item in sections["sinfo"]] == [
+        ("v0_0_38_nodes_overview", "node001"),
+        ("v0_0_38_nodes_overview", "node002"),
+        ("v0_0_38_partitions_overview", "compute"),
+    ]
+    assert [job["job_id"] for _, job in sections["sacct"]] == [2001, 2002, 2003]
+
+
+def test_batch_command_succeeds(monkeypatch):
+    monkeypatch.setattr(
+        cli_backend,
+        "cli_commands",
+        lambda sacct_starttime: {"squeue": "true", "sinfo": "echo ok"},
+    )
+    command = batch_command(["squeue", "sinfo"])
+    result = subprocess.run(["sh", "-c", command], capture_output=True, text=True)
+    assert result.returncode == 0
+    assert [
+        (name, list(section))
+        for name, section in iter_sections(result.stdout.splitlines())
+    ] == [("squeue", []), ("sinfo", ["ok"])]
+
+
+def test_iter_sections_skips_unconsumed_lines():
+    lines = ["before\n", "@@slurm-monitor-section:a\n", "1\n", "2\n"]
+    lines += ["@@slurm-monitor-section:b\n", "3\n"]
+    seen = []
+    for name, section in iter_sections(iter(lines)):
+        seen.append((name, next(section, None)))
+    assert seen == [("a", "1\n"), ("b", "3\n")]
+
+
+def test_parse_section_rejects_unknown_layouts():
+    # data_parser output: the records come before the meta object
+    with pytest.raises(ValueError, match="no version"):
+        list(parse_section("squeue", read_lines("squeue_v0.0.40.json")))
+    newer = {
+        "meta": {"plugin": {"type": "", "data_parser": "data_parser/v0.0.40"}},
+        "jobs": [{"job_id": 1}],
+    }
+    with pytest.raises(ValueError, match="v0.0.40"):
+        list(parse_section("squeue", [json.dumps(newer)]))
+    with pytest.raises(ValueError, match="no version"):
+        list(parse_section("sinfo", ['{"nodes": [], "partitions": []}']))
+    with pytest.raises(ValueError, match="Unknown CLI section"):
+        list(parse_section("scontrol", []))
+
+
+def test_parse_section_empty_queue():
+    output = {"meta": {"plugin": {"type": "openapi/v0.0.37"}}, "jobs": []}
+    assert list(parse_section("squeue", [json.dumps(output)])) == []
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("", []),
+        (
+            "cpu=4,mem=16G,node=1",
+            [
+                {"type": "cpu", "name": None, "count": 4},
+                {"type": "mem", "name": None, "count": 16384},
+                {"type": "node", "name": None, "count": 1},
+            ],
+        ),
+        (
+            "mem=512K,mem=1.5T,mem=100M,mem=7",
+            [
+                {"type": "mem", "name": None, "count": 0},
+                {"type": "mem", "name": None, "count": 1572864},
+                {"type": "mem", "name": None, "count": 100},
+                {"type": "mem", "name": None, "count": 7},
+            ],
+        ),
+        (
+            "gres/gpu=2,gres/gpu:a100=2,billing=x,broken",
+            [
+                {"type": "gres", "name": "gpu", "count": 2},
+                {"type": "gres", "name": "gpu:a100", "count": 2},
+            ],
+        ),
+    ],
+)
+def test_parse_tres(value, expected):
+    assert parse_tres(value) == expected
+
+
+def test_sacct_to_job():
+    records = list(iter_parsable2(read_lines("sacct.txt")))
+    jobs = [sacct_to_job(record) for record in records]
+
+    assert jobs[0]["job_id"] == 2001
+    assert jobs[0]["cluster"] == "albedo"
+    assert jobs[0]["time"] == {
+        "submission": 1792200000,
+        "start": 1792200100,
+        "end": 1792203700,
+        "elapsed": 3600,
+    }
+    assert jobs[0]["required"] == {"CPUs": 256}
+    assert jobs[0]["tres"]["allocated"][1:3] == [
+        {"type": "cpu", "name": None, "count": 256},
+        {"type": "mem", "name": None, "count": 512000},
+    ]
+    # "CANCELLED by <uid>" is reduced to the state
+    assert jobs[1]["state"] == {"current": "CANCELLED"}
+    assert jobs[1]["exit_code"] == {"return_code": 0, "signal": {"signal_id": 15}}
+    # Pending jobs have no start and end time, and no allocated TRES
+    assert jobs[2]["time"]["start"] == jobs[2]["time"]["end"] == 0
+    assert jobs[2]["tres"] == {"allocated": []}
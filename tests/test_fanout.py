@@ -0,0 +1,53 @@
+import random
+import threading
+import time
+
+from slurm_monitor.pipelines.slurm import fanout
+from slurm_monitor.pipelines.slurm.fanout import ordered_map, shared_session
+
+
+def test_ordered_map_keeps_order_and_bound():
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+    consumed = []
+
+    def items():
+        for i in range(50):
+            consumed.append(i)
+            yield i
+
+    def func(i):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        # Later items finish first, so results arrive out of order
+        time.sleep(random.uniform(0, 0.01))
+        with lock:
+            running -= 1
+        return i * 2
+
+    results = []
+    for result in ordered_map(func, items(), max_in_flight=4):
+        # Items are consumed lazily, at most max_in_flight ahead of the results
+        assert len(consumed) - len(results) <= 4
+        results.append(result)
+    assert results == [i * 2 for i in range(50)]
+    assert 1 < peak <= 4
+
+
+def test_ordered_map_sequential():
+    assert list(ordered_map(str, range(3), max_in_flight=1)) == ["0", "1", "2"]
+
+
+def test_shared_session_closes_replaced_session(monkeypatch):
+    monkeypatch.setattr(fanout, "_SESSIONS", {})
+    small = shared_session("http://slurmrestd", None, 2)
+    closed = []
+    monkeypatch.setattr(small, "close", lambda: closed.append(small))
+    assert shared_session("http://slurmrestd", None, 2) is small
+    large = shared_session("http://slurmrestd", None, 8)
+    assert large is not small
+    assert closed == [small]
+    assert large.get_adapter("http://slurmrestd")._pool_maxsize == 8
@@ -0,0 +1,88 @@
+import random
+
+import duckdb
+import pytest
+
+from slurm_monitor.pipelines.slurm.occupancy import occupancy_sql
+
+
+def brute_force(intervals, start, end, bucket):
+    """Mean allocated CPUs per partition and bucket, by overlapping every pair"""
+    start -= start % bucket
+    n_buckets = max(1, -(-(end - start) // bucket))
+    # Partitions with a job overlapping the range get all buckets
+    partitions = {
+        partition
+        for partition, start_time, end_time, _ in intervals
+        if min(end_time, start + n_buckets * bucket) > max(start_time, start)
+    }
+    result = {}
+    for partition in partitions:
+        for b in range(n_buckets):
+            lower, upper = start + b * bucket, start + (b + 1) * bucket
+            seconds = sum(
+                cpus * max(0, min(end_time, upper) - max(start_time, lower))
+                for p, start_time, end_time, cpus in intervals
+                if p == partition
+            )
+            result[partition, lower] = seconds / bucket
+    return result
+
+
+def occupancy(intervals, start, end, bucket):
+    conn = duckdb.connect()
+    conn.execute(
+        "CREATE TABLE intervals "
+        "(partition VARCHAR, start_time BIGINT, end_time BIGINT, cpus BIGINT)"
+    )
+    conn.executemany("INSERT INTO intervals VALUES (?, ?, ?, ?)", intervals)
+    rows = conn.execute(
+        occupancy_sql("SELECT * FROM intervals", start, end, bucket)
+    ).fetchall()
+    conn.close()
+    return {(partition, ts): alloc_cpus for partition, ts, alloc_cpus in rows}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_occupancy_matches_brute_force(seed):
+    rng = random.Random(seed)
+    bucket = rng.choice([60, 300, 3600])
+    start = rng.randrange(10**6, 2 * 10**6)
+    end = start + rng.randrange(1, 40) * rng.choice([bucket // 2, bucket])
+    intervals = []
+    for _ in range(rng.randrange(1, 60)):
+        # Jobs inside, across and outside the range, some on bucket boundaries
+        start_time = rng.choice(
+            [
+                rng.randrange(start - 5 * bucket, end + bucket),
+                start - start % bucket + rng.randrange(-3, 40) * bucket,
+            ]
+        )
+        duration = rng.choice(
+            [0, rng.randrange(1, bucket), rng.randrange(1, 20) * bucket]
+        )
+        intervals.append(
+            (
+                rng.choice(["compute", "gpu", "fat"]),
+                start_time,
+                start_time + duration,
+                rng.randrange(1, 256),
+            )
+        )
+
+    expected = brute_force(intervals, start, end, bucket)
+    result = occupancy(intervals, start, end, bucket)
+    assert result.keys() == expected.keys()
+    for key, alloc_cpus in expected.items():
+        assert result[key] == pytest.approx(alloc_cpus), key
+
+
+def test_occupancy_edges():
+    # One job of 4 CPUs from 150 to 750, buckets of 300 seconds from 0
+    result = occupancy([("a", 150, 750, 4)], 0, 900, 300)
+    assert result == {("a", 0): 2.0, ("a", 300): 4.0, ("a", 600): 2.0}
+    # A job ending exactly at the end of a bucket does not leak into the next
+    result = occupancy([("a", 0, 300, 4), ("a", 300, 301, 300)], 0, 900, 300)
+    assert result == {("a", 0): 4.0, ("a", 300): 1.0, ("a", 600): 0.0}
+    # Jobs outside the range are not counted, nor are their partitions
+    assert occupancy([("a", 0, 100, 4)], 300, 900, 300) == {}
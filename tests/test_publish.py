@@ -0,0 +1,21 @@
+from slurm_monitor.pipelines.slurm import publish
+
+
+def test_publish_due_waits_for_interval(tmp_path, monkeypatch):
+    published = []
+
+    def publish_snapshot(pipeline, publish_dir, keep):
+        published.append(publish_dir)
+        return str(tmp_path / f"slurm_{len(published)}.duckdb")
+
+    now = 1000.0
+    monkeypatch.setattr(publish, "publish_snapshot", publish_snapshot)
+    monkeypatch.setattr(publish.time, "monotonic", lambda: now)
+    publish_dir = str(tmp_path)
+
+    assert publish.publish_due(None, publish_dir, interval=300)
+    now += 30
+    assert publish.publish_due(None, publish_dir, interval=300) is None
+    now += 300
+    assert publish.publish_due(None, publish_dir, interval=300)
+    assert len(published) == 2
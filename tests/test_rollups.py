@@ -0,0 +1,72 @@
+import dlt
+
+from slurm_monitor.pipelines.slurm.rollups import update_rollups
+
+HOUR = 300000 * 3600
+
+
+def make_pipeline(tmp_path, name):
+    # Like the clusters of the orchestrator: one pipeline each, one dataset
+    return dlt.pipeline(
+        pipeline_name=name,
+        pipelines_dir=str(tmp_path / "pipelines"),
+        destination=dlt.destinations.duckdb(str(tmp_path / "slurm.duckdb")),
+        dataset_name="slurm_data",
+    )
+
+
+def jobs(cluster, hour):
+    return dlt.resource(
+        [
+            {
+                "cluster": cluster,
+                "job_id": job_id,
+                "partition": "compute",
+                "submit_time": hour + job_id,
+                "job_state": "COMPLETED",
+                "cpus": 4,
+                "start_time": hour + 60,
+                "end_time": hour + 660,
+            }
+            for job_id in range(3)
+        ],
+        name="v0_0_38_jobs",
+        primary_key=["cluster", "job_id"],
+        write_disposition="merge",
+    )
+
+
+def job_counts(pipeline):
+    with pipeline.sql_client() as client:
+        rows = client.execute_sql(
+            "SELECT hour - ?, sum(job_count) FROM jobs_hourly GROUP BY 1 ORDER BY 1",
+            HOUR,
+        )
+    return [tuple(row) for row in rows]
+
+
+def test_rollups_include_packages_loaded_late(tmp_path):
+    late = make_pipeline(tmp_path, "late")
+    other = make_pipeline(tmp_path, "other")
+
+    # The load of "late" fails after extraction, "other" is extracted later
+    # but loaded first
+    late.extract(jobs("late", HOUR))
+    late.normalize()
+    other.run(jobs("other", HOUR + 3600))
+    assert update_rollups(other) == [HOUR + 3600]
+    assert job_counts(other) == [(3600, 3)]
+
+    # The next run of "late" loads its pending package, whose load id is
+    # older than the one of "other"
+    late.load()
+    with late.sql_client() as client:
+        load_ids = client.execute_sql(
+            "SELECT cluster, _dlt_load_id FROM v0_0_38_jobs GROUP BY ALL ORDER BY 1"
+        )
+    assert load_ids[0][1] < load_ids[1][1]
+    assert update_rollups(late) == [HOUR]
+    assert job_counts(late) == [(0, 3), (3600, 3)]
+
+    # Nothing new
+    assert update_rollups(late) == []
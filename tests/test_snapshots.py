@@ -0,0 +1,112 @@
+import dlt
+import pytest
+
+from slurm_monitor.pipelines.slurm.snapshots import update_snapshots
+
+START = 300000 * 3600
+"""A poll time at the start of an hour"""
+
+WEEK = 7 * 86400
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    return dlt.pipeline(
+        pipeline_name="test_snapshots",
+        pipelines_dir=str(tmp_path),
+        destination=dlt.destinations.duckdb(str(tmp_path / "slurm.duckdb")),
+        dataset_name="slurm_data",
+    )
+
+
+def load(pipeline, nodes, jobs):
+    pipeline.run(
+        [
+            dlt.resource(
+                nodes,
+                name="v0_0_38_nodes_overview",
+                primary_key="name",
+                write_disposition="merge",
+            ),
+            dlt.resource(
+                jobs,
+                name="v0_0_38_jobs_overview",
+                primary_key="job_id",
+                write_disposition="merge",
+            ),
+        ]
+    )
+
+
+def node(state, alloc_cpus):
+    return {"name": "n1", "state": state, "alloc_cpus": alloc_cpus, "alloc_memory": 0}
+
+
+def job(state):
+    return {"job_id": 1, "partition": "compute", "job_state": state}
+
+
+def query(pipeline, sql, *params):
+    with pipeline.sql_client() as client:
+        return [tuple(row) for row in client.execute_sql(sql, *params)]
+
+
+def test_snapshot_per_poll_and_time_weighted_downsampling(pipeline):
+    assert update_snapshots(pipeline, now=START) is None
+
+    load(pipeline, [node("IDLE", 0)], [job("PENDING")])
+    assert update_snapshots(pipeline, now=START) == START
+    load(pipeline, [node("ALLOCATED", 64)], [job("RUNNING")])
+    update_snapshots(pipeline, now=START + 10)
+    # Polls which loaded nothing new are stamped too
+    for offset in (60, 120, 180, 240, 300):
+        update_snapshots(pipeline, now=START + offset)
+    # A second poll within the same second replaces the first
+    update_snapshots(pipeline, now=START + 300)
+
+    assert query(
+        pipeline, "SELECT ts - ?, alloc_cpus FROM node_snapshots ORDER BY ts", START
+    ) == [(0, 0), (10, 64), (60, 64), (120, 64), (180, 64), (240, 64), (300, 64)]
+
+    # A week later, the first two 5-minute buckets are past their retention
+    update_snapshots(pipeline, now=START + WEEK + 600)
+    assert query(pipeline, "SELECT min(ts) - ? FROM node_snapshots", START) == [
+        (WEEK + 600,)
+    ]
+    nodes = query(
+        pipeline,
+        """
+        SELECT s.ts - ?, n.name, s.alloc_cpus, s.seconds
+        FROM node_snapshots_5min s
+        JOIN snapshot_names n ON n.kind = 'node_state' AND n.id = s.state_id
+        ORDER BY s.ts
+        """,
+        START,
+    )
+    # IDLE for 10 seconds and ALLOCATED for 290, not 1 of 6 samples each
+    assert nodes == [
+        (0, "ALLOCATED", pytest.approx(64 * 290 / 300), 300),
+        (300, "ALLOCATED", 64, 300),
+    ]
+    partitions = query(
+        pipeline,
+        "SELECT ts - ?, pending, running, seconds "
+        "FROM partition_snapshots_5min ORDER BY ts",
+        START,
+    )
+    assert partitions == [
+        (0, pytest.approx(10 / 300), pytest.approx(290 / 300), 300),
+        (300, 0, 1, 300),
+    ]
+
+    # Three months later, the 5-minute averages are averaged over hours
+    update_snapshots(pipeline, now=START + 91 * 86400 + 3600)
+    assert query(
+        pipeline, "SELECT ts - ?, alloc_cpus, seconds FROM node_snapshots_hourly", START
+    ) == [(0, pytest.approx(64 * 590 / 600), 600)]
+    history = query(
+        pipeline,
+        "SELECT resolution, count(*) FROM node_history GROUP BY ALL ORDER BY 1",
+    )
+    # The latest snapshot, the one of a week later, and the first hour
+    assert history == [(1, 1), (300, 1), (3600, 1)]
@@ -0,0 +1,150 @@
+import json
+
+import pytest
+import requests
+
+from slurm_monitor.pipelines.slurm.streaming import (
+    iter_json_array,
+    iter_json_items,
+    iter_parsable2,
+    iter_response_records,
+)
+
+DOCUMENT = {
+    "meta": {"plugin": {"type": "openapi/v0.0.38"}, "Slurm": {"release": "23.02"}},
+    "errors": [],
+    "jobs": [
+        {"job_id": 1, "name": "fesom – spinup ✓", "comment": 'say "hi"\\\n\t'},
+        {"job_id": 2, "name": "été 🌊", "time_limit": 1.5e3, "nice": -12},
+        {"job_id": 3, "flags": [True, False, None], "deps": {}, "array": []},
+        {"job_id": 4, "priority": 0.000125, "big": 12345678901234567890},
+    ],
+    "warnings": [{"description": "[not an array]"}],
+}
+DOCUMENT_BYTES = json.dumps(DOCUMENT, ensure_ascii=False, indent=1).encode("utf-8")
+
+
+def splits(data):
+    """Every way of cutting ``data`` into two pieces"""
+    for i in range(len(data) + 1):
+        yield i, [data[:i], data[i:]]
+
+
+def test_every_split_matches_json_loads():
+    expected = [("jobs", job) for job in json.loads(DOCUMENT_BYTES)["jobs"]]
+    for i, pieces in splits(DOCUMENT_BYTES):
+        # The decoder sees every cut as the end of its buffer, also inside
+        # strings, escapes, numbers, literals and multi-byte characters
+        items = list(iter_json_items(pieces, {"jobs"}, chunk_size=1))
+        assert items == expected, f"split at byte {i}"
+
+
+def test_every_split_of_escapes_as_text():
+    text = json.dumps(DOCUMENT)  # ASCII only, with \uXXXX escapes and surrogates
+    assert "\\ud83c" in text
+    expected = [("jobs", job) for job in DOCUMENT["jobs"]]
+    for i, pieces in splits(text):
+        assert list(iter_json_items(pieces, {"jobs"}, chunk_size=1)) == expected
+
+
+def test_single_bytes():
+    pieces = [DOCUMENT_BYTES[i : i + 1] for i in range(len(DOCUMENT_BYTES))]
+    items = list(iter_json_items(pieces, {"jobs", "errors"}, chunk_size=1))
+    assert [item for _, item in items] == DOCUMENT["jobs"]
+
+
+def test_several_keys_and_empty_arrays():
+    document = {"jobs": [], "nodes": [{"name": "a"}], "meta": {}, "other": [1]}
+    items = list(iter_json_items([json.dumps(document)], {"jobs", "nodes", "meta"}))
+    assert items == [("nodes", {"name": "a"}), ("meta", {})]
+    assert list(iter_json_array(["{}"], "jobs")) == []
+    assert list(iter_json_array(['{"jobs": [ ] }'], "jobs")) == []
+    assert list(iter_json_array(['{"jobs": null}'], "jobs")) == []
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        "",
+        '{"jobs": [{"job_id": 1}, {"job_id"',
+        '{"jobs": [{"job_id": 1}',
+        '{"jobs": [1, 2',
+        '{"jobs": [1, 2]',
+        '{"jobs": ["unterminated',
+        '{"jobs": [tru',
+        '{"jobs": [1, 2]} trailing',
+    ],
+)
+def test_truncated_input_raises(document):
+    encoded = document.encode("utf-8")
+    for _, pieces in splits(encoded):
+        with pytest.raises(ValueError):
+            list(iter_json_items(pieces, {"jobs"}, chunk_size=1))
+
+
+def test_truncated_multibyte_character_raises():
+    with pytest.raises(UnicodeDecodeError):
+        list(iter_json_items([b'{"jobs": ["\xe2\x80'], {"jobs"}))
+
+
+def make_response(payload):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = "http://slurm/slurm/v0.0.38/jobs"
+    response._content = json.dumps(payload).encode("utf-8")
+    response._content_consumed = True
+    return response
+
+
+@pytest.mark.parametrize(
+    "payload, data_selector, expected",
+    [
+        (
+            {"jobs": [{"a": 1}, {"a": 2}, {"a": 3}]},
+            "jobs",
+            [[{"a": 1}, {"a": 2}], [{"a": 3}]],
+        ),
+        ({"jobs": []}, "jobs", []),
+        ({"data": {"jobs": [{"a": 1}]}}, "data.jobs", [[{"a": 1}]]),
+        ({"data": {"jobs": []}}, "data.jobs", []),
+        ({"meta": {"a": 1}}, "$", [[{"meta": {"a": 1}}]]),
+        (
+            {"items": [{"id": {"v": 1}}, {"id": {"v": 2}}]},
+            "items[*].id",
+            [[{"v": 1}, {"v": 2}]],
+        ),
+    ],
+)
+def test_iter_response_records(payload, data_selector, expected):
+    response = make_response(payload)
+    # Top-level keys are streamed in batches, other selectors are decoded as
+    # a whole and come in one batch
+    assert list(iter_response_records(response, data_selector, batch_size=2)) == (
+        expected
+    )
+
+
+def test_iter_parsable2():
+    lines = [
+        "JobID|JobName|State\r\n".encode("utf-8"),
+        "\n",
+        "1|été – run|RUNNING\n".encode("utf-8"),
+        "2||CANCELLED by 1234\n",
+        "3|a|b|extra",
+    ]
+    assert list(iter_parsable2(lines)) == [
+        {"JobID": "1", "JobName": "été – run", "State": "RUNNING"},
+        {"JobID": "2", "JobName": "", "State": "CANCELLED by 1234"},
+        {"JobID": "3", "JobName": "a", "State": "b"},
+    ]
+    assert list(iter_parsable2(["A,B\n", "1,2\n"], delimiter=",")) == [
+        {"A": "1", "B": "2"}
+    ]
+    assert list(iter_parsable2(["A|B\n"])) == []
+    assert list(iter_parsable2([])) == []
+
+
+def test_trailing_data_after_empty_object_raises():
+    assert list(iter_json_items(["{ }\n"], {"jobs"})) == []
+    with pytest.raises(ValueError, match="Extra data"):
+        list(iter_json_items(["{}{}"], {"jobs"}))
@@ -0,0 +1,46 @@
+import os
+import stat
+
+from slurm_monitor.pipelines.slurm import tokens
+from slurm_monitor.pipelines.slurm.tokens import TokenCache
+
+
+def test_token_refreshed_within_margin(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(tokens.time, "time", lambda: now)
+    generated = []
+
+    def generate():
+        generated.append(now)
+        return "SLURM_JWT", f"token{len(generated)}"
+
+    cache = TokenCache()
+    assert cache.get("host", "user", generate, lifespan=100) == ("SLURM_JWT", "token1")
+    # 10% of the lifespan left: still fresh just before, refreshed at the margin
+    now = 1089.0
+    assert cache.get("host", "user", generate, lifespan=100)[1] == "token1"
+    now = 1090.0
+    assert cache.get("host", "user", generate, lifespan=100)[1] == "token2"
+    assert generated == [1000.0, 1090.0]
+    # Other users have tokens of their own
+    assert cache.get("host", "other", generate, lifespan=100)[1] == "token3"
+
+
+def test_token_cache_persisted_private(tmp_path):
+    path = str(tmp_path / "tokens.json")
+    # Left behind by an interrupted write, with a permissive mode
+    with open(f"{path}.tmp", "w") as f:
+        f.write("{}")
+    os.chmod(f"{path}.tmp", 0o644)
+
+    TokenCache(path).get("host", "user", lambda: ("SLURM_JWT", "secret"))
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert not os.path.exists(f"{path}.tmp")
+    cache = TokenCache(path)
+    assert cache.get("host", "user", lambda: ("SLURM_JWT", "new")) == (
+        "SLURM_JWT",
+        "secret",
+    )
+    cache.invalidate("host", "user")
+    assert TokenCache(path).get("host", "user", lambda: ("X", "new")) == ("X", "new")